@@ -1,5 +1,10 @@
+from typing import Optional
+
 from .asset_models import IndustryAssetBenchmarks
 
-def load_asset_config() -> IndustryAssetBenchmarks:
-    # In a real app, this might load from a YAML file or DB based on industry
-    return IndustryAssetBenchmarks()
+
+def load_asset_config(industry_code: Optional[str] = None) -> IndustryAssetBenchmarks:
+    """Asset-quality benchmarks for `industry_code` from the threshold store (see `src.app.thresholds`)."""
+    from src.app.thresholds import get_thresholds
+
+    return get_thresholds(industry_code).asset_quality
@@ -1,9 +1,14 @@
-import json
 from typing import List, Tuple, Dict
-from src.app.config import OPENAI_MODEL, get_llm_client
+from src.app.llm.gateway import get_llm_gateway
+from src.app.llm.json_stream import parse_llm_json
+from src.app.llm.limiter import LLMOverloaded
+from src.app.llm.narrative_cache import get_narrative_cache
+from src.app.narrative_engine import build_narrative, from_llm_answer, narrative_engine
+from src.app.llm.prompt_compactor import compact_json
 from .asset_models import RuleResult
 
-client = get_llm_client()
+gateway = get_llm_gateway()
+narrative_cache = get_narrative_cache()
 
 def generate_asset_llm_narrative(
     company_id: str,
@@ -13,12 +18,18 @@ def generate_asset_llm_narrative(
     deterministic_notes: List[str],
     base_score: int,
 ) -> Tuple[List[str], int]:
-    if client is None:
-        return deterministic_notes, base_score
-
     # Prepare payload
     latest_year = max(metrics.keys())
     latest = metrics[latest_year]
+
+    template_narrative = build_narrative("asset_quality", company_id, latest, rule_results, trends)
+    if narrative_engine() == "template" or not gateway.use_llm():
+        return template_narrative, base_score
+
+    cached = narrative_cache.lookup("asset_quality", company_id, latest, rule_results)
+    if cached is not None:
+        # Same situation seen before: cached answer with this company's numbers
+        return from_llm_answer(cached, template_narrative, base_score)[:2]
     
     prompt_payload = {
         "company_id": company_id,
@@ -43,27 +54,25 @@ def generate_asset_llm_narrative(
         '  "score_adjustment": integer between -5 and 5 (can be 0)\n'
         "}\n"
         "Only return valid JSON.\n\n"
-        f"INPUT:\n{json.dumps(prompt_payload, ensure_ascii=False, default=str)}"
+        f"INPUT:\n{compact_json('asset_quality', prompt_payload)}"
     )
 
     try:
-        response = client.chat.completions.create(
-            model=OPENAI_MODEL,
+        response = gateway.complete(
+            "asset_quality",
             messages=[{"role": "user", "content": prompt}],
             temperature=0.2,
+            rules=rule_results,
         )
 
-        content = response.choices[0].message.content
-        parsed = json.loads(content)
-        narrative = parsed.get("analysis_narrative") or deterministic_notes
-        score_adj = parsed.get("score_adjustment")
-        
-        if isinstance(score_adj, (int, float)):
-            adjusted_score = max(0, min(100, base_score + int(score_adj)))
-        else:
-            adjusted_score = base_score
-            
-        return narrative, adjusted_score
+        parsed = parse_llm_json(response.choices[0].message.content)
+        if not parsed:
+            return template_narrative, base_score
+        narrative_cache.store("asset_quality", company_id, latest, rule_results, parsed)
+        return from_llm_answer(parsed, template_narrative, base_score)[:2]
+    except LLMOverloaded:
+        # Shed in reject mode: the endpoint answers 429 like the other modules
+        raise
     except Exception as e:
         # Fallback on error
-        return deterministic_notes, base_score
+        return template_narrative, base_score
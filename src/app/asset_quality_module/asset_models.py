@@ -23,6 +23,9 @@ class IndustryAssetBenchmarks(BaseModel):
     age_proxy_old_threshold: float = 0.60
     age_proxy_critical: float = 0.75
 
+    class Config:
+        frozen = True  # shared per industry by the threshold store
+
 class AssetQualityInput(BaseModel):
     company_id: str
     industry_code: str
@@ -10,7 +10,8 @@ from .asset_trend import compute_trend_metrics
 
 class AssetIntangibleQualityModule:
     def __init__(self, config: IndustryAssetBenchmarks = None):
-        self.config = config or load_asset_config()
+        # None: benchmarks come from the request or the threshold store per industry
+        self.config = config
 
     def run(self, input_data: AssetQualityInput) -> AssetQualityOutput:
         # 1. Compute Metrics
@@ -23,7 +24,11 @@ class AssetIntangibleQualityModule:
         rule_results = apply_rules(
             metrics=per_year_metrics,
             trends=trend_metrics,
-            benchmarks=input_data.industry_asset_quality_benchmarks or self.config
+            benchmarks=(
+                input_data.industry_asset_quality_benchmarks
+                or self.config
+                or load_asset_config(input_data.industry_code)
+            )
         )
         
         # 4. Compute Base Score
@@ -0,0 +1,335 @@
+# llm_stub_server.py
+"""
+Local OpenAI-compatible stand-in for the chat-completions endpoint.
+
+Answers every `*_llm` module prompt with schema-valid JSON after a simulated
+latency, so the full pipeline can be load-tested offline. The module is
+detected from the prompt text; trend insight keys are taken from the
+`trend_data` in the prompt INPUT block when present.
+
+`"stream": true` requests are answered as server-sent events: a fifth of
+the latency passes before the first chunk and the rest is spread over the
+chunks, like a model generating tokens. Requests with a JSON
+`response_format` are never given a malformed answer.
+
+Usage:
+    python -m src.app.benchmarking.llm_stub_server --port 8089 \
+        --latency lognormal:0.8:0.4 --error-rate 0.02 --timeout-rate 0.01
+
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=sk-local \
+        uvicorn src.main:app
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Trend insight keys each prompt asks for, used when trend_data is absent
+MODULE_TREND_KEYS = {
+    "borrowings": ["short_term_debt", "long_term_debt", "finance_cost"],
+    "capex": ["capex", "cwip", "nfa"],
+    "liquidity": ["cash", "receivables", "inventory", "ocf", "current_liabilities"],
+}
+
+SECTION_TITLES = {
+    "borrowings": ["Leverage assessment", "Key concerns", "Positives", "Credit conclusion"],
+    "asset_quality": ["Asset utilization", "Key risks", "Positives", "Asset quality conclusion"],
+    "capex": ["Capital investment assessment", "Key concerns", "Positives", "Capital allocation conclusion"],
+    "liquidity": ["Liquidity health", "Key concerns", "Strengths", "Liquidity conclusion"],
+    "working_capital": ["Working capital story", "Cash conversion", "Payables", "Outlook"],
+}
+
+
+@dataclass
+class StubConfig:
+    latency: str = "fixed:0.05"      # fixed:S | uniform:LO:HI | normal:MU:SD | lognormal:MEDIAN:SIGMA
+    error_rate: float = 0.0          # fraction answered with an HTTP error
+    error_statuses: List[int] = field(default_factory=lambda: [500, 503, 429])
+    timeout_rate: float = 0.0        # fraction that hang for timeout_seconds
+    timeout_seconds: float = 120.0
+    malformed_rate: float = 0.0      # fraction answered with non-JSON content
+    seed: Optional[int] = None
+
+
+def sample_latency(spec: str, rng: random.Random) -> float:
+    """Draw one latency (seconds) from a distribution spec such as 'lognormal:0.8:0.4'."""
+    kind, *params = spec.split(":")
+    p = [float(x) for x in params]
+    if kind == "fixed":
+        return p[0]
+    if kind == "uniform":
+        return rng.uniform(p[0], p[1])
+    if kind == "normal":
+        return max(0.0, rng.gauss(p[0], p[1]))
+    if kind == "lognormal":
+        return rng.lognormvariate(math.log(p[0]), p[1])
+    raise ValueError(f"Unknown latency distribution '{kind}'")
+
+
+def detect_module(prompt: str) -> str:
+    text = prompt.lower()
+    if "combined multi-module" in text:
+        return "combined"
+    if "debt agent" in text:
+        return "borrowings"
+    if "asset quality agent" in text:
+        return "asset_quality"
+    if "capex & cwip agent" in text:
+        return "capex"
+    if "working capital & cash conversion" in text:
+        return "working_capital"
+    if "short-term liquidity" in text:
+        return "liquidity"
+    return "unknown"
+
+
+def _extract_input(prompt: str) -> dict:
+    """Best-effort parse of the JSON INPUT block appended to most prompts."""
+    marker = prompt.rfind("INPUT:")
+    if marker < 0:
+        return {}
+    try:
+        return json.loads(prompt[marker + len("INPUT:"):].strip())
+    except ValueError:
+        return {}
+
+
+def build_response_body(module: str, prompt: str, rng: random.Random) -> dict:
+    """Schema-valid JSON answer for the detected module prompt."""
+    payload = _extract_input(prompt)
+    if module == "combined":
+        # One section per module, keyed like src.app.llm.combined expects
+        company = payload.get("company_id", "the company")
+        sections = {}
+        for name, section in (payload.get("modules") or {}).items():
+            analytics = section.get("analytics")
+            analytics = dict(analytics, company_id=company) if isinstance(analytics, dict) else {"company_id": company}
+            sections[name] = _module_body("capex" if name == "capex_cwip" else name, analytics, rng)
+        return sections
+    return _module_body(module, payload, rng)
+
+
+def _module_body(module: str, payload: dict, rng: random.Random) -> dict:
+    company = payload.get("company_id", "the company")
+    titles = SECTION_TITLES.get(module, ["Assessment", "Concerns", "Positives", "Conclusion"])
+    narrative = [f"{title}: synthetic narrative for {company}." for title in titles]
+
+    if module == "working_capital":
+        return {
+            "analysis_narrative": narrative,
+            "red_flags": [],
+            "positive_points": ["Synthetic positive point."],
+            "sub_score_adjusted": rng.randint(40, 90),
+        }
+
+    body = {"analysis_narrative": narrative}
+    if module != "liquidity":
+        body["score_adjustment"] = rng.randint(-5, 5)
+
+    if module in MODULE_TREND_KEYS:
+        keys = list((payload.get("trend_data") or {}).keys()) or MODULE_TREND_KEYS[module]
+        body["trend_insights"] = {k: f"Synthetic insight for {k.replace('_', ' ')}." for k in keys}
+    return body
+
+
+def _approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _chunks(content: str, pieces: int = 20) -> List[str]:
+    size = max(1, math.ceil(len(content) / pieces))
+    return [content[i:i + size] for i in range(0, len(content), size)]
+
+
+def _usage(prompt: str, content: str) -> dict:
+    prompt_tokens, completion_tokens = _approx_tokens(prompt), _approx_tokens(content)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+class _Namespace:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class StubLLMClient:
+    """
+    In-process stand-in exposing `chat.completions.create`, for callers that
+    need stub answers without a server. Answers are deterministic per prompt
+    and report "stub" as their model, whatever model was requested.
+    """
+
+    def __init__(self, latency: Optional[str] = None):
+        self.latency = latency
+        self.chat = _Namespace(completions=_Namespace(create=self._create))
+
+    def _create(self, model: str = "stub", messages: List[dict] = None, stream: bool = False, **_):
+        model = "stub"
+        prompt = "\n".join(m.get("content") or "" for m in messages or [])
+        rng = random.Random(prompt)
+        if self.latency:
+            time.sleep(sample_latency(self.latency, rng))
+        content = json.dumps(build_response_body(detect_module(prompt), prompt, rng))
+        usage = _Namespace(**_usage(prompt, content))
+        if stream:
+            chunks = [
+                _Namespace(model=model, usage=None, choices=[_Namespace(index=0, delta=_Namespace(content=piece), finish_reason=None)])
+                for piece in _chunks(content)
+            ]
+            chunks.append(_Namespace(model=model, usage=usage, choices=[]))
+            return iter(chunks)
+        return _Namespace(
+            model=model,
+            choices=[_Namespace(index=0, message=_Namespace(role="assistant", content=content), finish_reason="stop")],
+            usage=usage,
+        )
+
+
+def create_app(config: Optional[StubConfig] = None) -> FastAPI:
+    config = config or StubConfig()
+    rng = random.Random(config.seed)
+    stats: Dict[str, int] = {"requests": 0, "errors": 0, "timeouts": 0, "malformed": 0}
+
+    stub = FastAPI(title="LLM stand-in", version="1.0")
+    stub.state.config = config
+    stub.state.stats = stats
+
+    @stub.get("/stats")
+    async def get_stats():
+        return stats
+
+    @stub.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        prompt = "\n".join(m.get("content") or "" for m in body.get("messages", []))
+        module = detect_module(prompt)
+
+        roll = rng.random()
+        if roll < config.timeout_rate:
+            stats["timeouts"] += 1
+            await asyncio.sleep(config.timeout_seconds)
+        latency = sample_latency(config.latency, rng)
+        stream = bool(body.get("stream"))
+        await asyncio.sleep(latency / 5 if stream else latency)
+
+        roll = rng.random()
+        if roll < config.error_rate:
+            stats["errors"] += 1
+            status = rng.choice(config.error_statuses)
+            headers = {"retry-after": "1"} if status == 429 else None
+            return JSONResponse(
+                {"error": {"message": "Simulated provider error", "type": "server_error", "code": status}},
+                status_code=status,
+                headers=headers,
+            )
+
+        json_format = (body.get("response_format") or {}).get("type") == "json_object"
+        if not json_format and rng.random() < config.malformed_rate:
+            stats["malformed"] += 1
+            content = "Sure! Here is the analysis you asked for: {not valid json"
+        else:
+            content = json.dumps(build_response_body(module, prompt, rng))
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        model = body.get("model", "stub")
+        if stream:
+            include_usage = (body.get("stream_options") or {}).get("include_usage")
+            return StreamingResponse(
+                _stream_events(completion_id, model, content, _usage(prompt, content) if include_usage else None, latency),
+                media_type="text/event-stream",
+            )
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": _usage(prompt, content),
+        }
+
+    async def _stream_events(completion_id: str, model: str, content: str, usage: Optional[dict], latency: float):
+        pieces = _chunks(content)
+        created = int(time.time())
+
+        def _event(choices: list, **extra) -> str:
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model, "choices": choices}
+            chunk.update(extra)
+            return f"data: {json.dumps(chunk)}\n\n"
+
+        for i, piece in enumerate(pieces):
+            if i:
+                await asyncio.sleep(latency * 0.8 / len(pieces))
+            yield _event([{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+        yield _event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if usage is not None:
+            yield _event([], usage=usage)
+        yield "data: [DONE]\n\n"
+
+    return stub
+
+
+def serve_in_thread(config: Optional[StubConfig] = None, host: str = "127.0.0.1", port: int = 8089):
+    """
+    Start the stand-in on a daemon thread (for harnesses and notebooks).
+    Returns the uvicorn Server; set `server.should_exit = True` to stop it.
+    """
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(create_app(config), host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible LLM stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", default="fixed:0.05")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-statuses", default="500,503,429")
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-seconds", type=float, default=120.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    config = StubConfig(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        error_statuses=[int(s) for s in args.error_statuses.split(",")],
+        timeout_rate=args.timeout_rate,
+        timeout_seconds=args.timeout_seconds,
+        malformed_rate=args.malformed_rate,
+        seed=args.seed,
+    )
+    sample_latency(config.latency, random.Random())  # validate spec early
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,361 @@
+# load_test.py
+"""
+Async load generator for the analyze endpoints.
+
+Drives every endpoint with synthetic `AnalysisRequest` bodies at a fixed
+concurrency (closed loop) or a target request rate (open loop) and reports
+throughput, latency percentiles and an error breakdown per endpoint.
+
+Modes:
+    http    - real HTTP against a running server (--base-url)
+    asgi    - in-process against src.main.app, no sockets
+    lambda  - calls lambda_handler.handler with API Gateway proxy events
+
+Usage:
+    python -m src.app.benchmarking.load_test --mode http --base-url http://localhost:8000 \
+        --concurrency 32 --duration 60
+    python -m src.app.benchmarking.load_test --mode lambda --rps 20 --requests 500 \
+        --json-out lambda_run.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from .synthetic_data import iter_universe, parse_mix
+
+DEFAULT_ENDPOINTS = [
+    "/borrowings/analyze",
+    "/asset_quality/analyze",
+    "/working_capital_module/analyze",
+    "/capex_cwip_module/analyze",
+    "/liquidity/analyze",
+]
+
+# Route suffixes discovery treats as analysis endpoints
+ANALYSIS_SUFFIXES = ("/analyze", "/batch")
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile over an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+@dataclass
+class EndpointStats:
+    latencies: List[float] = field(default_factory=list)
+    errors: Counter = field(default_factory=Counter)
+    ok: int = 0
+
+    def record(self, latency: float, outcome: str):
+        self.latencies.append(latency)
+        if outcome == "200":
+            self.ok += 1
+        else:
+            self.errors[outcome] += 1
+
+    def summary(self, elapsed: float) -> dict:
+        lat = sorted(self.latencies)
+        total = len(lat)
+        return {
+            "requests": total,
+            "ok": self.ok,
+            "errors": dict(self.errors),
+            "error_rate": round((total - self.ok) / total, 4) if total else 0.0,
+            "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": _ms(percentile(lat, 50)),
+            "p95_ms": _ms(percentile(lat, 95)),
+            "p99_ms": _ms(percentile(lat, 99)),
+            "max_ms": _ms(lat[-1] if lat else None),
+            "mean_ms": _ms(sum(lat) / total if total else None),
+        }
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+def discover_endpoints(app) -> List[str]:
+    """
+    Analysis POST routes exposed by the FastAPI app (paths ending in one of
+    ANALYSIS_SUFFIXES); admin routes such as /thresholds/reload are skipped.
+    """
+    paths = []
+    for route in app.routes:
+        methods = getattr(route, "methods", None) or set()
+        if (
+            "POST" in methods
+            and route.path.endswith(ANALYSIS_SUFFIXES)
+            and route.path not in paths
+            and "{" not in route.path
+        ):
+            paths.append(route.path)
+    return paths
+
+
+# ---------------------------------------------------------
+# TRANSPORTS
+# ---------------------------------------------------------
+class HttpTransport:
+    def __init__(self, base_url: str = None, app=None, timeout: float = 120.0):
+        import httpx
+
+        if app is not None:
+            self.client = httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=timeout
+            )
+        else:
+            limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+            self.client = httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits)
+
+    async def send(self, path: str, body: dict) -> str:
+        try:
+            resp = await self.client.post(path, json=body)
+        except Exception as exc:
+            return type(exc).__name__
+        return str(resp.status_code)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def build_lambda_event(path: str, body: dict) -> dict:
+    """API Gateway REST (v1) proxy event as delivered to lambda_handler.handler."""
+    return {
+        "resource": path,
+        "path": path,
+        "httpMethod": "POST",
+        "headers": {"content-type": "application/json"},
+        "multiValueHeaders": {"content-type": ["application/json"]},
+        "queryStringParameters": None,
+        "multiValueQueryStringParameters": None,
+        "pathParameters": None,
+        "stageVariables": None,
+        "requestContext": {
+            "resourcePath": path,
+            "httpMethod": "POST",
+            "path": path,
+            "stage": "loadtest",
+            "requestId": uuid.uuid4().hex,
+            "identity": {"sourceIp": "127.0.0.1"},
+        },
+        "body": json.dumps(body),
+        "isBase64Encoded": False,
+    }
+
+
+class _LambdaContext:
+    function_name = "fundamental-analysis-loadtest"
+    memory_limit_in_mb = 0
+    aws_request_id = "loadtest"
+
+    @staticmethod
+    def get_remaining_time_in_millis():
+        return 900000
+
+
+class LambdaTransport:
+    """
+    Invokes the Mangum handler on worker threads. Mangum drives the ASGI app
+    on the thread's own event loop, as it would inside a Lambda sandbox.
+    """
+
+    def __init__(self, workers: int):
+        from lambda_handler import handler
+
+        self.handler = handler
+        self.pool = ThreadPoolExecutor(max_workers=workers, initializer=self._init_loop)
+
+    @staticmethod
+    def _init_loop():
+        asyncio.set_event_loop(asyncio.new_event_loop())
+
+    def _invoke(self, path: str, body: dict) -> str:
+        try:
+            result = self.handler(build_lambda_event(path, body), _LambdaContext())
+        except Exception as exc:
+            return type(exc).__name__
+        return str(result.get("statusCode"))
+
+    async def send(self, path: str, body: dict) -> str:
+        return await asyncio.get_running_loop().run_in_executor(self.pool, self._invoke, path, body)
+
+    async def close(self):
+        self.pool.shutdown(wait=False)
+
+
+# ---------------------------------------------------------
+# RUNNER
+# ---------------------------------------------------------
+async def run_load(
+    transport,
+    endpoints: List[str],
+    bodies: List[dict],
+    concurrency: int = 8,
+    rps: Optional[float] = None,
+    total_requests: Optional[int] = None,
+    duration: Optional[float] = None,
+) -> dict:
+    """
+    Issue requests round-robin over (endpoint, body) pairs.
+
+    With rps set the generator is open-loop: requests are started on a fixed
+    schedule regardless of completions (bounded by concurrency as a safety
+    cap), so queueing delay shows up in the percentiles. Without rps it is
+    closed-loop with `concurrency` workers.
+    """
+    if total_requests is None and duration is None:
+        total_requests = len(endpoints) * len(bodies)
+
+    stats: Dict[str, EndpointStats] = defaultdict(EndpointStats)
+    counter = {"issued": 0}
+    started = time.perf_counter()
+    deadline = started + duration if duration else None
+
+    def _next_job():
+        n = counter["issued"]
+        if total_requests is not None and n >= total_requests:
+            return None
+        if deadline is not None and time.perf_counter() >= deadline:
+            return None
+        counter["issued"] += 1
+        return endpoints[n % len(endpoints)], bodies[(n // len(endpoints)) % len(bodies)]
+
+    async def _fire(path: str, body: dict, t0: Optional[float] = None):
+        t0 = t0 or time.perf_counter()
+        outcome = await transport.send(path, body)
+        stats[path].record(time.perf_counter() - t0, outcome)
+
+    if rps:
+        sem = asyncio.Semaphore(concurrency)
+        tasks = []
+        interval = 1.0 / rps
+
+        async def _guarded(path, body):
+            scheduled = time.perf_counter()
+            async with sem:
+                await _fire(path, body, scheduled)
+
+        while True:
+            job = _next_job()
+            if job is None:
+                break
+            tasks.append(asyncio.create_task(_guarded(*job)))
+            target = started + counter["issued"] * interval
+            delay = target - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await asyncio.gather(*tasks)
+    else:
+        async def _worker():
+            while True:
+                job = _next_job()
+                if job is None:
+                    return
+                await _fire(*job)
+
+        await asyncio.gather(*(_worker() for _ in range(concurrency)))
+
+    elapsed = time.perf_counter() - started
+    overall = EndpointStats()
+    for s in stats.values():
+        overall.latencies.extend(s.latencies)
+        overall.errors.update(s.errors)
+        overall.ok += s.ok
+
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "concurrency": concurrency,
+        "target_rps": rps,
+        "overall": overall.summary(elapsed),
+        "endpoints": {path: s.summary(elapsed) for path, s in stats.items()},
+    }
+
+
+def format_report(report: dict) -> str:
+    header = f"{'endpoint':<34}{'reqs':>7}{'rps':>9}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  errors"
+    lines = [header, "-" * len(header)]
+    rows = list(report["endpoints"].items()) + [("TOTAL", report["overall"])]
+    for name, s in rows:
+        errors = ", ".join(f"{k}:{v}" for k, v in s["errors"].items()) or "-"
+        lines.append(
+            f"{name:<34}{s['requests']:>7}{s['throughput_rps']:>9}"
+            f"{_fmt(s['p50_ms']):>10}{_fmt(s['p95_ms']):>10}{_fmt(s['p99_ms']):>10}{_fmt(s['max_ms']):>10}  {errors}"
+        )
+    lines.append(f"elapsed {report['elapsed_s']}s, concurrency {report['concurrency']}, target rps {report['target_rps']}")
+    return "\n".join(lines)
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "NA" if value is None else f"{value:.1f}"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test the analyze endpoints")
+    parser.add_argument("--mode", choices=["http", "asgi", "lambda"], default="http")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoints", default=None, help="comma-separated paths (default: all POST routes)")
+    parser.add_argument("--companies", type=int, default=100, help="synthetic bodies to cycle through")
+    parser.add_argument("--mix", default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rps", type=float, default=None, help="open-loop target rate")
+    parser.add_argument("--requests", type=int, default=None)
+    parser.add_argument("--duration", type=float, default=None, help="seconds")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--json-out", default=None)
+    args = parser.parse_args(argv)
+
+    bodies = list(iter_universe(args.companies, seed=args.seed, mix=parse_mix(args.mix)))
+
+    if args.mode == "http":
+        transport = HttpTransport(base_url=args.base_url, timeout=args.timeout)
+        endpoints = DEFAULT_ENDPOINTS
+    else:
+        from src.main import app
+
+        endpoints = discover_endpoints(app)
+        if args.mode == "asgi":
+            transport = HttpTransport(app=app, timeout=args.timeout)
+        else:
+            transport = LambdaTransport(workers=args.concurrency)
+
+    if args.endpoints:
+        endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+
+    async def _run():
+        try:
+            return await run_load(
+                transport,
+                endpoints,
+                bodies,
+                concurrency=args.concurrency,
+                rps=args.rps,
+                total_requests=args.requests,
+                duration=args.duration,
+            )
+        finally:
+            await transport.close()
+
+    report = asyncio.run(_run())
+    report["mode"] = args.mode
+    print(format_report(report))
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
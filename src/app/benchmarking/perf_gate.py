@@ -0,0 +1,424 @@
+# perf_gate.py
+"""
+Performance regression gate.
+
+Times every module stage (metrics, trend, rules, full run) on a seeded
+synthetic universe with the LLM disabled, optionally folds in a macro
+report from `load_test --json-out`, and compares the results against stored
+baselines. Exits non-zero when any measurement regresses beyond its
+tolerance.
+
+Micro timings are stored in microseconds together with the duration of a
+fixed pure-Python calibration loop; on comparison they are rescaled by the
+ratio of calibrations, so baselines recorded on one machine remain usable
+on another of a different speed.
+
+Each timing is the median over --repeats passes, which is steadier than the
+best pass on shared CI machines, and every module is calibrated just before
+it is timed so machine load that drifts during the run is rescaled away.
+Stages of a few microseconds jitter by tens of percent, so a micro
+measurement only regresses when it exceeds its relative tolerance and also
+grows by more than a noise floor: `min_delta_us` (default 25) per company,
+capped at `min_delta_fraction` (default 0.5) of the baseline so short stages
+still fail when they double. Modules with a regressed micro timing are
+timed again and the new timing replaces the first, so a transient slowdown
+is forgiven but a real one must pass twice. `update` records the median of
+--rounds full measurements.
+
+Usage:
+    python -m src.app.benchmarking.perf_gate run                  # compare, exit 1 on regression
+    python -m src.app.benchmarking.perf_gate update               # refresh baselines
+    python -m src.app.benchmarking.perf_gate run --macro load.json --only borrowings,working_capital
+"""
+import argparse
+import contextlib
+import copy
+import fnmatch
+import gc
+import io
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.app import pipeline
+from .synthetic_data import iter_universe
+
+DEFAULT_BASELINE_FILE = os.path.join("benchmarks", "perf_baselines.json")
+DEFAULT_TOLERANCE = 0.25
+# Absolute growth (microseconds per company) a micro timing needs to count as a regression
+DEFAULT_MIN_DELTA_US = 25.0
+# ... capped at this share of the baseline
+DEFAULT_MIN_DELTA_FRACTION = 0.5
+# Shortest timed pass over the universe
+MIN_PASS_SECONDS = 0.02
+
+# Macro metrics where a larger value is better
+HIGHER_IS_BETTER = ("throughput_rps",)
+MACRO_FIELDS = ("p50_ms", "p95_ms", "p99_ms", "throughput_rps")
+
+
+# ---------------------------------------------------------
+# MICRO-BENCHMARK STAGES
+# ---------------------------------------------------------
+def _borrowings_stages(req: dict) -> Dict[str, Callable[[], object]]:
+    from src.app.borrowing_module.debt_metrics import compute_per_year_metrics
+    from src.app.borrowing_module.debt_trend import compute_trend_metrics
+    from src.app.borrowing_module.debt_rules import apply_rules
+    from src.app.borrowing_module.borrowings_config import load_rule_config
+
+    bi = pipeline.build_borrowings_input(req)
+    per_year = compute_per_year_metrics(bi.financials_5y)
+    trends = compute_trend_metrics(per_year)
+    cfg = load_rule_config(bi.industry_code)
+    return {
+        "metrics": lambda: compute_per_year_metrics(bi.financials_5y),
+        "trend": lambda: compute_trend_metrics(per_year),
+        "rules": lambda: apply_rules(per_year, trends, bi.industry_benchmarks, bi.covenant_limits, cfg),
+        "run": lambda: pipeline.run_borrowings(req),
+    }
+
+
+def _asset_stages(req: dict) -> Dict[str, Callable[[], object]]:
+    from src.app.asset_quality_module.asset_metrics import compute_per_year_metrics
+    from src.app.asset_quality_module.asset_trend import compute_trend_metrics
+    from src.app.asset_quality_module.asset_rules import apply_rules
+
+    ai = pipeline.build_asset_input(req)
+    per_year = compute_per_year_metrics(ai.financials_5y)
+    trends = compute_trend_metrics(per_year)
+    return {
+        "metrics": lambda: compute_per_year_metrics(ai.financials_5y),
+        "trend": lambda: compute_trend_metrics(compute_per_year_metrics(ai.financials_5y)),
+        "rules": lambda: apply_rules(per_year, trends, ai.industry_asset_quality_benchmarks),
+        "run": lambda: pipeline.run_asset_quality(req),
+    }
+
+
+def _liquidity_stages(req: dict) -> Dict[str, Callable[[], object]]:
+    from src.app.liquidity_module.liquidity_metrics import compute_per_year_metrics
+    from src.app.liquidity_module.liquidity_trend import compute_liquidity_trends
+    from src.app.liquidity_module.liquidity_rules import evaluate_rules
+
+    li = pipeline.build_liquidity_input(req)
+    per_year = compute_per_year_metrics(li.financials_5y)
+    trends = compute_liquidity_trends(li.financials_5y)
+    latest = per_year[max(per_year)]
+    return {
+        "metrics": lambda: compute_per_year_metrics(li.financials_5y),
+        "trend": lambda: compute_liquidity_trends(li.financials_5y),
+        "rules": lambda: evaluate_rules(latest, trends),
+        "run": lambda: pipeline.run_liquidity(req),
+    }
+
+
+def _capex_stages(req: dict) -> Dict[str, Callable[[], object]]:
+    from src.app.capex_cwip_module.metrics_engine import compute_year_metrics
+    from src.app.capex_cwip_module.trend_engine import compute_trends
+    from src.app.capex_cwip_module.rules_engine import apply_rules
+
+    years = sorted(req["financial_data"]["financial_years"], key=lambda x: x["year"])
+
+    def _metrics(financials):
+        out, prev = {}, None
+        for yr in financials:
+            out[yr["year"]] = compute_year_metrics(yr, prev)
+            prev = yr
+        return out
+
+    enriched = copy.deepcopy(years)
+    per_year = _metrics(enriched)
+    trend_input = {fy["year"]: fy for fy in enriched}
+    trends = compute_trends(trend_input)
+    return {
+        "metrics": lambda: _metrics(copy.deepcopy(years)),
+        "trend": lambda: compute_trends(trend_input),
+        "rules": lambda: apply_rules(per_year, trends),
+        "run": lambda: pipeline.run_capex_cwip(copy.deepcopy(req)),
+    }
+
+
+def _wc_stages(req: dict) -> Dict[str, Callable[[], object]]:
+    from src.app.working_capital_module.wc_metrics import compute_per_year_metrics
+    from src.app.working_capital_module.wc_trend import compute_trend_output
+    from src.app.working_capital_module.wc_rules import wc_rule_engine
+    from src.app.working_capital_module.wc_models import WorkingCapitalInput, WorkingCapitalBenchmarks
+    from src.app.working_capital_module.wc_orchestrator import parse_percent
+
+    prepared = copy.deepcopy(req)
+    for fy in prepared["financial_data"]["financial_years"]:
+        pct = parse_percent(fy["manufacturing_cost"]) + parse_percent(fy["material_cost"])
+        fy["cogs"] = fy["revenue"] * pct / 100
+    wi = WorkingCapitalInput(**prepared)
+    financials = wi.financial_data.financial_years
+    per_year = compute_per_year_metrics(financials)
+    latest_year = max(per_year)
+    trends = compute_trend_output(financials)
+    metrics = {"latest_year": latest_year, "latest": per_year[latest_year], "all_years": per_year}
+    benchmarks = WorkingCapitalBenchmarks()
+    return {
+        "metrics": lambda: compute_per_year_metrics(financials),
+        "trend": lambda: compute_trend_output(financials),
+        "rules": lambda: wc_rule_engine(metrics=metrics, trends=trends, rules=benchmarks),
+        "run": lambda: pipeline.run_working_capital(copy.deepcopy(req)),
+    }
+
+
+STAGE_BUILDERS = {
+    "borrowings": _borrowings_stages,
+    "asset_quality": _asset_stages,
+    "working_capital": _wc_stages,
+    "capex_cwip": _capex_stages,
+    "liquidity": _liquidity_stages,
+}
+
+
+def calibrate(rounds: int = 7) -> float:
+    """Seconds for a fixed pure-Python workload (median of `rounds`, like the timings it rescales)."""
+    samples = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        acc = 0.0
+        for i in range(200000):
+            acc += (i % 7) * 1.5 / (1 + i % 3)
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples)
+
+
+def run_micro(
+    modules: List[str],
+    companies: int = 50,
+    repeats: int = 11,
+    seed: int = 0,
+) -> Dict[str, float]:
+    """
+    Median (over repeats) mean per-company time in microseconds for each
+    `micro.<module>.<stage>` key, after one warm-up pass, with the garbage
+    collector paused while a pass is timed. Short stages loop over the
+    universe until a pass lasts MIN_PASS_SECONDS (like timeit's autorange),
+    so one scheduler hiccup cannot dominate it. Stdout is silenced while
+    timing because several modules print debug output.
+    """
+    payloads = [pipeline.normalize_request(p) for p in iter_universe(companies, seed=seed)]
+    results: Dict[str, float] = {}
+
+    with pipeline.deterministic_llm(), contextlib.redirect_stdout(io.StringIO()) as sink:
+        for module in modules:
+            stage_sets = [STAGE_BUILDERS[module](copy.deepcopy(p)) for p in payloads]
+            for stage in stage_sets[0]:
+                t0 = time.perf_counter()
+                for stages in stage_sets:  # warm-up pass
+                    stages[stage]()
+                loops = max(1, math.ceil(MIN_PASS_SECONDS / max(time.perf_counter() - t0, 1e-9)))
+                samples = []
+                for _ in range(repeats):
+                    # Collector pauses land on whichever stage allocates past the threshold
+                    gc.collect()
+                    gc.disable()
+                    try:
+                        t0 = time.perf_counter()
+                        for _ in range(loops):
+                            for stages in stage_sets:
+                                stages[stage]()
+                        samples.append((time.perf_counter() - t0) / (loops * len(stage_sets)))
+                    finally:
+                        gc.enable()
+                    sink.seek(0)
+                    sink.truncate()
+                results[f"micro.{module}.{stage}"] = statistics.median(samples) * 1e6
+    return results
+
+
+def load_macro(path: str) -> Dict[str, float]:
+    """Flatten a load_test JSON report into `macro.<endpoint>.<field>` keys."""
+    with open(path, encoding="utf-8") as fh:
+        report = json.load(fh)
+    out = {}
+    sections = dict(report.get("endpoints", {}))
+    sections["TOTAL"] = report.get("overall", {})
+    for endpoint, summary in sections.items():
+        for field_name in MACRO_FIELDS:
+            if summary.get(field_name) is not None:
+                out[f"macro.{endpoint}.{field_name}"] = float(summary[field_name])
+    return out
+
+
+# ---------------------------------------------------------
+# COMPARISON
+# ---------------------------------------------------------
+def tolerance_for(key: str, tolerances: Dict[str, float], default: float) -> float:
+    """Most specific matching fnmatch pattern wins (longest pattern)."""
+    matches = [(len(p), t) for p, t in tolerances.items() if fnmatch.fnmatch(key, p)]
+    return max(matches)[1] if matches else default
+
+
+def compare(
+    current: Dict[str, float],
+    baseline: Dict[str, float],
+    tolerances: Dict[str, float],
+    default_tolerance: float,
+    min_delta_us: float = DEFAULT_MIN_DELTA_US,
+    min_delta_fraction: float = DEFAULT_MIN_DELTA_FRACTION,
+) -> List[Tuple[str, Optional[float], Optional[float], Optional[float], str]]:
+    """
+    (key, baseline, current, relative delta, status) per measurement. Micro
+    timings within min(`min_delta_us`, `min_delta_fraction` x baseline) of
+    their baseline are OK whatever the relative delta.
+    """
+    rows = []
+    for key in sorted(set(current) | set(baseline)):
+        cur, base = current.get(key), baseline.get(key)
+        if base is None:
+            rows.append((key, None, cur, None, "NEW"))
+            continue
+        if cur is None:
+            rows.append((key, base, None, None, "MISSING"))
+            continue
+        delta = (cur - base) / base if base else 0.0
+        if key.endswith(HIGHER_IS_BETTER):
+            delta = -delta
+        tol = tolerance_for(key, tolerances, default_tolerance)
+        if key.startswith("micro.") and abs(cur - base) <= min(min_delta_us, min_delta_fraction * base):
+            status = "OK"
+        elif delta > tol:
+            status = "REGRESSED"
+        elif delta < -tol:
+            status = "IMPROVED"
+        else:
+            status = "OK"
+        rows.append((key, base, cur, delta, status))
+    return rows
+
+
+def format_rows(rows) -> str:
+    header = f"{'measurement':<52}{'baseline':>12}{'current':>12}{'delta':>9}  status"
+    lines = [header, "-" * len(header)]
+    for key, base, cur, delta, status in rows:
+        lines.append(
+            f"{key:<52}{_num(base):>12}{_num(cur):>12}"
+            f"{('NA' if delta is None else f'{delta * 100:+.1f}%'):>9}  {status}"
+        )
+    return "\n".join(lines)
+
+
+def _num(value: Optional[float]) -> str:
+    return "NA" if value is None else f"{value:.2f}"
+
+
+def _normalise(results: Dict[str, float], calibration: float, baseline_calibration: float) -> Dict[str, float]:
+    """Rescale micro timings to the speed of the machine that recorded the baselines."""
+    factor = baseline_calibration / calibration
+    return {k: (v * factor if k.startswith("micro.") else v) for k, v in results.items()}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Performance regression gate")
+    parser.add_argument("command", choices=["run", "update"])
+    parser.add_argument("--baseline-file", default=DEFAULT_BASELINE_FILE)
+    parser.add_argument("--only", default=None, help="comma-separated modules")
+    parser.add_argument("--companies", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=11)
+    parser.add_argument("--rounds", type=int, default=3, help="measurements `update` takes the median of")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--macro", default=None, help="load_test --json-out report to include")
+    parser.add_argument("--tolerance", type=float, default=None, help="default relative tolerance")
+    parser.add_argument("--min-delta-us", type=float, default=None, help="absolute floor for micro regressions")
+    parser.add_argument("--min-delta-fraction", type=float, default=None, help="cap on that floor, as a share of the baseline")
+    parser.add_argument("--no-normalise", action="store_true", help="compare raw timings across machines")
+    parser.add_argument("--no-recheck", action="store_true", help="fail without re-timing regressed modules")
+    args = parser.parse_args(argv)
+
+    modules = [m.strip() for m in args.only.split(",")] if args.only else list(pipeline.MODULES)
+
+    stored = {}
+    if os.path.exists(args.baseline_file):
+        with open(args.baseline_file, encoding="utf-8") as fh:
+            stored = json.load(fh)
+
+    def _measure(mods: List[str]) -> Tuple[float, Dict[str, float]]:
+        """(calibration, timings rescaled to it); each module is rescaled by its own calibration."""
+        reference = stored.get("calibration_s") if args.command == "run" and not args.no_normalise else None
+        results: Dict[str, float] = {}
+        for module in mods:
+            calibration = calibrate()
+            reference = reference or calibration
+            timings = run_micro([module], companies=args.companies, repeats=args.repeats, seed=args.seed)
+            results.update(timings if args.no_normalise else _normalise(timings, calibration, reference))
+        return reference, results
+
+    if args.command == "update":
+        # Baselines are the median of several measurements, each at its own machine speed
+        rounds = [_measure(modules) for _ in range(max(1, args.rounds))]
+        calibration = statistics.median(cal for cal, _ in rounds)
+        rounds = [_normalise(results, cal, calibration) for cal, results in rounds]
+        current = {key: statistics.median(r[key] for r in rounds) for key in rounds[0]}
+    else:
+        calibration, current = _measure(modules)
+    if args.macro:
+        current.update(load_macro(args.macro))
+
+    if args.command == "update":
+        baselines = dict(stored.get("baselines", {}))
+        if stored.get("calibration_s"):
+            # keep untouched micro baselines consistent with the new calibration
+            baselines = _normalise(baselines, stored["calibration_s"], calibration)
+        baselines.update(current)
+        stored.update(
+            {
+                "baselines": baselines,
+                "calibration_s": calibration,
+                "recorded_on": platform.platform(),
+                "python": platform.python_version(),
+                "tolerances": stored.get("tolerances", {"micro.*": 0.35, "micro.*.run": 0.5, "macro.*": 0.5}),
+                "default_tolerance": stored.get("default_tolerance", DEFAULT_TOLERANCE),
+                "min_delta_us": stored.get("min_delta_us", DEFAULT_MIN_DELTA_US),
+                "min_delta_fraction": stored.get("min_delta_fraction", DEFAULT_MIN_DELTA_FRACTION),
+            }
+        )
+        os.makedirs(os.path.dirname(args.baseline_file) or ".", exist_ok=True)
+        with open(args.baseline_file, "w", encoding="utf-8") as fh:
+            json.dump(stored, fh, indent=2, sort_keys=True)
+            fh.write("\n")
+        print(f"Updated {len(current)} baselines in {args.baseline_file}")
+        return 0
+
+    if not stored:
+        print(f"No baselines at {args.baseline_file}; run `update` first.", file=sys.stderr)
+        return 2
+
+    baseline = stored["baselines"]
+    # Only compare what was measured in this run
+    prefixes = tuple(f"micro.{m}." for m in modules) + (("macro.",) if args.macro else ())
+    baseline = {k: v for k, v in baseline.items() if k.startswith(prefixes)}
+
+    default_tol = args.tolerance if args.tolerance is not None else stored.get("default_tolerance", DEFAULT_TOLERANCE)
+    tolerances = {} if args.tolerance is not None else stored.get("tolerances", {})
+    min_delta = args.min_delta_us if args.min_delta_us is not None else stored.get("min_delta_us", DEFAULT_MIN_DELTA_US)
+    min_fraction = (
+        args.min_delta_fraction if args.min_delta_fraction is not None
+        else stored.get("min_delta_fraction", DEFAULT_MIN_DELTA_FRACTION)
+    )
+    rows = compare(current, baseline, tolerances, default_tol, min_delta, min_fraction)
+    retry = sorted({r[0].split(".")[1] for r in rows if r[4] == "REGRESSED" and r[0].startswith("micro.")})
+    if retry and not args.no_recheck:
+        # A real regression survives a second measurement; a burst of machine load does not
+        print(f"Re-timing {', '.join(retry)} to rule out a transient slowdown", file=sys.stderr)
+        _, recheck = _measure(retry)
+        current.update(recheck)
+        rows = compare(current, baseline, tolerances, default_tol, min_delta, min_fraction)
+    print(format_rows(rows))
+
+    regressions = [r for r in rows if r[4] == "REGRESSED"]
+    if regressions:
+        print(f"\n{len(regressions)} measurement(s) regressed beyond tolerance.", file=sys.stderr)
+        return 1
+    print("\nNo performance regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
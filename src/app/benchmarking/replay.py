@@ -0,0 +1,435 @@
+# replay.py
+"""
+Traffic replay harness: timing and output diffs across code versions.
+
+Replays a corpus of recorded `AnalysisRequest` payloads through the
+in-process module runners and records, per request and module, the latency
+and the comparable parts of the output (key_metrics, rule flags, scores,
+trend values). Two such runs - from two git refs or two configurations -
+are then diffed.
+
+Corpus: a directory (or file) of *.json (one payload or a list), *.jsonl
+and *.jsonl.gz files. Lines may be bare payloads or capture records with
+the payload under "request".
+
+LLM modes:
+    stub   - deterministic in-process stand-in answers (default)
+    cache  - real client, responses cached on disk by prompt hash
+    off    - no LLM at all, deterministic fallbacks
+    live   - real client, no caching
+
+Usage:
+    python -m src.app.benchmarking.replay record --corpus corpus/ --out a.jsonl
+    python -m src.app.benchmarking.replay compare a.jsonl b.jsonl
+    python -m src.app.benchmarking.replay ab --corpus corpus/ --ref-a main --env-b OPENAI_MODEL=gpt-4o
+"""
+import argparse
+import contextlib
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .load_test import percentile
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+
+# Files the harness needs; overlaid into older checkouts that predate them
+TOOL_PATHS = [os.path.join("src", "app", "pipeline.py"), os.path.join("src", "app", "benchmarking")]
+
+
+# ---------------------------------------------------------
+# CORPUS
+# ---------------------------------------------------------
+def _open_text(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+def iter_corpus(path: str) -> Iterator[Tuple[str, dict]]:
+    """Yield (request_id, payload) for every recorded request, in a stable order."""
+    if os.path.isdir(path):
+        files = sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(path)
+            for name in names
+            if name.endswith((".json", ".jsonl", ".jsonl.gz", ".json.gz"))
+        )
+    else:
+        files = [path]
+
+    for file_path in files:
+        rel = os.path.relpath(file_path, path) if os.path.isdir(path) else os.path.basename(file_path)
+        with _open_text(file_path) as fh:
+            if file_path.endswith((".jsonl", ".jsonl.gz")):
+                records = (json.loads(line) for line in fh if line.strip())
+            else:
+                data = json.load(fh)
+                records = data if isinstance(data, list) else [data]
+            for idx, record in enumerate(records):
+                payload = record.get("request", record)
+                yield record.get("id") or f"{rel}#{idx}", payload
+
+
+# ---------------------------------------------------------
+# LLM MODES
+# ---------------------------------------------------------
+class CachingLLMClient:
+    """
+    Wraps a chat-completions client; answers are cached by hash of the model,
+    the messages and the request options in KEY_KWARGS, so a recording made
+    in lenient JSON mode or at another temperature is not replayed as a match.
+    Replayed answers report "replay" as their model. Without an inner client
+    (no OPENAI_API_KEY) a miss cannot be recorded: it answers "{}", so the
+    module falls back to its template narrative, and is counted in `unrecorded`.
+    """
+
+    KEY_KWARGS = ("temperature", "top_p", "max_tokens", "seed", "response_format")
+
+    def __init__(self, inner, cache_path: str):
+        from .llm_stub_server import _Namespace
+
+        self.inner = inner
+        self.cache_path = cache_path
+        self.lock = threading.Lock()
+        self.entries: Dict[str, str] = {}
+        self.hits = self.misses = self.unrecorded = 0
+        if os.path.exists(cache_path):
+            with open(cache_path, encoding="utf-8") as fh:
+                for line in fh:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["key"]] = entry["content"]
+        self._ns = _Namespace
+        self.chat = _Namespace(completions=_Namespace(create=self._create))
+
+    def _create(self, model=None, messages=None, **kwargs):
+        options = {name: kwargs[name] for name in self.KEY_KWARGS if kwargs.get(name) is not None}
+        key = hashlib.sha256(json.dumps([model, messages, options], sort_keys=True, default=str).encode()).hexdigest()
+        with self.lock:
+            content = self.entries.get(key)
+        stream = kwargs.pop("stream", False)
+        kwargs.pop("stream_options", None)
+        if content is None and self.inner is None:
+            self.misses += 1
+            self.unrecorded += 1
+            content, responder = "{}", "replay"
+        elif content is None:
+            self.misses += 1
+            # Recorded without streaming; streamed callers get the answer as one chunk
+            response = self.inner.chat.completions.create(model=model, messages=messages, **kwargs)
+            content = response.choices[0].message.content
+            responder = getattr(response, "model", None) or model
+            with self.lock:
+                self.entries[key] = content
+                with open(self.cache_path, "a", encoding="utf-8") as fh:
+                    fh.write(json.dumps({"key": key, "content": content}) + "\n")
+        else:
+            self.hits += 1
+            responder = "replay"
+        ns = self._ns
+        if stream:
+            chunk = ns(index=0, delta=ns(content=content), finish_reason="stop")
+            return iter([ns(model=responder, usage=None, choices=[chunk]), ns(model=responder, usage=None, choices=[])])
+        return ns(model=responder, choices=[ns(message=ns(role="assistant", content=content))], usage=None)
+
+
+@contextlib.contextmanager
+def llm_mode(mode: str, cache_path: Optional[str] = None):
+    from src.app import pipeline
+    from src.app.config import get_llm_client
+
+    if mode == "off":
+        with pipeline.deterministic_llm():
+            yield
+    elif mode == "stub":
+        from .llm_stub_server import StubLLMClient
+
+        with pipeline.llm_client_override(StubLLMClient()):
+            yield
+    elif mode == "cache":
+        client = CachingLLMClient(get_llm_client(), cache_path or "replay_llm_cache.jsonl")
+        if client.inner is None:
+            print(
+                f"[replay] no OPENAI_API_KEY: {len(client.entries)} cached answers; "
+                "misses use the template narrative",
+                file=sys.stderr,
+            )
+        with pipeline.llm_client_override(client):
+            yield
+        if client.unrecorded:
+            print(f"[replay] {client.unrecorded} cache misses were not recorded (no LLM client)", file=sys.stderr)
+    elif mode == "live":
+        yield
+    else:
+        raise ValueError(f"Unknown LLM mode '{mode}'")
+
+
+# ---------------------------------------------------------
+# RECORD
+# ---------------------------------------------------------
+def comparable(output: dict) -> dict:
+    """The parts of a module output that replay diffs look at."""
+    rules = {}
+    for idx, rule in enumerate(output.get("rules") or []):
+        key = rule.get("rule_id") or rule.get("rule_name") or str(idx)
+        while key in rules:
+            key += "'"
+        rules[key] = rule.get("flag")
+
+    trends = {}
+    for metric, block in (output.get("trends") or {}).items():
+        if isinstance(block, dict) and isinstance(block.get("values"), dict):
+            trends[metric] = {"values": block.get("values"), "yoy_growth_pct": block.get("yoy_growth_pct")}
+
+    return {
+        "key_metrics": output.get("key_metrics"),
+        "rules": rules,
+        "score": output.get("sub_score_adjusted"),
+        "summary_color": output.get("summary_color"),
+        "trends": trends,
+    }
+
+
+def record_run(
+    corpus: str,
+    out_path: str,
+    modules: Optional[List[str]] = None,
+    llm: str = "stub",
+    cache_path: Optional[str] = None,
+    label: Optional[str] = None,
+    repeats: int = 1,
+) -> int:
+    from src.app import pipeline
+
+    modules = modules or list(pipeline.MODULES)
+    count = 0
+    with open(out_path, "w", encoding="utf-8") as out, llm_mode(llm, cache_path):
+        out.write(json.dumps({"meta": {"label": label, "llm": llm, "modules": modules, "git": _git_rev()}}) + "\n")
+        for request_id, payload in iter_corpus(corpus):
+            for module in modules:
+                timings, result, error = [], None, None
+                for _ in range(repeats):
+                    t0 = time.perf_counter()
+                    try:
+                        with contextlib.redirect_stdout(io.StringIO()):
+                            result = pipeline.run_module(module, payload)
+                    except Exception as exc:
+                        error = f"{type(exc).__name__}: {exc}"
+                    timings.append((time.perf_counter() - t0) * 1000)
+                row = {"id": request_id, "module": module, "elapsed_ms": min(timings)}
+                if error:
+                    row["error"] = error
+                else:
+                    row["output"] = comparable(result)
+                out.write(json.dumps(row, default=str) + "\n")
+            count += 1
+    return count
+
+
+def _git_rev(cwd: str = None) -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=cwd or REPO_ROOT, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+# ---------------------------------------------------------
+# COMPARE
+# ---------------------------------------------------------
+def load_run(path: str) -> Tuple[dict, Dict[Tuple[str, str], dict]]:
+    meta, rows = {}, {}
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if "meta" in row:
+                meta = row["meta"]
+            else:
+                rows[(row["id"], row["module"])] = row
+    return meta, rows
+
+
+def _diff_values(a, b, path: str, rel_tol: float, out: List[str]):
+    if isinstance(a, dict) and isinstance(b, dict):
+        for key in sorted(set(a) | set(b), key=str):
+            _diff_values(a.get(key), b.get(key), f"{path}.{key}" if path else str(key), rel_tol, out)
+        return
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)) and not isinstance(a, bool):
+        if a == b or abs(a - b) <= rel_tol * max(abs(a), abs(b)):
+            return
+    elif a == b:
+        return
+    out.append(f"{path}: {a!r} -> {b!r}")
+
+
+def compare_runs(path_a: str, path_b: str, rel_tol: float = 1e-9, max_diffs: int = 20) -> Tuple[str, int]:
+    """Return (report text, number of requests whose outputs differ)."""
+    meta_a, rows_a = load_run(path_a)
+    meta_b, rows_b = load_run(path_b)
+
+    lines = [f"A: {path_a} {meta_a.get('label') or ''} git={meta_a.get('git')} llm={meta_a.get('llm')}",
+             f"B: {path_b} {meta_b.get('label') or ''} git={meta_b.get('git')} llm={meta_b.get('llm')}", ""]
+
+    # Latency per module
+    per_module: Dict[str, Tuple[List[float], List[float]]] = {}
+    for key in set(rows_a) & set(rows_b):
+        lat = per_module.setdefault(key[1], ([], []))
+        lat[0].append(rows_a[key]["elapsed_ms"])
+        lat[1].append(rows_b[key]["elapsed_ms"])
+
+    header = f"{'module':<18}{'n':>6}{'A p50':>10}{'B p50':>10}{'delta':>9}{'A p95':>10}{'B p95':>10}{'delta':>9}"
+    lines += [header, "-" * len(header)]
+    for module, (lat_a, lat_b) in sorted(per_module.items()):
+        a_sorted, b_sorted = sorted(lat_a), sorted(lat_b)
+        a50, b50 = statistics.median(a_sorted), statistics.median(b_sorted)
+        a95, b95 = percentile(a_sorted, 95), percentile(b_sorted, 95)
+        lines.append(
+            f"{module:<18}{len(lat_a):>6}{a50:>10.2f}{b50:>10.2f}{_pct(a50, b50):>9}"
+            f"{a95:>10.2f}{b95:>10.2f}{_pct(a95, b95):>9}"
+        )
+
+    # Output differences
+    differing = 0
+    detail: List[str] = []
+    for key in sorted(set(rows_a) | set(rows_b)):
+        row_a, row_b = rows_a.get(key), rows_b.get(key)
+        diffs: List[str] = []
+        if row_a is None or row_b is None:
+            diffs.append("only in " + ("B" if row_a is None else "A"))
+        elif "error" in row_a or "error" in row_b:
+            if row_a.get("error") != row_b.get("error"):
+                diffs.append(f"error: {row_a.get('error')!r} -> {row_b.get('error')!r}")
+        else:
+            _diff_values(row_a["output"], row_b["output"], "", rel_tol, diffs)
+        if diffs:
+            differing += 1
+            if len(detail) < max_diffs:
+                detail.append(f"[{key[1]}] {key[0]}")
+                detail.extend(f"    {d}" for d in diffs[:10])
+
+    lines += ["", f"{differing} request/module pair(s) with output differences"]
+    lines += detail
+    return "\n".join(lines), differing
+
+
+def _pct(a: float, b: float) -> str:
+    return "NA" if not a else f"{(b - a) / a * 100:+.1f}%"
+
+
+# ---------------------------------------------------------
+# A/B ACROSS REFS OR CONFIGURATIONS
+# ---------------------------------------------------------
+def _prepare_checkout(ref: Optional[str], workdir: str) -> str:
+    """Working tree for `ref` (None = current tree), with the harness overlaid if missing."""
+    if ref is None:
+        return REPO_ROOT
+    target = os.path.join(workdir, ref.replace("/", "_"))
+    subprocess.check_call(["git", "worktree", "add", "--detach", target, ref], cwd=REPO_ROOT)
+    for rel in TOOL_PATHS:
+        src, dst = os.path.join(REPO_ROOT, rel), os.path.join(target, rel)
+        if not os.path.exists(dst):
+            if os.path.isdir(src):
+                shutil.copytree(src, dst)
+            else:
+                shutil.copy2(src, dst)
+    return target
+
+
+def _parse_env(items: List[str]) -> Dict[str, str]:
+    return dict(item.split("=", 1) for item in items or [])
+
+
+def run_ab(args) -> int:
+    workdir = tempfile.mkdtemp(prefix="replay-ab-")
+    checkouts = []
+    try:
+        outputs = []
+        for side, ref, env_items in (("A", args.ref_a, args.env_a), ("B", args.ref_b, args.env_b)):
+            checkout = _prepare_checkout(ref, workdir)
+            if checkout != REPO_ROOT:
+                checkouts.append(checkout)
+            out_path = os.path.join(workdir, f"run_{side}.jsonl")
+            cmd = [
+                sys.executable, "-m", "src.app.benchmarking.replay", "record",
+                "--corpus", os.path.abspath(args.corpus), "--out", out_path,
+                "--llm", args.llm, "--label", f"{side}:{ref or 'worktree'}", "--repeats", str(args.repeats),
+            ]
+            if args.modules:
+                cmd += ["--modules", args.modules]
+            if args.cache:
+                cmd += ["--cache", os.path.abspath(args.cache)]
+            env = {**os.environ, **_parse_env(env_items), "PYTHONPATH": checkout}
+            subprocess.check_call(cmd, cwd=checkout, env=env)
+            outputs.append(out_path)
+
+        report, differing = compare_runs(*outputs, rel_tol=args.rel_tol)
+        print(report)
+        return 1 if (differing and args.fail_on_diff) else 0
+    finally:
+        for checkout in checkouts:
+            subprocess.call(["git", "worktree", "remove", "--force", checkout], cwd=REPO_ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay recorded traffic and diff versions")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="replay a corpus and write a run file")
+    rec.add_argument("--corpus", required=True)
+    rec.add_argument("--out", required=True)
+    rec.add_argument("--modules", default=None)
+    rec.add_argument("--llm", choices=["stub", "cache", "off", "live"], default="stub")
+    rec.add_argument("--cache", default=None, help="LLM response cache file (cache mode)")
+    rec.add_argument("--label", default=None)
+    rec.add_argument("--repeats", type=int, default=1, help="runs per request; the fastest is kept")
+
+    cmp_ = sub.add_parser("compare", help="diff two run files")
+    cmp_.add_argument("run_a")
+    cmp_.add_argument("run_b")
+    cmp_.add_argument("--rel-tol", type=float, default=1e-9)
+    cmp_.add_argument("--fail-on-diff", action="store_true")
+
+    ab = sub.add_parser("ab", help="record under two refs/configurations and diff")
+    ab.add_argument("--corpus", required=True)
+    ab.add_argument("--ref-a", default=None, help="git ref for A (default: working tree)")
+    ab.add_argument("--ref-b", default=None, help="git ref for B (default: working tree)")
+    ab.add_argument("--env-a", action="append", default=[], help="KEY=VALUE for A")
+    ab.add_argument("--env-b", action="append", default=[], help="KEY=VALUE for B")
+    ab.add_argument("--modules", default=None)
+    ab.add_argument("--llm", choices=["stub", "cache", "off", "live"], default="stub")
+    ab.add_argument("--cache", default=None)
+    ab.add_argument("--repeats", type=int, default=1)
+    ab.add_argument("--rel-tol", type=float, default=1e-9)
+    ab.add_argument("--fail-on-diff", action="store_true")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        modules = [m.strip() for m in args.modules.split(",")] if args.modules else None
+        count = record_run(args.corpus, args.out, modules, args.llm, args.cache, args.label, args.repeats)
+        print(f"Replayed {count} requests -> {args.out}", file=sys.stderr)
+        return 0
+    if args.command == "compare":
+        report, differing = compare_runs(args.run_a, args.run_b, rel_tol=args.rel_tol)
+        print(report)
+        return 1 if (differing and args.fail_on_diff) else 0
+    return run_ab(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
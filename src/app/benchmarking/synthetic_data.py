@@ -0,0 +1,343 @@
+# synthetic_data.py
+"""
+Seeded synthetic financial-universe generator for load and scale testing.
+
+Every generated company is a ready-to-post `AnalysisRequest` body: the year
+records carry exactly the fields of `FinancialYearData` (including the
+`Trade_receivables` casing and the percentage-string cost fields), so the
+output can be fed to any analyze endpoint, to the orchestrators directly or
+to the benchmarking tools in this package.
+
+Usage:
+    python -m src.app.benchmarking.synthetic_data --companies 1000 --years 5 \
+        --mix stable=0.5,growth=0.3,distressed=0.2 --seed 7 --format jsonl \
+        --output universe.jsonl
+"""
+import argparse
+import json
+import random
+import sys
+from typing import Dict, Iterator, List, Optional
+
+from src.app.request_model import FinancialYearData
+
+PROFILES = ("stable", "growth", "distressed", "sparse")
+
+DEFAULT_MIX = {"stable": 0.5, "growth": 0.3, "distressed": 0.2}
+
+# Fields zeroed out by the "sparse" profile (data vendors often report 0 for missing)
+SPARSE_FIELDS = (
+    "lease_liabilities",
+    "other_borrowings",
+    "preference_capital",
+    "investments",
+    "advance_from_customers",
+    "cwip",
+    "loans_n_advances",
+)
+
+# (revenue growth range, operating margin range, debt growth range, rate range)
+_PROFILE_SHAPES = {
+    "stable": ((0.02, 0.08), (0.14, 0.22), (-0.03, 0.05), (0.07, 0.10)),
+    "growth": ((0.12, 0.30), (0.12, 0.20), (0.10, 0.25), (0.08, 0.11)),
+    "distressed": ((-0.12, 0.02), (0.01, 0.08), (0.15, 0.40), (0.11, 0.16)),
+    "sparse": ((0.00, 0.10), (0.10, 0.18), (0.00, 0.10), (0.08, 0.12)),
+}
+
+FIELD_NAMES = list(FinancialYearData.__fields__.keys())
+
+
+def parse_mix(spec: Optional[str]) -> Dict[str, float]:
+    """
+    Parse a profile mix such as "stable=0.5,growth=0.3,distressed=0.2".
+    Weights are normalised; unknown profiles raise ValueError.
+    """
+    if not spec:
+        return dict(DEFAULT_MIX)
+
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in PROFILES:
+            raise ValueError(f"Unknown profile '{name}', expected one of {PROFILES}")
+        mix[name] = float(weight or 1)
+
+    total = sum(mix.values())
+    if total <= 0:
+        raise ValueError("Profile mix weights must sum to a positive number")
+    return {k: v / total for k, v in mix.items()}
+
+
+def _pct(value: float) -> str:
+    """Render a ratio as the percentage string used by the source data, e.g. '32.97%'."""
+    return f"{value * 100:.2f}%"
+
+
+def _pick_profile(rng: random.Random, mix: Dict[str, float]) -> str:
+    roll = rng.random()
+    cumulative = 0.0
+    for name, weight in mix.items():
+        cumulative += weight
+        if roll < cumulative:
+            return name
+    return list(mix.keys())[-1]
+
+
+def generate_company(
+    rng: random.Random,
+    company: str,
+    profile: str = "stable",
+    years: int = 5,
+    last_year: int = 2024,
+    drop_field_rate: float = 0.0,
+) -> dict:
+    """
+    Generate one `AnalysisRequest`-shaped payload.
+
+    Balances evolve year over year: the debt ladder (short-term, long-term,
+    lease, other borrowings) grows at the profile's debt growth rate while
+    revenue and margins follow the profile's operating shape, so the
+    deterministic engines see internally consistent trends.
+
+    drop_field_rate removes random keys from each year to exercise
+    validation paths (such payloads are rejected with 422 by the API).
+    """
+    rev_growth, margin_rng, debt_growth, rate_rng = _PROFILE_SHAPES[profile]
+
+    revenue = rng.uniform(500, 50000)
+    equity = revenue * rng.uniform(0.3, 0.9)
+    lt_debt = revenue * rng.uniform(0.05, 0.6)
+    st_debt = lt_debt * rng.uniform(0.15, 0.6)
+    lease = lt_debt * rng.uniform(0.0, 0.1)
+    other_borrowings = lt_debt * rng.uniform(0.0, 0.1)
+    gross_block = revenue * rng.uniform(0.4, 1.2)
+    acc_dep = gross_block * rng.uniform(0.2, 0.6)
+    cwip = gross_block * rng.uniform(0.02, 0.25)
+
+    if profile == "distressed":
+        equity *= 0.4
+
+    financial_years: List[dict] = []
+    first_year = last_year - years + 1
+
+    for year in range(first_year, last_year + 1):
+        margin = rng.uniform(*margin_rng)
+        rate = rng.uniform(*rate_rng)
+
+        material = rng.uniform(0.25, 0.55)
+        manufacturing = rng.uniform(0.05, 0.15)
+        employee = rng.uniform(0.05, 0.15)
+        other = max(0.0, 1 - margin - material - manufacturing - employee)
+
+        operating_profit = revenue * margin
+        depreciation = gross_block * rng.uniform(0.03, 0.07)
+        total_debt = st_debt + lt_debt + lease + other_borrowings
+        interest = total_debt * rate
+        capex = gross_block * rng.uniform(0.04, 0.15) * (1.6 if profile == "growth" else 1.0)
+        wc_changes = -revenue * rng.uniform(-0.02, 0.06)
+        taxes = max(0.0, (operating_profit - interest - depreciation) * 0.25)
+        pfo = operating_profit * rng.uniform(0.9, 1.05)
+        cfo = pfo + wc_changes - taxes
+
+        record = {
+            "year": year,
+            "total_equity": round(equity, 2),
+            "reserves": round(equity * rng.uniform(0.6, 0.95), 2),
+            "short_term_debt": round(st_debt, 2),
+            "long_term_debt": round(lt_debt, 2),
+            "cwip": round(cwip, 2),
+            "lease_liabilities": round(lease, 2),
+            "other_borrowings": round(other_borrowings, 2),
+            "trade_payables": round(revenue * rng.uniform(0.05, 0.2), 2),
+            "Trade_receivables": round(revenue * rng.uniform(0.08, 0.3), 2),
+            "advance_from_customers": round(revenue * rng.uniform(0.0, 0.05), 2),
+            "other_liability_items": round(revenue * rng.uniform(0.05, 0.2), 2),
+            "inventories": round(revenue * rng.uniform(0.05, 0.3), 2),
+            "cash_equivalents": round(revenue * rng.uniform(0.01, 0.15), 2),
+            "loans_n_advances": round(revenue * rng.uniform(0.0, 0.05), 2),
+            "other_asset_items": round(revenue * rng.uniform(0.02, 0.1), 2),
+            "gross_block": round(gross_block, 2),
+            "accumulated_depreciation": round(acc_dep, 2),
+            "investments": round(revenue * rng.uniform(0.0, 0.2), 2),
+            "preference_capital": round(equity * rng.uniform(0.0, 0.02), 2),
+            "revenue": round(revenue, 2),
+            "operating_profit": round(operating_profit, 2),
+            "interest": round(interest, 2),
+            "depreciation": round(depreciation, 2),
+            "material_cost": _pct(material),
+            "manufacturing_cost": _pct(manufacturing),
+            "employee_cost": _pct(employee),
+            "other_cost": _pct(other),
+            "expenses": round(revenue - operating_profit, 2),
+            "fixed_assets_purchased": round(-capex, 2),
+            "profit_from_operations": round(pfo, 2),
+            "working_capital_changes": round(wc_changes, 2),
+            "direct_taxes": round(taxes, 2),
+            "interest_paid_fin": round(-interest, 2),
+            "cash_from_operating_activity": round(cfo, 2),
+        }
+
+        if profile == "sparse":
+            for field in SPARSE_FIELDS:
+                if rng.random() < 0.5:
+                    record[field] = 0.0
+
+        if drop_field_rate > 0:
+            for field in FIELD_NAMES:
+                if field != "year" and rng.random() < drop_field_rate:
+                    record.pop(field, None)
+
+        financial_years.append(record)
+
+        # Roll balances forward for the next year
+        revenue *= 1 + rng.uniform(*rev_growth)
+        growth = rng.uniform(*debt_growth)
+        st_debt *= 1 + growth * rng.uniform(0.8, 1.6)
+        lt_debt *= 1 + growth
+        lease *= 1 + growth * 0.5
+        other_borrowings *= 1 + growth * 0.5
+        equity *= 1 + (margin - 0.05) * rng.uniform(0.3, 0.8)
+        cwip *= 1 + rng.uniform(-0.2, 0.3)
+        gross_block += capex
+        acc_dep += depreciation
+
+    return {
+        "company": company,
+        "financial_data": {"financial_years": financial_years},
+    }
+
+
+def iter_universe(
+    companies: int,
+    years: int = 5,
+    seed: int = 0,
+    mix: Optional[Dict[str, float]] = None,
+    last_year: int = 2024,
+    drop_field_rate: float = 0.0,
+    prefix: str = "SYN",
+) -> Iterator[dict]:
+    """
+    Lazily yield `companies` payloads.
+
+    Each company gets its own RNG derived from (seed, index), so company i is
+    identical whether the universe has 10 or 100k members and generation can
+    stream without holding the universe in memory.
+    """
+    mix = mix or dict(DEFAULT_MIX)
+    width = max(5, len(str(companies)))
+    for idx in range(companies):
+        rng = random.Random(f"{seed}:{idx}")
+        profile = _pick_profile(rng, mix)
+        yield generate_company(
+            rng,
+            company=f"{prefix}{idx:0{width}d}",
+            profile=profile,
+            years=years,
+            last_year=last_year,
+            drop_field_rate=drop_field_rate,
+        )
+
+
+def flatten_rows(payload: dict) -> Iterator[dict]:
+    """One row per company-year, the columnar layout used for CSV / parquet."""
+    for fy in payload["financial_data"]["financial_years"]:
+        yield {"company": payload["company"], **fy}
+
+
+def write_universe(payloads, output: str, fmt: str = "jsonl", chunk_size: int = 10000) -> int:
+    """
+    Write payloads as json (single array), jsonl (one request per line),
+    csv or parquet (one row per company-year). Returns the company count.
+    """
+    count = 0
+
+    if fmt in ("json", "jsonl"):
+        out = sys.stdout if output == "-" else open(output, "w", encoding="utf-8")
+        try:
+            if fmt == "json":
+                out.write("[")
+            for payload in payloads:
+                if fmt == "json":
+                    out.write(("," if count else "") + "\n" + json.dumps(payload))
+                else:
+                    out.write(json.dumps(payload) + "\n")
+                count += 1
+            if fmt == "json":
+                out.write("\n]\n")
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        return count
+
+    if fmt not in ("csv", "parquet"):
+        raise ValueError(f"Unsupported format '{fmt}'")
+
+    import pandas as pd
+
+    writer = None
+    rows: List[dict] = []
+    header = True
+
+    def _flush():
+        nonlocal writer, header
+        if not rows:
+            return
+        frame = pd.DataFrame(rows, columns=["company"] + FIELD_NAMES)
+        if fmt == "csv":
+            frame.to_csv(output, mode="w" if header else "a", header=header, index=False)
+            header = False
+        else:
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise RuntimeError("parquet output requires pyarrow (pip install pyarrow)")
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(output, table.schema, compression="zstd")
+            writer.write_table(table)
+        rows.clear()
+
+    for payload in payloads:
+        rows.extend(flatten_rows(payload))
+        count += 1
+        if len(rows) >= chunk_size:
+            _flush()
+    _flush()
+
+    if writer is not None:
+        writer.close()
+    return count
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate a synthetic financial universe")
+    parser.add_argument("--companies", type=int, default=10)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--last-year", type=int, default=2024)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mix", default=None, help="e.g. stable=0.5,growth=0.3,distressed=0.2,sparse=0")
+    parser.add_argument("--drop-field-rate", type=float, default=0.0)
+    parser.add_argument("--format", choices=["json", "jsonl", "csv", "parquet"], default="jsonl")
+    parser.add_argument("--output", default="-", help="output path, '-' for stdout (json/jsonl only)")
+    args = parser.parse_args(argv)
+
+    if args.format in ("csv", "parquet") and args.output == "-":
+        parser.error("columnar formats need an --output path")
+
+    payloads = iter_universe(
+        companies=args.companies,
+        years=args.years,
+        seed=args.seed,
+        mix=parse_mix(args.mix),
+        last_year=args.last_year,
+        drop_field_rate=args.drop_field_rate,
+    )
+    count = write_universe(payloads, args.output, fmt=args.format)
+    print(f"Generated {count} companies x {args.years} years -> {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,7 +2,7 @@ from dataclasses import dataclass
 from typing import Optional
 
 
-@dataclass
+@dataclass(frozen=True)
 class BorrowingsRuleThresholds:
     high_de_ratio: float = 2.0
     very_high_de_ratio: float = 3.0
@@ -31,7 +31,7 @@ class BorrowingsRuleThresholds:
     covenant_buffer_pct: float = 0.10
 
 
-@dataclass
+@dataclass(frozen=True)
 class BorrowingsRuleConfig:
     generic: BorrowingsRuleThresholds
 
@@ -39,11 +39,12 @@ class BorrowingsRuleConfig:
 DEFAULT_RULE_CONFIG = BorrowingsRuleConfig(generic=BorrowingsRuleThresholds())
 
 
-def load_rule_config(_: Optional[str] = None) -> BorrowingsRuleConfig:
+def load_rule_config(industry_code: Optional[str] = None) -> BorrowingsRuleConfig:
     """
-    Placeholder for industry-specific overrides.
-    Currently returns the generic configuration but can be extended
-    to fetch YAML / DB-backed thresholds keyed by industry_code.
+    Rule thresholds for `industry_code` from the threshold store
+    (see `src.app.thresholds`); GENERAL when the industry has no entry.
     """
-    return DEFAULT_RULE_CONFIG
+    from src.app.thresholds import get_thresholds
+
+    return get_thresholds(industry_code).borrowings
 
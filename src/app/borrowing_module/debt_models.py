@@ -32,12 +32,18 @@ class IndustryBenchmarks(BaseModel):
     high_floating_share: Optional[float] = 0.6
     high_wacd: Optional[float] = 0.12
 
+    class Config:
+        frozen = True  # shared per industry by the threshold store
+
 
 class CovenantLimits(BaseModel):
     de_ratio_limit: float
     icr_limit: float
     debt_ebitda_limit: float
 
+    class Config:
+        frozen = True  # shared per industry by the threshold store
+
 
 class BorrowingsInput(BaseModel):
     company_id: str
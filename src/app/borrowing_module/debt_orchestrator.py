@@ -12,7 +12,8 @@ from .debt_insight_fallback import generate_fallback_insight
 
 class BorrowingsModule:
     def __init__(self, rule_config: BorrowingsRuleConfig = None):
-        self.rule_config = rule_config or load_rule_config()
+        # None: rule thresholds come from the threshold store per industry
+        self.rule_config = rule_config
 
     def run(self, bi: BorrowingsInput) -> BorrowingsOutput:
         per_year_metrics = compute_per_year_metrics(bi.financials_5y)
@@ -23,7 +24,7 @@ class BorrowingsModule:
             trends=trend_metrics,
             benchmarks=bi.industry_benchmarks,
             covenants=bi.covenant_limits,
-            rule_config=self.rule_config,
+            rule_config=self.rule_config or load_rule_config(bi.industry_code),
         )
 
         base_score = self._compute_score(rule_results)
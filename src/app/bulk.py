@@ -0,0 +1,351 @@
+# bulk.py
+"""
+File-to-file bulk runs of the analysis modules, without HTTP.
+
+Reads a universe of `AnalysisRequest` payloads, runs any subset of the five
+modules through `src.app.pipeline` in a process pool and writes one output
+record per company. Companies are sent to the workers in chunks and written
+back in input order, so the output file is deterministic for a given input
+and never holds a partial company.
+
+Input:
+    directory / .json / .jsonl / .jsonl.gz   payloads, as read by the replay harness
+    .csv                                     one row per company-year (`company` plus the
+                                             `FinancialYearData` columns; other columns such as
+                                             `industry_code` go to the payload). Rows of one company
+                                             must be adjacent, as `synthetic_data` writes them.
+
+Output:
+    .jsonl    {"id", "company", "elapsed_ms", "modules": {module: output | {"error"}}}
+    .csv      one summary row per company and module (score, colour, flag counts, error)
+
+Checkpoint/resume: after every written chunk `<output>.checkpoint` records
+how many input companies are done and the output size at that point. A
+rerun with --resume truncates the output to that size and skips those
+companies; without --resume an existing output is overwritten.
+
+Progress (companies done, throughput, errors) goes to stderr every
+--progress-seconds; the final summary is printed as JSON. With --export DIR
+a JSONL output is also flattened into analytics tables once the run
+completes (see `src.app.columnar_export`).
+
+Usage:
+    python -m src.app.bulk --input universe.jsonl --output results.jsonl --workers 8
+    python -m src.app.bulk --input universe.csv --output summary.csv --modules borrowings,liquidity --llm off
+    python -m src.app.bulk --input universe.jsonl --output results.jsonl --resume
+    python -m src.app.bulk --input universe.jsonl --output results.jsonl --export export/
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Iterator, List, Optional, Tuple
+
+SUMMARY_FIELDS = ["id", "company", "module", "score", "color", "red", "yellow", "green", "error"]
+
+
+# ---------------------------------------------------------
+# INPUT
+# ---------------------------------------------------------
+def _cell(value: str):
+    if value is None or value == "":
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        return value
+    return int(number) if number.is_integer() and "." not in value else number
+
+
+def iter_csv(path: str) -> Iterator[Tuple[str, dict]]:
+    """(id, payload) per company from a company-year CSV."""
+    from src.app.request_model import FinancialYearData
+
+    year_fields = set(FinancialYearData.__fields__)
+    payload: Optional[dict] = None
+    with open(path, encoding="utf-8", newline="") as fh:
+        for row in csv.DictReader(fh):
+            company = row.pop("company")
+            if payload is None or payload["company"] != company:
+                if payload is not None:
+                    yield payload["company"], payload
+                payload = {"company": company, "financial_data": {"financial_years": []}}
+                payload.update({k: v for k, v in row.items() if k not in year_fields and v != ""})
+            payload["financial_data"]["financial_years"].append(
+                {k: _cell(v) for k, v in row.items() if k in year_fields}
+            )
+    if payload is not None:
+        yield payload["company"], payload
+
+
+def iter_input(path: str) -> Iterator[Tuple[str, dict]]:
+    if path.endswith(".csv"):
+        return iter_csv(path)
+    from src.app.benchmarking.replay import iter_corpus
+
+    return iter_corpus(path)
+
+
+# ---------------------------------------------------------
+# WORKERS
+# ---------------------------------------------------------
+_worker_llm = "live"
+_worker_persist = False
+
+
+def _init_worker(llm: str, persist: bool) -> None:
+    global _worker_llm, _worker_persist
+    _worker_llm = llm
+    _worker_persist = persist
+
+
+def run_chunk(chunk: List[Tuple[str, dict]], modules: List[str]) -> List[dict]:
+    """Module outputs for a chunk of (id, payload); module prints are discarded."""
+    from src.app import pipeline
+    from src.app.benchmarking.replay import llm_mode
+    from src.app.results_store import get_results_store
+
+    records = []
+    with llm_mode(_worker_llm), contextlib.redirect_stdout(io.StringIO()):
+        for request_id, payload in chunk:
+            started = time.perf_counter()
+            outputs = pipeline.run_modules(payload, modules, persist=_worker_persist)
+            records.append({
+                "id": request_id,
+                "company": str(payload.get("company", "")).upper(),
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+                "modules": outputs,
+            })
+    if _worker_persist:
+        # Worker processes exit without running atexit hooks
+        get_results_store().flush()
+    return records
+
+
+# ---------------------------------------------------------
+# OUTPUT
+# ---------------------------------------------------------
+def summary_rows(record: dict) -> Iterator[dict]:
+    for module, output in record["modules"].items():
+        flags = [str(r.get("flag")) for r in output.get("rules") or []]
+        score = output.get("sub_score_adjusted")
+        yield {
+            "id": record["id"],
+            "company": record["company"],
+            "module": module,
+            "score": score if isinstance(score, (int, float)) else None,
+            "color": output.get("summary_color"),
+            "red": flags.count("RED"),
+            "yellow": flags.count("YELLOW"),
+            "green": flags.count("GREEN"),
+            "error": output.get("error"),
+        }
+
+
+class OutputWriter:
+    def __init__(self, path: str, resume_bytes: Optional[int] = None):
+        self.path = path
+        self.fmt = "csv" if path.endswith(".csv") else "jsonl"
+        if resume_bytes is not None:
+            with open(path, "r+b") as fh:
+                fh.truncate(resume_bytes)
+            self._fh = open(path, "a", encoding="utf-8", newline="")
+        else:
+            self._fh = open(path, "w", encoding="utf-8", newline="")
+        self._csv = None
+        if self.fmt == "csv":
+            self._csv = csv.DictWriter(self._fh, fieldnames=SUMMARY_FIELDS)
+            if not resume_bytes:
+                self._csv.writeheader()
+
+    def write(self, records: List[dict]) -> int:
+        """Write and flush a chunk; returns the output size afterwards."""
+        for record in records:
+            if self._csv is not None:
+                self._csv.writerows(summary_rows(record))
+            else:
+                self._fh.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        return self._fh.tell()
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+def _checkpoint_path(output: str) -> str:
+    return output + ".checkpoint"
+
+
+def read_checkpoint(output: str) -> Optional[dict]:
+    path = _checkpoint_path(output)
+    if not (os.path.exists(path) and os.path.exists(output)):
+        return None
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def write_checkpoint(output: str, **fields) -> None:
+    path = _checkpoint_path(output)
+    with open(path + ".tmp", "w", encoding="utf-8") as fh:
+        json.dump(fields, fh)
+    os.replace(path + ".tmp", path)
+
+
+# ---------------------------------------------------------
+# RUN
+# ---------------------------------------------------------
+class Progress:
+    def __init__(self, every_seconds: float, already_done: int = 0):
+        self.every_seconds = every_seconds
+        self.started = time.perf_counter()
+        self.already_done = already_done
+        self.companies = 0
+        self.module_errors = 0
+        self._last = self.started
+
+    def update(self, records: List[dict]) -> None:
+        self.companies += len(records)
+        self.module_errors += sum(
+            1 for record in records for output in record["modules"].values() if "error" in output
+        )
+        now = time.perf_counter()
+        if self.every_seconds and now - self._last >= self.every_seconds:
+            self._last = now
+            print(
+                f"[bulk] {self.already_done + self.companies} companies, "
+                f"{self.rate():.1f}/s, {self.module_errors} module errors",
+                file=sys.stderr,
+                flush=True,
+            )
+
+    def rate(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return self.companies / elapsed if elapsed > 0 else 0.0
+
+
+def _chunks(items: Iterator[Tuple[str, dict]], size: int) -> Iterator[List[Tuple[str, dict]]]:
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def run_bulk(
+    input_path: str,
+    output_path: str,
+    modules: Optional[List[str]] = None,
+    workers: Optional[int] = None,
+    chunk_size: int = 20,
+    llm: str = "live",
+    resume: bool = False,
+    persist: bool = False,
+    limit: Optional[int] = None,
+    progress_seconds: float = 5.0,
+) -> dict:
+    from src.app.pipeline import MODULES
+
+    modules = list(modules or MODULES)
+    unknown = set(modules) - set(MODULES)
+    if unknown:
+        raise ValueError(f"Unknown modules {sorted(unknown)}")
+    workers = (os.cpu_count() or 1) if workers is None else workers
+
+    checkpoint = read_checkpoint(output_path) if resume else None
+    if checkpoint and checkpoint.get("modules") != modules:
+        raise ValueError(f"Checkpoint was written for modules {checkpoint.get('modules')}")
+    done = checkpoint["companies"] if checkpoint else 0
+
+    items = islice(iter_input(input_path), done, limit)
+    writer = OutputWriter(output_path, checkpoint["output_bytes"] if checkpoint else None)
+    progress = Progress(progress_seconds, already_done=done)
+
+    def _commit(records: List[dict]) -> None:
+        nonlocal done
+        size = writer.write(records)
+        done += len(records)
+        write_checkpoint(output_path, companies=done, output_bytes=size, modules=modules)
+        progress.update(records)
+
+    try:
+        if workers <= 0:
+            _init_worker(llm, persist)
+            for chunk in _chunks(items, chunk_size):
+                _commit(run_chunk(chunk, modules))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(llm, persist)) as pool:
+                # Bounded window of chunks in flight, collected in submission order
+                pending: deque = deque()
+                for chunk in _chunks(items, chunk_size):
+                    pending.append(pool.submit(run_chunk, chunk, modules))
+                    if len(pending) >= workers * 2:
+                        _commit(pending.popleft().result())
+                while pending:
+                    _commit(pending.popleft().result())
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - progress.started
+    return {
+        "input": input_path,
+        "output": output_path,
+        "modules": modules,
+        "workers": workers,
+        "llm": llm,
+        "resumed_from": checkpoint["companies"] if checkpoint else None,
+        "companies": progress.companies,
+        "total_companies": done,
+        "module_errors": progress.module_errors,
+        "elapsed_seconds": round(elapsed, 2),
+        "companies_per_second": round(progress.rate(), 2),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the analysis modules over a universe file")
+    parser.add_argument("--input", required=True, help="payload file or directory (json/jsonl/jsonl.gz/csv)")
+    parser.add_argument("--output", required=True, help=".jsonl (full outputs) or .csv (summary rows)")
+    parser.add_argument("--modules", default=None, help="comma-separated (default: all)")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: CPU count, 0: in-process)")
+    parser.add_argument("--chunk-size", type=int, default=20, help="companies per worker task")
+    parser.add_argument("--llm", choices=["live", "off", "stub"], default="live")
+    parser.add_argument("--resume", action="store_true", help="continue from <output>.checkpoint")
+    parser.add_argument("--persist", action="store_true", help="also write outputs to the results store")
+    parser.add_argument("--limit", type=int, default=None, help="stop after this many input companies")
+    parser.add_argument("--progress-seconds", type=float, default=5.0)
+    parser.add_argument("--export", default=None, help="also write columnar tables of a .jsonl output here")
+    args = parser.parse_args(argv)
+    if args.export and args.output.endswith(".csv"):
+        parser.error("--export needs a .jsonl output")
+
+    modules = [m.strip() for m in args.modules.split(",")] if args.modules else None
+    result = run_bulk(
+        args.input,
+        args.output,
+        modules=modules,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        llm=args.llm,
+        resume=args.resume,
+        persist=args.persist,
+        limit=args.limit,
+        progress_seconds=args.progress_seconds,
+    )
+    if args.export:
+        from src.app.columnar_export import export, iter_bulk_output
+
+        result["export"] = export(iter_bulk_output(args.output), args.export)
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
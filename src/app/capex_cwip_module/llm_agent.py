@@ -105,13 +105,17 @@
 #         return deterministic_notes, base_score, {}
 
 
-import json
 from typing import List, Tuple
 
-from src.app.config import OPENAI_MODEL, get_llm_client
+from src.app.llm.gateway import get_llm_gateway
+from src.app.llm.json_stream import parse_llm_json
+from src.app.llm.narrative_cache import get_narrative_cache
+from src.app.narrative_engine import build_narrative, from_llm_answer, narrative_engine
+from src.app.llm.prompt_compactor import compact_json
 from .models import RuleResult
 
-client = get_llm_client()
+gateway = get_llm_gateway()
+narrative_cache = get_narrative_cache()
 
 
 def generate_llm_narrative(
@@ -126,9 +130,15 @@ def generate_llm_narrative(
     Generate LLM-powered narrative and dynamic trend insights.
     Returns: (narrative_list, adjusted_score, trend_insights_dict)
     """
-    if client is None:
-        # Fallback: return deterministic notes, no adjustment, no insights
-        return deterministic_notes, base_score, {}
+    template_narrative = build_narrative("capex_cwip", company_id, key_metrics, rule_results, trend_data)
+    if narrative_engine() == "template" or not gateway.use_llm():
+        # Fallback: deterministic four-section narrative, no adjustment, no insights
+        return template_narrative, base_score, {}
+
+    cached = narrative_cache.lookup("capex_cwip", company_id, key_metrics, rule_results)
+    if cached is not None:
+        # Same situation seen before: cached answer with this company's numbers
+        return from_llm_answer(cached, template_narrative, base_score)
 
     prompt_payload = {
         "company_id": company_id,
@@ -166,27 +176,20 @@ def generate_llm_narrative(
     '      "nfa": "insight..."\n'
     "  }\n"
     "}\n\n"
-    f"INPUT:\n{json.dumps(prompt_payload, ensure_ascii=False)}"
+    f"INPUT:\n{compact_json('capex_cwip', prompt_payload)}"
 )
 
-    response = client.chat.completions.create(
-        model=OPENAI_MODEL,
+    response = gateway.complete(
+        "capex_cwip",
         messages=[{"role": "user", "content": prompt}],
         temperature=0.2,
+        rules=rule_results,
     )
 
-    content = response.choices[0].message.content
-    try:
-        parsed = json.loads(content)
-        narrative = parsed.get("analysis_narrative") or deterministic_notes
-        score_adj = parsed.get("score_adjustment")
-        trend_insights = parsed.get("trend_insights") or {}
-        
-        if isinstance(score_adj, (int, float)):
-            adjusted_score = max(0, min(100, base_score + int(score_adj)))
-        else:
-            adjusted_score = base_score
-        return narrative, adjusted_score, trend_insights
-    except json.JSONDecodeError:
-        return deterministic_notes, base_score, {}
-    
\ No newline at end of file
+    parsed = parse_llm_json(response.choices[0].message.content)
+    if not parsed:
+        return template_narrative, base_score, {}
+    narrative_cache.store("capex_cwip", company_id, key_metrics, rule_results, parsed)
+    return from_llm_answer(parsed, template_narrative, base_score)
+
+    
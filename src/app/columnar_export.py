@@ -0,0 +1,303 @@
+# columnar_export.py
+"""
+Columnar export of module outputs for analytics tools.
+
+Flattens module outputs into three tables with a fixed schema, so every
+export (and every chunk of one) has the same columns whatever the data:
+
+    modules   one row per company and module: score, colour, flag counts,
+              error, and a wide key_metrics layout (one column per metric
+              in KEY_METRICS, empty where the module does not report it)
+    rules     one row per rule outcome (long form)
+    trends    one row per company, module and trend metric, with the
+              Y..Y-4 values and year-over-year growth side by side
+
+Input is a `src.app.bulk` JSONL output or the latest outputs in the results
+store. Records are read as a stream and written every --chunk-size
+companies, so memory stays bounded by the chunk rather than the universe.
+
+With pyarrow installed the tables are Parquet files (zstd, one row group
+per chunk); otherwise gzip-compressed CSV with the same columns.
+
+Usage:
+    python -m src.app.columnar_export --input results.jsonl --out-dir export/
+    python -m src.app.columnar_export --from-store --out-dir export/ --format csv
+    python -m src.app.bulk --input universe.jsonl --output results.jsonl --export export/
+"""
+import argparse
+import csv
+import gzip
+import json
+import math
+import os
+import sys
+import time
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Key metrics each module reports (`year` goes to fiscal_year)
+KEY_METRICS: Dict[str, Tuple[str, ...]] = {
+    "borrowings": (
+        "total_debt", "st_debt_share", "debt_to_equity", "debt_to_ebitda", "interest_coverage",
+        "debt_lt_1y_pct", "debt_1_3y_pct", "debt_gt_3y_pct", "floating_share", "wacd",
+        "ocf_to_debt", "debt_cagr", "ebitda_cagr", "finance_cost_cagr",
+    ),
+    "asset_quality": (),
+    "working_capital": ("dso", "dio", "dpo", "ccc", "cogs", "nwc_ratio", "revenue", "nwc"),
+    "capex_cwip": (
+        "capex_intensity", "cwip_pct", "asset_turnover", "debt_funded_capex", "fcf_coverage",
+        "capex_cagr", "cwip_cagr", "nfa_cagr", "revenue_cagr",
+    ),
+    "liquidity": (
+        "cash", "marketable_securities", "current_ratio", "quick_ratio",
+        "defensive_interval_ratio_days", "cash_ratio", "ocf_to_cl", "ocf_to_total_debt",
+        "interest_coverage_ocf", "cash_coverage_st_debt", "current_ratio_yoy_latest",
+        "cash_yoy_latest", "ocf_yoy_latest",
+    ),
+}
+METRIC_COLUMNS: List[str] = list(dict.fromkeys(name for names in KEY_METRICS.values() for name in names))
+_METRIC_SLOTS = {
+    module: [(METRIC_COLUMNS.index(name), name) for name in names] for module, names in KEY_METRICS.items()
+}
+
+PERIODS = ("Y", "Y-1", "Y-2", "Y-3", "Y-4")
+
+# (column, type) per table; types are "string", "int" or "float"
+SCHEMAS: Dict[str, List[Tuple[str, str]]] = {
+    "modules": [
+        ("company", "string"), ("module", "string"), ("fiscal_year", "int"), ("score", "float"),
+        ("color", "string"), ("red", "int"), ("yellow", "int"), ("green", "int"), ("error", "string"),
+    ] + [(name, "float") for name in METRIC_COLUMNS],
+    "rules": [
+        ("company", "string"), ("module", "string"), ("rule_id", "string"), ("rule_name", "string"),
+        ("metric", "string"), ("year", "string"), ("flag", "string"), ("value", "float"),
+        ("threshold", "string"), ("reason", "string"),
+    ],
+    "trends": [
+        ("company", "string"), ("module", "string"), ("metric", "string"),
+    ] + [(f"value_{p.replace('-', '_').lower()}", "float") for p in PERIODS]
+      + [(f"yoy_{p.replace('-', '_').lower()}", "float") for p in PERIODS[:-1]],
+}
+
+
+# ---------------------------------------------------------
+# FLATTENING
+# ---------------------------------------------------------
+def _float(value) -> Optional[float]:
+    # Exact type checks: bools are not metrics, and this runs per cell
+    if type(value) is float:
+        return value if math.isfinite(value) else None
+    if type(value) is int:
+        return float(value)
+    return None
+
+
+def _text(value) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+def flatten(company: str, module: str, output: dict) -> Tuple[tuple, List[tuple], List[tuple]]:
+    """(modules row, rules rows, trends rows) of one module output."""
+    rules = output.get("rules") or []
+    flags = [str(r.get("flag")) for r in rules]
+    metrics = output.get("key_metrics") or {}
+    year = metrics.get("year")
+    values: List[Optional[float]] = [None] * len(METRIC_COLUMNS)
+    for slot, name in _METRIC_SLOTS.get(module, ()):
+        values[slot] = _float(metrics.get(name))
+    module_row = (
+        company,
+        module,
+        year if isinstance(year, int) else None,
+        _float(output.get("sub_score_adjusted")),
+        output.get("summary_color"),
+        flags.count("RED"),
+        flags.count("YELLOW"),
+        flags.count("GREEN"),
+        _text(output.get("error")),
+    ) + tuple(values)
+
+    rule_rows = [
+        (
+            company, module, _text(r.get("rule_id")), _text(r.get("rule_name")), _text(r.get("metric")),
+            _text(r.get("year")), _text(r.get("flag")), _float(r.get("value")),
+            _text(r.get("threshold")), _text(r.get("reason")),
+        )
+        for r in rules
+    ]
+
+    trend_rows = []
+    for metric, block in (output.get("trends") or {}).items():
+        if not isinstance(block, dict) or not isinstance(block.get("values"), dict):
+            continue
+        values = block["values"]
+        yoy = block.get("yoy_growth_pct") or {}
+        trend_rows.append(
+            (company, module, metric)
+            + tuple(_float(values.get(p)) for p in PERIODS)
+            + tuple(_float(yoy.get(f"{p}_vs_{q}")) for p, q in zip(PERIODS, PERIODS[1:]))
+        )
+    return module_row, rule_rows, trend_rows
+
+
+# ---------------------------------------------------------
+# SOURCES
+# ---------------------------------------------------------
+def iter_bulk_output(path: str) -> Iterator[Tuple[str, str, dict]]:
+    """(company, module, output) from a `src.app.bulk` JSONL file."""
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            for module, output in record["modules"].items():
+                yield record["company"], module, output
+
+
+def iter_store(store, page_size: int = 500) -> Iterator[Tuple[str, str, dict]]:
+    """(company, module, output) for the newest stored output of every company and module."""
+    after = ("", "")
+    while True:
+        rows = store.query(
+            "SELECT l.company, l.module, r.payload FROM results_latest l JOIN results r ON r.id = l.result_id "
+            "WHERE (l.company, l.module) > (?, ?) ORDER BY l.company, l.module LIMIT ?",
+            (after[0], after[1], page_size),
+        )
+        if not rows:
+            return
+        for company, module, payload in rows:
+            yield company, module, json.loads(zlib.decompress(payload))
+        after = rows[-1][:2]
+
+
+# ---------------------------------------------------------
+# WRITERS
+# ---------------------------------------------------------
+class ParquetTableWriter:
+    TYPES = {"string": "string", "int": "int64", "float": "float64"}
+
+    def __init__(self, path: str, schema: List[Tuple[str, str]], compression: str = "zstd"):
+        self.path = path
+        self.schema = pa.schema([(name, self.TYPES[kind]) for name, kind in schema])
+        self._writer = pq.ParquetWriter(path, self.schema, compression=compression)
+
+    def write(self, rows: List[tuple]) -> None:
+        columns = list(zip(*rows)) if rows else [[] for _ in self.schema.names]
+        self._writer.write_table(pa.Table.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+            schema=self.schema,
+        ))
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+class CsvTableWriter:
+    def __init__(self, path: str, schema: List[Tuple[str, str]], compresslevel: int = 6):
+        self.path = path
+        self._fh = gzip.open(path, "wt", encoding="utf-8", newline="", compresslevel=compresslevel)
+        self._csv = csv.writer(self._fh)
+        self._csv.writerow([name for name, _ in schema])
+
+    def write(self, rows: List[tuple]) -> None:
+        self._csv.writerows(rows)
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+def resolve_format(fmt: str) -> str:
+    if fmt == "auto":
+        return "parquet" if pa is not None else "csv"
+    if fmt == "parquet" and pa is None:
+        raise RuntimeError("parquet output requires pyarrow (pip install pyarrow)")
+    return fmt
+
+
+def export(
+    records: Iterable[Tuple[str, str, dict]],
+    out_dir: str,
+    fmt: str = "auto",
+    chunk_size: int = 5000,
+) -> dict:
+    """Write the three tables for `records`; returns row counts, files and timing."""
+    started = time.perf_counter()
+    fmt = resolve_format(fmt)
+    os.makedirs(out_dir, exist_ok=True)
+    suffix = ".parquet" if fmt == "parquet" else ".csv.gz"
+    writer_cls = ParquetTableWriter if fmt == "parquet" else CsvTableWriter
+    writers = {table: writer_cls(os.path.join(out_dir, table + suffix), schema) for table, schema in SCHEMAS.items()}
+    buffers: Dict[str, List[tuple]] = {table: [] for table in SCHEMAS}
+    counts = {table: 0 for table in SCHEMAS}
+    companies = 0
+
+    def _flush() -> None:
+        for table, rows in buffers.items():
+            if rows:
+                writers[table].write(rows)
+                counts[table] += len(rows)
+                rows.clear()
+
+    try:
+        pending = 0
+        last_company = None
+        for company, module, output in records:
+            module_row, rule_rows, trend_rows = flatten(company, module, output)
+            buffers["modules"].append(module_row)
+            buffers["rules"].extend(rule_rows)
+            buffers["trends"].extend(trend_rows)
+            # Sources yield the modules of a company together
+            if company != last_company:
+                companies += 1
+                last_company = company
+                pending += 1
+                if pending >= chunk_size:
+                    _flush()
+                    pending = 0
+        _flush()
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    return {
+        "format": fmt,
+        "companies": companies,
+        "rows": counts,
+        "files": {table: writer.path for table, writer in writers.items()},
+        "elapsed_seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Export module outputs to columnar tables")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="src.app.bulk JSONL output")
+    source.add_argument("--from-store", action="store_true", help="latest outputs in the results store")
+    parser.add_argument("--out-dir", required=True)
+    parser.add_argument("--format", choices=["auto", "parquet", "csv"], default="auto")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="companies per written chunk")
+    args = parser.parse_args(argv)
+
+    if args.from_store:
+        from src.app.results_store import get_results_store
+
+        store = get_results_store()
+        if not store.enabled:
+            parser.error("the results store is disabled (RESULTS_STORE_PATH)")
+        records = iter_store(store)
+    else:
+        records = iter_bulk_output(args.input)
+    result = export(records, args.out_dir, fmt=args.format, chunk_size=args.chunk_size)
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
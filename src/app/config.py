@@ -15,11 +15,13 @@ OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")   # safer default
 
 def get_llm_client():
     # If no API key, return None → fallback
-    if not OPENAI_API_KEY:
+    if not OPENAI_API_KEY or OpenAI is None:
         return None
 
-    # New OpenAI client — key auto-loaded from env
-    return OpenAI()
+    # Shared pooled client owned by the process-wide LLM gateway
+    from src.app.llm.gateway import get_llm_gateway
+
+    return get_llm_gateway().client
 
 # config.py
 
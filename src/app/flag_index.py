@@ -0,0 +1,161 @@
+# flag_index.py
+"""
+In-memory inverted index over rule outcomes.
+
+Maps (module, rule_id, flag) to the set of companies whose latest stored
+output of that module has the rule at that flag, e.g.
+
+    ("borrowings", "F2", "RED")  ->  {"ACME", "GLOBEX", ...}
+
+The index is loaded once from the results store (`results_latest` joined
+with `result_flags`) and then kept current by a store listener: when a new
+output of a module is written for a company, its previous postings for that
+module are replaced. Queries are set intersections over the postings:
+
+    borrowings.F2:RED            companies with borrowings F2 RED
+    liquidity.D1:RED|YELLOW      either flag (union)
+    !capex_cwip.A1:RED           companies without it (needs another term)
+
+and `distribution()` reports flag counts per rule across the universe
+without touching the store.
+"""
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from src.app.results_store import ResultsStore
+
+Posting = Tuple[str, str, str]
+
+
+class FlagIndex:
+    def __init__(self):
+        self._postings: Dict[Posting, Set[str]] = defaultdict(set)
+        self._by_company: Dict[Tuple[str, str], List[Posting]] = {}
+        self._lock = threading.Lock()
+        self.updates = 0
+
+    # ---------------------------------------------------------
+    # MAINTENANCE
+    # ---------------------------------------------------------
+    def update(self, company: str, module: str, rules: Iterable[dict]) -> None:
+        """Replace the postings of `company` for `module` with its latest rule outcomes."""
+        postings = [(module, str(r["rule_id"]), str(r.get("flag"))) for r in rules if r.get("rule_id")]
+        with self._lock:
+            for posting in self._by_company.pop((company, module), []):
+                self._postings[posting].discard(company)
+            for posting in postings:
+                self._postings[posting].add(company)
+            self._by_company[(company, module)] = postings
+            self.updates += 1
+
+    def on_written(self, written: List[tuple]) -> None:
+        """Results-store listener."""
+        for company, module, rules in written:
+            self.update(company, module, rules)
+
+    def load(self, store: ResultsStore) -> None:
+        rows = store.query(
+            "SELECT l.company, f.module, f.rule_id, f.flag FROM results_latest l "
+            "JOIN result_flags f ON f.result_id = l.result_id"
+        )
+        grouped: Dict[Tuple[str, str], List[dict]] = defaultdict(list)
+        for company, module, rule_id, flag in rows:
+            grouped[(company, module)].append({"rule_id": rule_id, "flag": flag})
+        for (company, module), rules in grouped.items():
+            self.update(company, module, rules)
+
+    # ---------------------------------------------------------
+    # QUERIES
+    # ---------------------------------------------------------
+    @staticmethod
+    def parse(term: str) -> Tuple[bool, str, str, List[str]]:
+        """(negated, module, rule_id, flags) of "[!]module.rule_id:FLAG[|FLAG...]"."""
+        text = term.strip()
+        negated = text.startswith("!")
+        text = text.lstrip("!").strip()
+        try:
+            rule, flags = text.split(":", 1)
+            module, rule_id = rule.split(".", 1)
+        except ValueError:
+            raise ValueError(f"Cannot parse flag term '{term}' (expected module.rule_id:FLAG)")
+        return negated, module.strip(), rule_id.strip(), [f.strip().upper() for f in flags.split("|") if f.strip()]
+
+    def companies(self, terms: Iterable[str]) -> Set[str]:
+        """Companies matching every term."""
+        parsed = [self.parse(term) for term in terms]
+        if not parsed:
+            raise ValueError("A flag query needs at least one term")
+        if all(negated for negated, _, _, _ in parsed):
+            raise ValueError("A flag query needs at least one positive term")
+        with self._lock:
+            sets = []
+            excluded = []
+            for negated, module, rule_id, flags in parsed:
+                matched = set().union(*(self._postings.get((module, rule_id, flag), ()) for flag in flags))
+                (excluded if negated else sets).append(matched)
+        # Intersect from the smallest posting set
+        sets.sort(key=len)
+        result = set(sets[0])
+        for matched in sets[1:]:
+            if not result:
+                break
+            result &= matched
+        for matched in excluded:
+            result -= matched
+        return result
+
+    def query(self, terms: Iterable[str], limit: Optional[int] = None) -> dict:
+        started = time.perf_counter()
+        terms = list(terms)
+        matches = sorted(self.companies(terms))
+        return {
+            "match": terms,
+            "matches": len(matches),
+            "companies": matches[:limit] if limit else matches,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+
+    def distribution(self, module: Optional[str] = None, rule_id: Optional[str] = None) -> Dict[str, dict]:
+        """{module: {rule_id: {"total", "RED", "YELLOW", ...}}} company counts across the universe."""
+        with self._lock:
+            counts = {p: len(c) for p, c in self._postings.items() if c}
+        result: Dict[str, dict] = defaultdict(dict)
+        for (mod, rid, flag), count in sorted(counts.items()):
+            if (module and mod != module) or (rule_id and rid != rule_id):
+                continue
+            entry = result[mod].setdefault(rid, {"total": 0})
+            entry[flag] = count
+            entry["total"] += count
+        return dict(result)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "postings": sum(1 for c in self._postings.values() if c),
+                "companies": len({company for company, _ in self._by_company}),
+                "updates": self.updates,
+                "modules": dict(Counter(module for _, module in self._by_company)),
+            }
+
+
+_index: Optional[FlagIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_flag_index() -> FlagIndex:
+    """The process-wide index, loaded from the results store and kept current by it."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                from src.app.results_store import get_results_store
+
+                store = get_results_store()
+                index = FlagIndex()
+                if store.enabled:
+                    store.add_listener(index.on_written)
+                    index.load(store)
+                _index = index
+    return _index
@@ -1,12 +1,15 @@
 # liquidity_llm_v2.py
-import json
 from typing import List, Tuple, Optional
 
-from src.app.config import OPENAI_MODEL, get_llm_client
+from src.app.llm.gateway import get_llm_gateway
+from src.app.llm.json_stream import parse_llm_json
+from src.app.llm.narrative_cache import get_narrative_cache
+from src.app.narrative_engine import build_narrative, from_llm_answer, narrative_engine
+from src.app.llm.prompt_compactor import compact_json
 from .liquidity_models import RuleResult  # Assume similar to debt_models
 
-client = get_llm_client()
-model = OPENAI_MODEL
+gateway = get_llm_gateway()
+narrative_cache = get_narrative_cache()
 
 
 def generate_liquidity_narrative(
@@ -24,9 +27,16 @@ def generate_liquidity_narrative(
     """
     deterministic_notes = deterministic_notes or []
 
-    if client is None:
-        # fallback if LLM client not available
-        return deterministic_notes, {}
+    template_narrative = build_narrative("liquidity", company_id, key_metrics, rule_results, trend_data)
+    if narrative_engine() == "template" or not gateway.use_llm():
+        # fallback if LLM client not available (or template narratives requested)
+        return template_narrative, {}
+
+    cached = narrative_cache.lookup("liquidity", company_id, key_metrics, rule_results)
+    if cached is not None:
+        # Same situation seen before: cached answer with this company's numbers
+        narrative, _, trend_insights = from_llm_answer(cached, template_narrative)
+        return narrative, trend_insights
 
     prompt_payload = {
         "company_id": company_id,
@@ -67,35 +77,25 @@ Return a JSON object with:
 Only return valid JSON.
 
 INPUT:
-{json.dumps(prompt_payload, ensure_ascii=False)}
+{compact_json('liquidity', prompt_payload)}
 """
 
-    response = client.chat.completions.create(
-        model=model,
+    response = gateway.complete(
+        "liquidity",
         messages=[{"role": "user", "content": prompt}],
         temperature=0.3,
+        rules=rule_results,
     )
 
     content = response.choices[0].message.content
 
-    # Strip markdown code blocks if present
-    if content.startswith("```"):
-        content = content.split("```")[1]
-        if content.startswith("json"):
-            content = content[4:]
-        if content.endswith("```"):
-            content = content[:-3]
-    content = content.strip()
-
+    # Markdown fences and surrounding prose are handled by parse_llm_json (lenient mode)
+    parsed = parse_llm_json(content)
+    if not parsed:
+        if parsed is None:
+            print(f"❌ JSON Parse Error, content was: {(content or '')[:500]}", flush=True)
+        return template_narrative, {}
+    narrative_cache.store("liquidity", company_id, key_metrics, rule_results, parsed)
 
-    try:
-        #print("Parsing LLM liquidity narrative response...", flush=True)
-        parsed = json.loads(content)
-        narrative = parsed.get("analysis_narrative") or deterministic_notes
-        trend_insights = parsed.get("trend_insights") or {}
-
-        return narrative, trend_insights
-    except json.JSONDecodeError as e:
-        print(f"❌ JSON Parse Error: {e}", flush=True)
-        print(f"Content was: {content[:500]}", flush=True)
-        return deterministic_notes, {}
+    narrative, _, trend_insights = from_llm_answer(parsed, template_narrative)
+    return narrative, trend_insights
@@ -4,6 +4,7 @@ from typing import Dict, List, Tuple
 from .liquidity_metrics import compute_per_year_metrics
 from .liquidity_trend import compute_liquidity_trends      # NEW: your updated trend logic
 from .liquidity_rules import evaluate_rules
+from .liquidity_config import load_liquidity_config
 from .liquidity_llm import generate_liquidity_narrative
 from .liquidity_models import LiquidityModuleOutput, RuleResult , YearFinancials as LiquidityYearFinancials
 from .liquidity_insight_fallback import generate_liquidity_fallback_insight   # add if needed
@@ -37,7 +38,8 @@ class LiquidityModule:
         # -------------------------------
         #print("Evaluating liquidity rules...")
         latest_year = max(per_year_metrics.keys())
-        rule_dicts = evaluate_rules(per_year_metrics[latest_year], trend_metrics)
+        thresholds = load_liquidity_config(input_data.industry_code).generic
+        rule_dicts = evaluate_rules(per_year_metrics[latest_year], trend_metrics, thresholds)
 
         #print(f"Evaluated {len(rule_dicts)} rules.")
 
@@ -1,4 +1,4 @@
-from .liquidity_config import LIQUIDITY_RULES
+from .liquidity_config import LiquidityRuleThresholds, load_liquidity_config
 
 
 # ===========================================================
@@ -37,45 +37,45 @@ def _flag_basic(value, critical, moderate):
 # ===========================================================
 # Main Rule Engine
 # ===========================================================
-def evaluate_rules(metrics, trends):
+def evaluate_rules(metrics, trends, cfg: LiquidityRuleThresholds = None):
     rules = []
-    cfg = LIQUIDITY_RULES["generic"]
+    cfg = cfg or load_liquidity_config().generic
 
     # -------------------------------------------------------
     # A-Series: Liquidity Ratios (Current, Quick, Cash)
     # -------------------------------------------------------
     # A1 — Current Ratio
     cr = metrics.get("current_ratio")
-    cr_flag = _flag_basic(cr, cfg["critical_current_ratio"], cfg["moderate_current_ratio"])
+    cr_flag = _flag_basic(cr, cfg.critical_current_ratio, cfg.moderate_current_ratio)
     rules.append(_make(
         "A1",
         "Current Ratio Adequacy",
         cr,
-        f"RED < {cfg['critical_current_ratio']}, YELLOW < {cfg['moderate_current_ratio']}",
+        f"RED < {cfg.critical_current_ratio}, YELLOW < {cfg.moderate_current_ratio}",
         cr_flag,
         f"Current ratio is {round(cr, 2) if cr is not None else 'N/A'}, indicating the firm’s ability to meet short-term liabilities."
     ))
 
     # A2 — Quick Ratio
     qr = metrics.get("quick_ratio")
-    qr_flag = _flag_basic(qr, cfg["critical_quick_ratio"], cfg["moderate_quick_ratio"])
+    qr_flag = _flag_basic(qr, cfg.critical_quick_ratio, cfg.moderate_quick_ratio)
     rules.append(_make(
         "A2",
         "Quick Ratio Strength",
         qr,
-        f"RED < {cfg['critical_quick_ratio']}, YELLOW < {cfg['moderate_quick_ratio']}",
+        f"RED < {cfg.critical_quick_ratio}, YELLOW < {cfg.moderate_quick_ratio}",
         qr_flag,
         f"Quick ratio is {round(qr, 2) if qr is not None else 'N/A'}, assessing liquidity excluding inventory."
     ))
 
     # A3 — Cash Ratio
     cash_r = metrics.get("cash_ratio")
-    cash_flag = _flag_basic(cash_r, cfg["critical_cash_ratio"], cfg["moderate_cash_ratio"])
+    cash_flag = _flag_basic(cash_r, cfg.critical_cash_ratio, cfg.moderate_cash_ratio)
     rules.append(_make(
         "A3",
         "Cash Ratio Position",
         cash_r,
-        f"RED < {cfg['critical_cash_ratio']}, YELLOW < {cfg['moderate_cash_ratio']}",
+        f"RED < {cfg.critical_cash_ratio}, YELLOW < {cfg.moderate_cash_ratio}",
         cash_flag,
         f"Cash ratio stands at {round(cash_r, 2) if cash_r is not None else 'N/A'}, showing immediate liquidity cover."
     ))
@@ -85,12 +85,12 @@ def evaluate_rules(metrics, trends):
     # -------------------------------------------------------
     # B1 — DIR (Defensive Interval)
     dir_days = metrics.get("defensive_interval_ratio_days")
-    dir_flag = _flag_basic(dir_days, cfg["dir_critical_days"], cfg["dir_moderate_days"])
+    dir_flag = _flag_basic(dir_days, cfg.dir_critical_days, cfg.dir_moderate_days)
     rules.append(_make(
         "B1",
         "Defensive Interval Ratio (Days)",
         dir_days,
-        f"RED < {cfg['dir_critical_days']} days, YELLOW < {cfg['dir_moderate_days']} days",
+        f"RED < {cfg.dir_critical_days} days, YELLOW < {cfg.dir_moderate_days} days",
         dir_flag,
         f"DIR days = {round(dir_days, 2) if dir_days is not None else 'N/A'}, showing how long the company can operate using liquid assets alone."
     ))
@@ -100,24 +100,24 @@ def evaluate_rules(metrics, trends):
     # -------------------------------------------------------
     # C1 — OCF / Current Liabilities
     ocf_cl = metrics.get("ocf_to_current_liabilities")
-    ocf_cl_flag = _flag_basic(ocf_cl, cfg["ocf_cl_critical"], cfg["ocf_cl_moderate"])
+    ocf_cl_flag = _flag_basic(ocf_cl, cfg.ocf_cl_critical, cfg.ocf_cl_moderate)
     rules.append(_make(
         "C1",
         "OCF Coverage of Current Liabilities",
         ocf_cl,
-        f"RED < {cfg['ocf_cl_critical']}, YELLOW < {cfg['ocf_cl_moderate']}",
+        f"RED < {cfg.ocf_cl_critical}, YELLOW < {cfg.ocf_cl_moderate}",
         ocf_cl_flag,
         f"OCF/CL = {round(ocf_cl, 2) if ocf_cl is not None else 'N/A'}, measuring if operating cash flow can cover near-term obligations."
     ))
 
     # C2 — OCF / Total Debt
     ocf_debt = metrics.get("ocf_to_total_debt")
-    ocf_debt_flag = _flag_basic(ocf_debt, cfg["ocf_debt_critical"], cfg["ocf_debt_moderate"])
+    ocf_debt_flag = _flag_basic(ocf_debt, cfg.ocf_debt_critical, cfg.ocf_debt_moderate)
     rules.append(_make(
         "C2",
         "OCF Coverage of Total Debt",
         ocf_debt,
-        f"RED < {cfg['ocf_debt_critical']}, YELLOW < {cfg['ocf_debt_moderate']}",
+        f"RED < {cfg.ocf_debt_critical}, YELLOW < {cfg.ocf_debt_moderate}",
         ocf_debt_flag,
         f"OCF/Debt = {round(ocf_debt, 2) if ocf_debt is not None else 'N/A'}, showing long-term liquidity and repayment strength."
     ))
@@ -0,0 +1,379 @@
+# batch.py
+"""
+Offline bulk narrative generation through a provider batch-file workflow.
+
+Nightly universe runs do not need interactive LLM latency. Instead of
+calling the provider per module, the run is split in two:
+
+    prepare      run every module deterministically (CPU speed). Each LLM
+                 prompt the modules would send is written to a batch request
+                 file (OpenAI batch JSONL, one custom_id per prompt), and the
+                 deterministic outputs (template narratives) are stored
+    submit/fetch upload the request file to the provider batch API and
+                 download the results file when the batch completes
+    process-local  answer the request file with the local stand-in instead
+                 (for testing; no provider involved)
+    ingest       re-run the modules with the results file as their LLM: each
+                 module parses and merges its own answer exactly as it does
+                 online, and the stored outputs are rewritten
+
+Prompts are matched to results by a hash of (model, messages), so ingest
+must run with the same model routing and prompt settings as prepare.
+Prompts without a result (failed requests, changed settings) keep their
+deterministic narrative. Identical prompts are requested once.
+
+Work directory layout:
+    payloads.jsonl   the input payloads
+    requests.jsonl   batch request file
+    outputs.jsonl    module outputs per company (deterministic, then ingested)
+    results.jsonl    batch results file (fetched or processed locally)
+    batch.json       provider batch id and status
+    manifest.json    counts and settings of the run
+
+Usage:
+    python -m src.app.llm.batch prepare --input universe.jsonl --workdir runs/nightly
+    python -m src.app.llm.batch submit --workdir runs/nightly
+    python -m src.app.llm.batch fetch --workdir runs/nightly
+    python -m src.app.llm.batch process-local --workdir runs/nightly
+    python -m src.app.llm.batch ingest --workdir runs/nightly
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from src.app.llm.gateway import completion_response
+from src.app.llm.usage import current_scope
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+
+class _Namespace:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def prompt_key(model: Optional[str], messages: List[dict]) -> str:
+    return hashlib.sha256(json.dumps([model, messages], sort_keys=True).encode()).hexdigest()
+
+
+def _response(model: Optional[str], content: str, usage: Optional[dict], stream: bool):
+    """A chat completion (or a one-chunk stream of it) answered locally."""
+    usage_ns = _Namespace(**usage) if usage else None
+    if stream:
+        delta = _Namespace(index=0, delta=_Namespace(content=content), finish_reason="stop")
+        return iter([_Namespace(model=model, usage=None, choices=[delta]), _Namespace(model=model, usage=usage_ns, choices=[])])
+    response = completion_response(model, content)
+    response.usage = usage_ns
+    return response
+
+
+# ---------------------------------------------------------
+# CLIENTS
+# ---------------------------------------------------------
+class BatchRecorder:
+    """
+    Chat-completions client that records each request for the batch file and
+    answers "{}", so every module takes its deterministic path.
+    """
+
+    def __init__(self):
+        self.requests: Dict[str, dict] = {}
+        self.duplicates = 0
+        self._lock = threading.Lock()
+        self.chat = _Namespace(completions=_Namespace(create=self._create))
+
+    def _create(self, model=None, messages=None, stream: bool = False, stream_options=None, **kwargs):
+        key = prompt_key(model, messages)
+        scope = current_scope()
+        company = (scope.resolve_company() if scope is not None else None) or "unknown"
+        with self._lock:
+            if key in self.requests:
+                self.duplicates += 1
+            else:
+                self.requests[key] = {
+                    "custom_id": f"{company}:{key[:24]}",
+                    "method": "POST",
+                    "url": BATCH_ENDPOINT,
+                    "body": {"model": model, "messages": messages, **kwargs},
+                }
+        return _response(model, "{}", {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}, stream)
+
+
+class BatchResultsClient:
+    """Chat-completions client answering from a batch results file."""
+
+    def __init__(self, requests_path: str, results_path: str):
+        self.by_key: Dict[str, dict] = {}
+        self.matched = self.unmatched = self.failed = 0
+        self._lock = threading.Lock()
+        custom_ids = {}
+        for request in _read_jsonl(requests_path):
+            body = request["body"]
+            custom_ids[request["custom_id"]] = prompt_key(body.get("model"), body.get("messages"))
+        for result in _read_jsonl(results_path):
+            key = custom_ids.get(result.get("custom_id"))
+            if key is not None:
+                self.by_key[key] = result
+        self.chat = _Namespace(completions=_Namespace(create=self._create))
+
+    def _create(self, model=None, messages=None, stream: bool = False, stream_options=None, **_):
+        result = self.by_key.get(prompt_key(model, messages))
+        response = (result or {}).get("response") or {}
+        body = response.get("body") or {}
+        with self._lock:
+            if result is None:
+                self.unmatched += 1
+            elif result.get("error") or response.get("status_code") != 200 or not body.get("choices"):
+                self.failed += 1
+            else:
+                self.matched += 1
+        if result is None or not body.get("choices"):
+            return _response(model, "{}", None, stream)
+        content = body["choices"][0]["message"].get("content") or "{}"
+        return _response(body.get("model") or model, content, body.get("usage"), stream)
+
+
+# ---------------------------------------------------------
+# FILES
+# ---------------------------------------------------------
+def _read_jsonl(path: str) -> Iterable[dict]:
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _write_jsonl(path: str, records: Iterable[dict]) -> int:
+    count = 0
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        for record in records:
+            fh.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            count += 1
+    os.replace(tmp, path)
+    return count
+
+
+def _paths(workdir: str) -> Dict[str, str]:
+    names = ("payloads", "requests", "outputs", "results", "errors")
+    paths = {name: os.path.join(workdir, f"{name}.jsonl") for name in names}
+    paths["batch"] = os.path.join(workdir, "batch.json")
+    paths["manifest"] = os.path.join(workdir, "manifest.json")
+    return paths
+
+
+def _update_manifest(workdir: str, **fields) -> dict:
+    path = _paths(workdir)["manifest"]
+    manifest = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as fh:
+            manifest = json.load(fh)
+    manifest.update(fields)
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, indent=2)
+    return manifest
+
+
+def _run_universe(payloads: List[dict], modules: Optional[List[str]], client) -> Iterable[dict]:
+    from src.app.pipeline import llm_client_override, run_modules
+
+    with llm_client_override(client):
+        for payload in payloads:
+            yield {"company": payload.get("company"), "modules": run_modules(payload, modules)}
+
+
+# ---------------------------------------------------------
+# WORKFLOW
+# ---------------------------------------------------------
+def prepare(input_path: str, workdir: str, modules: Optional[List[str]] = None) -> dict:
+    """Deterministic run of the universe; writes the batch request file."""
+    from src.app.benchmarking.replay import iter_corpus
+
+    os.makedirs(workdir, exist_ok=True)
+    paths = _paths(workdir)
+    payloads = [payload for _, payload in iter_corpus(input_path)]
+    _write_jsonl(paths["payloads"], payloads)
+
+    recorder = BatchRecorder()
+    started = time.perf_counter()
+    outputs = _write_jsonl(paths["outputs"], _run_universe(payloads, modules, recorder))
+    elapsed = time.perf_counter() - started
+    requests = _write_jsonl(paths["requests"], recorder.requests.values())
+    return _update_manifest(
+        workdir,
+        prepared_at=time.strftime("%Y-%m-%dT%H:%M:%S"),
+        modules=modules,
+        companies=outputs,
+        requests=requests,
+        duplicate_prompts=recorder.duplicates,
+        deterministic_seconds=round(elapsed, 3),
+        llm="pending",
+    )
+
+
+def process_locally(workdir: str, error_rate: float = 0.0, seed: Optional[int] = None) -> int:
+    """Answer the request file with the local stand-in, in provider output format."""
+    from src.app.benchmarking.llm_stub_server import _usage, build_response_body, detect_module
+
+    paths = _paths(workdir)
+    rng = random.Random(seed)
+
+    def _results():
+        for request in _read_jsonl(paths["requests"]):
+            body = request["body"]
+            request_id = f"req_{rng.getrandbits(64):016x}"
+            if rng.random() < error_rate:
+                yield {
+                    "id": f"batch_req_{request_id}",
+                    "custom_id": request["custom_id"],
+                    "response": {"status_code": 500, "request_id": request_id, "body": {}},
+                    "error": {"code": "server_error", "message": "Simulated batch failure"},
+                }
+                continue
+            prompt = "\n".join(m.get("content") or "" for m in body.get("messages") or [])
+            content = json.dumps(build_response_body(detect_module(prompt), prompt, random.Random(prompt)))
+            yield {
+                "id": f"batch_req_{request_id}",
+                "custom_id": request["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "request_id": request_id,
+                    "body": {
+                        "id": f"chatcmpl-{request_id}",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": body.get("model", "stub"),
+                        "choices": [
+                            {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+                        ],
+                        "usage": _usage(prompt, content),
+                    },
+                },
+                "error": None,
+            }
+
+    count = _write_jsonl(paths["results"], _results())
+    _update_manifest(workdir, results=count, llm="results_ready", processed_by="local")
+    return count
+
+
+def submit(workdir: str, client=None) -> dict:
+    """Upload the request file and create a provider batch."""
+    client = client or _provider_client()
+    paths = _paths(workdir)
+    with open(paths["requests"], "rb") as fh:
+        uploaded = client.files.create(file=fh, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=uploaded.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window="24h",
+        metadata={"workdir": os.path.basename(os.path.abspath(workdir))},
+    )
+    info = {"batch_id": batch.id, "input_file_id": uploaded.id, "status": batch.status}
+    with open(paths["batch"], "w", encoding="utf-8") as fh:
+        json.dump(info, fh, indent=2)
+    _update_manifest(workdir, llm="submitted", batch_id=batch.id)
+    return info
+
+
+def fetch(workdir: str, client=None) -> dict:
+    """Poll the provider batch once; downloads the results file when it has completed."""
+    client = client or _provider_client()
+    paths = _paths(workdir)
+    with open(paths["batch"], encoding="utf-8") as fh:
+        info = json.load(fh)
+    batch = client.batches.retrieve(info["batch_id"])
+    info["status"] = batch.status
+    counts = getattr(batch, "request_counts", None)
+    if counts is not None:
+        info["request_counts"] = {"total": counts.total, "completed": counts.completed, "failed": counts.failed}
+    if batch.status == "completed":
+        if batch.output_file_id:
+            with open(paths["results"], "w", encoding="utf-8") as fh:
+                fh.write(client.files.content(batch.output_file_id).text)
+        if getattr(batch, "error_file_id", None):
+            with open(paths["errors"], "w", encoding="utf-8") as fh:
+                fh.write(client.files.content(batch.error_file_id).text)
+        _update_manifest(workdir, llm="results_ready", processed_by="provider")
+    with open(paths["batch"], "w", encoding="utf-8") as fh:
+        json.dump(info, fh, indent=2)
+    return info
+
+
+def ingest(workdir: str, results_path: Optional[str] = None, modules: Optional[List[str]] = None) -> dict:
+    """Re-run the universe with the batch results as the LLM; rewrites outputs.jsonl."""
+    paths = _paths(workdir)
+    with open(paths["manifest"], encoding="utf-8") as fh:
+        manifest = json.load(fh)
+    client = BatchResultsClient(paths["requests"], results_path or paths["results"])
+    payloads = list(_read_jsonl(paths["payloads"]))
+    started = time.perf_counter()
+    outputs = _write_jsonl(paths["outputs"], _run_universe(payloads, modules or manifest.get("modules"), client))
+    return _update_manifest(
+        workdir,
+        ingested_at=time.strftime("%Y-%m-%dT%H:%M:%S"),
+        companies=outputs,
+        matched=client.matched,
+        failed=client.failed,
+        unmatched=client.unmatched,
+        ingest_seconds=round(time.perf_counter() - started, 3),
+        llm="ingested",
+    )
+
+
+def _provider_client():
+    from src.app.llm.gateway import get_llm_gateway
+
+    client = get_llm_gateway().client
+    if client is None:
+        raise RuntimeError("No LLM client configured (OPENAI_API_KEY)")
+    return client
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline bulk narratives via batch request files")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("prepare", help="deterministic run + batch request file")
+    p.add_argument("--input", required=True, help="payload file or directory (json/jsonl/jsonl.gz)")
+    p.add_argument("--workdir", required=True)
+    p.add_argument("--modules", default=None, help="comma-separated (default: all)")
+
+    p = sub.add_parser("process-local", help="answer the request file with the local stand-in")
+    p.add_argument("--workdir", required=True)
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--seed", type=int, default=None)
+
+    p = sub.add_parser("submit", help="upload the request file to the provider batch API")
+    p.add_argument("--workdir", required=True)
+
+    p = sub.add_parser("fetch", help="poll the provider batch; download results when complete")
+    p.add_argument("--workdir", required=True)
+
+    p = sub.add_parser("ingest", help="merge a results file into the stored outputs")
+    p.add_argument("--workdir", required=True)
+    p.add_argument("--results", default=None, help="results file (default: <workdir>/results.jsonl)")
+
+    args = parser.parse_args(argv)
+    if args.command == "prepare":
+        modules = args.modules.split(",") if args.modules else None
+        result = prepare(args.input, args.workdir, modules)
+    elif args.command == "process-local":
+        result = {"results": process_locally(args.workdir, args.error_rate, args.seed)}
+    elif args.command == "submit":
+        result = submit(args.workdir)
+    elif args.command == "fetch":
+        result = fetch(args.workdir)
+    else:
+        result = ingest(args.workdir, args.results)
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
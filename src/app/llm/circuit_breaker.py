@@ -0,0 +1,209 @@
+# circuit_breaker.py
+"""
+Latency-aware circuit breaker shared by every LLM module.
+
+The gateway reports the outcome and latency of each provider call. Over a
+rolling time window the breaker trips OPEN when, with at least `min_calls`
+calls in the window, the error rate reaches `error_rate` or the p95 latency
+reaches `p95_latency`. While open, `gateway.enabled` is false and modules
+return their deterministic narrative immediately instead of waiting for a
+failing provider. After `cooldown` seconds the breaker goes HALF_OPEN and
+lets `half_open_probes` calls through: a fast success closes it, a failure
+or slow call re-opens it for another cool-down.
+
+Configuration (environment):
+    LLM_BREAKER                   0 disables the breaker (default 1)
+    LLM_BREAKER_WINDOW            rolling window in seconds (default 60)
+    LLM_BREAKER_MIN_CALLS         calls in the window before it can trip (default 10)
+    LLM_BREAKER_ERROR_RATE        error-rate trip threshold (default 0.5)
+    LLM_BREAKER_P95_LATENCY       p95 latency trip threshold in seconds (default 30)
+    LLM_BREAKER_COOLDOWN          seconds open before probing (default 30)
+    LLM_BREAKER_HALF_OPEN_PROBES  concurrent probe calls when half-open (default 1)
+"""
+import math
+import os
+import threading
+import time
+from collections import Counter, deque
+from typing import Deque, Optional, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        enabled: bool = True,
+        window: float = 60.0,
+        min_calls: int = 10,
+        error_rate: float = 0.5,
+        p95_latency: Optional[float] = 30.0,
+        cooldown: float = 30.0,
+        half_open_probes: int = 1,
+    ):
+        self.enabled = enabled
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.p95_latency = p95_latency
+        self.cooldown = cooldown
+        self.half_open_probes = half_open_probes
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._calls: Deque[Tuple[float, bool, float]] = deque()
+        self._trips: Counter = Counter()
+        self._short_circuited = 0
+        self._transitions: Deque[dict] = deque(maxlen=20)
+
+    @classmethod
+    def from_env(cls) -> "CircuitBreaker":
+        p95 = os.getenv("LLM_BREAKER_P95_LATENCY", "30")
+        return cls(
+            enabled=os.getenv("LLM_BREAKER", "1").lower() not in ("0", "false", "no", "off"),
+            window=float(os.getenv("LLM_BREAKER_WINDOW", 60)),
+            min_calls=int(os.getenv("LLM_BREAKER_MIN_CALLS", 10)),
+            error_rate=float(os.getenv("LLM_BREAKER_ERROR_RATE", 0.5)),
+            p95_latency=float(p95) if p95 else None,
+            cooldown=float(os.getenv("LLM_BREAKER_COOLDOWN", 30)),
+            half_open_probes=int(os.getenv("LLM_BREAKER_HALF_OPEN_PROBES", 1)),
+        )
+
+    # ---------------------------------------------------------
+    # STATE
+    # ---------------------------------------------------------
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            return self._state
+
+    def available(self, count: bool = True) -> bool:
+        """
+        Whether a call could go through now (does not take a probe permit);
+        with `count` a refusal is counted as short-circuited.
+        """
+        if not self.enabled:
+            return True
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probes < self.half_open_probes:
+                return True
+            if count:
+                self._short_circuited += 1
+            return False
+
+    def acquire(self) -> bool:
+        """Permit for one provider call; takes a probe permit when half-open."""
+        if not self.enabled:
+            return True
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                return True
+            self._short_circuited += 1
+            return False
+
+    def release_probe(self) -> None:
+        """
+        Return the probe permit of an `acquire`d call that ended without a
+        `record`ed outcome (e.g. its request's attempt budget ran out first).
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+
+    def record(self, success: bool, latency: float) -> None:
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                slow = self.p95_latency is not None and latency >= self.p95_latency
+                if success and not slow:
+                    self._calls.clear()
+                    self._transition(CLOSED, now, "probe succeeded")
+                else:
+                    self._trip(now, "probe_failed" if not success else "probe_slow")
+                return
+            if self._state == OPEN:
+                # Late result of a call admitted before the trip
+                return
+
+            self._calls.append((now, success, latency))
+            self._evict(now)
+            if len(self._calls) < self.min_calls:
+                return
+            errors = sum(1 for _, ok, _ in self._calls if not ok)
+            if errors / len(self._calls) >= self.error_rate:
+                self._trip(now, "error_rate")
+            elif self.p95_latency is not None and self._p95() >= self.p95_latency:
+                self._trip(now, "latency")
+
+    # ---------------------------------------------------------
+    # INTERNALS (lock held)
+    # ---------------------------------------------------------
+    def _evict(self, now: float) -> None:
+        while self._calls and self._calls[0][0] < now - self.window:
+            self._calls.popleft()
+
+    def _p95(self) -> float:
+        latencies = sorted(latency for _, _, latency in self._calls)
+        if not latencies:
+            return 0.0
+        return latencies[max(0, math.ceil(0.95 * len(latencies)) - 1)]
+
+    def _maybe_half_open(self, now: float) -> None:
+        if self._state == OPEN and now - self._opened_at >= self.cooldown:
+            self._probes = 0
+            self._transition(HALF_OPEN, now, "cool-down elapsed")
+
+    def _trip(self, now: float, reason: str) -> None:
+        self._trips[reason] += 1
+        self._opened_at = now
+        self._probes = 0
+        self._transition(OPEN, now, reason)
+        print(f"LLM circuit breaker OPEN ({reason}); deterministic fallbacks for {self.cooldown}s", flush=True)
+
+    def _transition(self, state: str, now: float, reason: str) -> None:
+        self._state = state
+        self._transitions.append({"state": state, "reason": reason, "at": round(time.time(), 3)})
+
+    # ---------------------------------------------------------
+    # METRICS
+    # ---------------------------------------------------------
+    def metrics(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            self._maybe_half_open(now)
+            self._evict(now)
+            calls = len(self._calls)
+            errors = sum(1 for _, ok, _ in self._calls if not ok)
+            latencies = sorted(latency for _, _, latency in self._calls)
+            return {
+                "enabled": self.enabled,
+                "state": self._state,
+                "window_s": self.window,
+                "window_calls": calls,
+                "window_error_rate": round(errors / calls, 4) if calls else 0.0,
+                "window_p50_ms": round(latencies[max(0, math.ceil(0.5 * calls) - 1)] * 1000, 2) if calls else None,
+                "window_p95_ms": round(self._p95() * 1000, 2) if calls else None,
+                "open_remaining_s": round(max(0.0, self.cooldown - (now - self._opened_at)), 2)
+                if self._state == OPEN
+                else 0.0,
+                "trips": dict(self._trips),
+                "short_circuited": self._short_circuited,
+                "transitions": list(self._transitions),
+            }
@@ -0,0 +1,186 @@
+# combined.py
+"""
+One LLM call per company on the multi-module path.
+
+When several modules run for the same company, each normally sends its own
+completion repeating the company context. A `CombinedLLMBatch` instead
+collects the prompt of every module (the modules run concurrently and block
+in `LLMGateway.complete`), sends ONE structured prompt holding every
+module's key metrics, fired rules and trend data, and hands each module its
+own section of the JSON answer. Modules parse their section exactly as they
+would parse a single-module response.
+
+A module whose section is missing or malformed falls back to its own
+single-module call; if the combined call itself fails, every module does.
+"""
+import json
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from src.app.llm.gateway import completion_response
+from src.app.llm.json_stream import parse_llm_json
+
+COMBINED_MARKER = "combined multi-module credit analysis"
+
+# Trend metrics each module reports insights for (mirrors the module prompts)
+MODULE_TREND_KEYS = {
+    "borrowings": ["short_term_debt", "long_term_debt", "finance_cost"],
+    "capex_cwip": ["capex", "cwip", "nfa"],
+    "liquidity": ["cash", "receivables", "inventory", "ocf", "current_liabilities"],
+}
+
+COMBINED_PROMPT = (
+    "You are the lead analyst in a " + COMBINED_MARKER + " system.\n"
+    "INPUT holds the structured analytics of several balance sheet modules for ONE company: "
+    "key metrics, fired rules (RED/YELLOW/GREEN) and multi-year trend data.\n\n"
+    "For EACH module in INPUT.modules return a section with:\n"
+    '- "analysis_narrative": EXACTLY four strings: 1. overall assessment, '
+    "2. key concerns (reference RED/YELLOW rules), 3. positives / mitigating factors, "
+    "4. final conclusion (1-2 sentences)\n"
+    '- "score_adjustment": integer between -5 and 5 (can be 0)\n'
+    '- "trend_insights": one data-driven insight string per metric listed in that module\'s '
+    '"trend_metrics" (growth pattern, YoY volatility, risks, strategic implication); {} if none\n\n'
+    "Return ONLY valid JSON mapping module name to its section:\n"
+    '{"<module>": {"analysis_narrative": [...], "score_adjustment": 0, "trend_insights": {...}}}\n\n'
+)
+
+
+def extract_module_context(messages: List[dict]) -> object:
+    """
+    The data part of a module prompt: the JSON after the final `INPUT:`
+    marker, or the prompt text itself for prompts without one.
+    """
+    text = "\n".join(m.get("content") or "" for m in messages if m.get("role") == "user")
+    marker = text.rfind("INPUT:")
+    if marker >= 0:
+        try:
+            return json.loads(text[marker + len("INPUT:"):].strip())
+        except ValueError:
+            pass
+    return " ".join(text.split())
+
+
+def build_combined_prompt(company_id: str, prompts: Dict[str, List[dict]]) -> str:
+    modules = {}
+    for module, messages in prompts.items():
+        context = extract_module_context(messages)
+        if isinstance(context, dict):
+            context = {k: v for k, v in context.items() if k != "company_id"}
+            trend_metrics = list((context.get("trend_data") or {}).keys()) or MODULE_TREND_KEYS.get(module, [])
+        else:
+            trend_metrics = MODULE_TREND_KEYS.get(module, [])
+        modules[module] = {"trend_metrics": trend_metrics, "analytics": context}
+
+    payload = {"company_id": company_id, "modules": modules}
+    return COMBINED_PROMPT + "INPUT:\n" + json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def split_combined_response(content: str, modules: Iterable[str]) -> Dict[str, dict]:
+    """Per-module sections of the combined answer; malformed or missing sections are left out."""
+    parsed = parse_llm_json(content)
+    if parsed is None:
+        return {}
+    if isinstance(parsed.get("modules"), dict):
+        parsed = parsed["modules"]
+
+    sections = {}
+    for module in modules:
+        section = parsed.get(module)
+        if isinstance(section, dict) and section.get("analysis_narrative"):
+            sections[module] = section
+    return sections
+
+
+class CombinedLLMBatch:
+    """
+    Rendezvous for the module threads of one company.
+
+    Each module thread calls `submit` from inside `LLMGateway.complete` and
+    blocks; once every expected module has either submitted or finished
+    without calling the LLM (`module_done`), the thread that completed the set
+    fires the combined call and wakes the others. `wait_timeout` bounds how
+    long a submitted module waits for slow siblings before the call is fired
+    with the prompts collected so far.
+    """
+
+    def __init__(self, company_id: str, modules: Iterable[str], gateway, wait_timeout: float = 30.0):
+        self.company_id = company_id
+        self.expected = set(modules)
+        self.gateway = gateway
+        self.wait_timeout = wait_timeout
+        self.prompts: Dict[str, List[dict]] = {}
+        self.rules: Dict[str, Optional[list]] = {}
+        self.sections: Optional[Dict[str, dict]] = None
+        self.model: Optional[str] = None
+        self._finished = set()
+        self._fired = False
+        self._cond = threading.Condition()
+
+    def submit(self, module: str, messages: List[dict], rules: Optional[Iterable] = None):
+        """
+        The module's section as a chat-completion response, or None when the
+        module should make its own single-module call instead.
+        """
+        with self._cond:
+            if self._fired or module not in self.expected or module in self.prompts:
+                return None
+            self.prompts[module] = messages
+            self.rules[module] = list(rules) if rules is not None else None
+            fire = self._ready()
+            if not fire:
+                self._cond.wait_for(lambda: self._fired, timeout=self.wait_timeout)
+                if not self._fired:
+                    self._fired = fire = True
+
+        if fire:
+            self._fire()
+        with self._cond:
+            self._cond.wait_for(lambda: self.sections is not None)
+            section = self.sections.get(module)
+        if not section:
+            return None
+        return completion_response(self.model, json.dumps(section, ensure_ascii=False))
+
+    def module_done(self, module: str) -> None:
+        """Mark a module finished (called whether or not it reached the LLM)."""
+        with self._cond:
+            self._finished.add(module)
+            fire = self._ready()
+        if fire:
+            self._fire()
+
+    def _ready(self) -> bool:
+        """Caller holds the lock; claims the call when every module is accounted for."""
+        if self._fired or not self.prompts:
+            return False
+        if self.expected <= (set(self.prompts) | self._finished):
+            self._fired = True
+            return True
+        return False
+
+    def _fire(self) -> None:
+        sections: Dict[str, dict] = {}
+        prompts = dict(self.prompts)
+        rules = None
+        if all(r is not None for r in self.rules.values()):
+            # The combined call is routed on every submitted module's flags
+            rules = [r for module_rules in self.rules.values() for r in module_rules]
+        try:
+            if len(prompts) == 1:
+                # Nothing to combine; let the single module call as usual
+                raise LookupError("single module")
+            response = self.gateway.complete(
+                "combined",
+                messages=[{"role": "user", "content": build_combined_prompt(self.company_id, prompts)}],
+                temperature=0.2,
+                rules=rules,
+            )
+            self.model = getattr(response, "model", None) or self.gateway.model_for("combined")
+            sections = split_combined_response(response.choices[0].message.content, prompts)
+        except LookupError:
+            pass
+        except Exception as exc:
+            print(f"Combined LLM call failed, falling back to per-module calls: {exc}", flush=True)
+        with self._cond:
+            self.sections = sections
+            self._cond.notify_all()
@@ -0,0 +1,494 @@
+# gateway.py
+"""
+Process-wide LLM gateway shared by every `*_llm` module.
+
+One OpenAI client backed by one pooled httpx transport: keep-alive
+connections (and HTTP/2 when the `h2` package is installed) are reused
+across modules and requests instead of each module paying its own TLS
+handshakes. Model choice is routed per module and the retry policy is
+configured in one place.
+
+Configuration (environment):
+    OPENAI_API_KEY              no key -> gateway disabled, modules use deterministic fallbacks
+    OPENAI_BASE_URL             alternative endpoint (e.g. the local stand-in server)
+    OPENAI_MODEL                default model for every module (default gpt-4o-mini)
+    OPENAI_MODEL_<MODULE>       per-module override, e.g. OPENAI_MODEL_LIQUIDITY=gpt-4o
+                                (OPENAI_MODEL_COMBINED for the combined multi-module call)
+    LLM_MAX_CONNECTIONS         pool size (default 50)
+    LLM_MAX_KEEPALIVE           idle keep-alive connections kept (default 20)
+    LLM_KEEPALIVE_EXPIRY        seconds an idle connection is kept (default 60)
+    LLM_HTTP2                   "auto" (default), "1" or "0"
+    LLM_TIMEOUT                 request timeout in seconds (default 60)
+
+Admission control and load shedding are configured in `src.app.llm.limiter`,
+the provider circuit breaker in `src.app.llm.circuit_breaker`, retries and
+hedged requests in `src.app.llm.hedging`, streaming and the JSON response
+mode in `src.app.llm.json_stream`, model tier routing in
+`src.app.llm.routing` (which supersedes the per-module models). Provider
+errors never reach the modules: the call is recorded as a failure and the
+module receives an empty answer, so every module falls back to its
+deterministic narrative the same way.
+"""
+import importlib.util
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+from src.app.config import OPENAI_API_KEY, OPENAI_MODEL
+from src.app.llm.circuit_breaker import CircuitBreaker
+from src.app.llm.hedging import ResilientCaller
+from src.app.llm.json_stream import IncrementalJSONParser, current_listener, json_mode, streaming_enabled
+from src.app.llm.limiter import LLMLimiter, LLMOverloaded
+from src.app.llm.narrative_cache import get_narrative_cache
+from src.app.llm.prompt_compactor import compaction_report
+from src.app.llm.routing import ModelRouter, RoutingConfig
+from src.app.llm.usage import current_scope, get_usage_accountant
+from src.app.single_flight import SingleFlight, coalescing_enabled, make_key
+
+try:
+    import httpx
+    from openai import OpenAI
+except ImportError:
+    httpx = None
+    OpenAI = None
+
+LLM_MODULES = ("borrowings", "asset_quality", "capex_cwip", "liquidity", "working_capital", "combined")
+
+
+class _Namespace:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def completion_response(model: Optional[str], content: str):
+    """Chat-completion shaped object answered locally (no provider call, no usage)."""
+    message = _Namespace(role="assistant", content=content)
+    return _Namespace(model=model, choices=[_Namespace(index=0, message=message, finish_reason="stop")], usage=None)
+
+
+def _env_bool(name: str, default: str = "auto") -> Optional[bool]:
+    value = os.getenv(name, default).strip().lower()
+    if value == "auto":
+        return None
+    return value in ("1", "true", "yes", "on")
+
+
+class LLMGateway:
+    def __init__(
+        self,
+        api_key: Optional[str] = OPENAI_API_KEY,
+        base_url: Optional[str] = None,
+        default_model: str = OPENAI_MODEL,
+        module_models: Optional[Dict[str, str]] = None,
+        max_connections: int = 50,
+        max_keepalive: int = 20,
+        keepalive_expiry: float = 60.0,
+        http2: Optional[bool] = None,
+        timeout: float = 60.0,
+        limiter: Optional[LLMLimiter] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        resilience: Optional[ResilientCaller] = None,
+        router: Optional[ModelRouter] = None,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.default_model = default_model
+        self.module_models = dict(module_models or {})
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = importlib.util.find_spec("h2") is not None if http2 is None else http2
+        self.timeout = timeout
+        self._client = None
+        self._override = None
+        self._overridden = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._flight = SingleFlight()
+        self.limiter = limiter or LLMLimiter()
+        self.breaker = breaker or CircuitBreaker()
+        self.resilience = resilience or ResilientCaller()
+        self.router = router or ModelRouter()
+        self._stream_stats: Counter = Counter()
+
+    @classmethod
+    def from_env(cls) -> "LLMGateway":
+        module_models = {
+            module: os.environ[f"OPENAI_MODEL_{module.upper()}"]
+            for module in LLM_MODULES
+            if os.getenv(f"OPENAI_MODEL_{module.upper()}")
+        }
+        return cls(
+            api_key=OPENAI_API_KEY,
+            base_url=os.getenv("OPENAI_BASE_URL") or None,
+            default_model=OPENAI_MODEL,
+            module_models=module_models,
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", 50)),
+            max_keepalive=int(os.getenv("LLM_MAX_KEEPALIVE", 20)),
+            keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", 60)),
+            http2=_env_bool("LLM_HTTP2"),
+            timeout=float(os.getenv("LLM_TIMEOUT", 60)),
+            limiter=LLMLimiter.from_env(),
+            breaker=CircuitBreaker.from_env(),
+            resilience=ResilientCaller.from_env(),
+            router=ModelRouter(RoutingConfig.from_env()),
+        )
+
+    # ---------------------------------------------------------
+    # CLIENT
+    # ---------------------------------------------------------
+    @property
+    def client(self):
+        """The shared client, created on first use; None when no API key is configured."""
+        if self._overridden:
+            return self._override
+        if self._client is None and self.api_key and OpenAI is not None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._build_client()
+        return self._client
+
+    @property
+    def enabled(self) -> bool:
+        """
+        An LLM is configured, the active usage scope still has token budget,
+        the circuit breaker is not open and the limiter is not shedding load
+        (degrade mode). A side-effect-free check: modules call `use_llm()`
+        where they actually take the fallback.
+        """
+        return self._fallback_reason(record=False) is None
+
+    def use_llm(self) -> bool:
+        """`enabled`, recording the shed / fallback on the metrics and usage scope when it is false."""
+        return self._fallback_reason(record=True) is None
+
+    def _fallback_reason(self, record: bool) -> Optional[str]:
+        if self.client is None:
+            return "no_client"
+        if not get_usage_accountant().budget_allows(mark=record):
+            return "budget"
+        if not self.breaker.available(count=record):
+            if record:
+                self._mark_fallback("circuit_open")
+            return "circuit_open"
+        if self.limiter.shed_mode == "degrade" and self.limiter.saturated():
+            if record:
+                self.limiter.shed("degraded")
+                self._mark_shed()
+            return "degraded"
+        return None
+
+    @staticmethod
+    def _mark_shed() -> None:
+        scope = current_scope()
+        if scope is not None:
+            scope.llm_shed = True
+
+    @staticmethod
+    def _mark_fallback(reason: str) -> None:
+        scope = current_scope()
+        if scope is not None:
+            scope.llm_fallback = reason
+
+    def _build_client(self):
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+        http_client = httpx.Client(limits=limits, http2=self.http2, timeout=self.timeout)
+        return OpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            http_client=http_client,
+            # Retries are handled by ResilientCaller (jittered, capped per request)
+            max_retries=0,
+            timeout=self.timeout,
+        )
+
+    @contextmanager
+    def use_client(self, client):
+        """
+        Temporarily route every module through `client` (anything exposing
+        `chat.completions.create`); None forces the deterministic fallbacks.
+        """
+        saved = (self._overridden, self._override)
+        self._overridden, self._override = True, client
+        try:
+            yield
+        finally:
+            self._overridden, self._override = saved
+
+    @contextmanager
+    def combined_batch(self, batch):
+        """
+        Route this thread's module calls through a `CombinedLLMBatch`, which
+        answers them from one combined completion for the company.
+        """
+        saved = getattr(self._local, "batch", None)
+        self._local.batch = batch
+        try:
+            yield
+        finally:
+            self._local.batch = saved
+
+    def coalescing_stats(self) -> dict:
+        return self._flight.stats()
+
+    def metrics(self) -> dict:
+        return {
+            "circuit_breaker": self.breaker.metrics(),
+            "limiter": self.limiter.metrics(),
+            "resilience": self.resilience.metrics(),
+            "streaming": self.streaming_stats(),
+            "narrative_cache": get_narrative_cache().metrics(),
+            "coalescing": self.coalescing_stats(),
+            "routing": self.router.metrics(),
+            "prompt_compaction": compaction_report(),
+        }
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    # ---------------------------------------------------------
+    # COMPLETIONS
+    # ---------------------------------------------------------
+    def model_for(self, module: str) -> str:
+        return self.module_models.get(module, self.default_model)
+
+    def complete(
+        self,
+        module: str,
+        messages: List[dict],
+        temperature: float = 0.2,
+        on_section=None,
+        rules: Optional[Iterable] = None,
+        **kwargs,
+    ):
+        """
+        Chat completion for `module` on the shared client and its routed model.
+        With tier routing on, `rules` (the rule results behind the prompt)
+        select the model tier; tier "none" answers "{}" without a call.
+        With streaming on, `on_section(module, path, value)` (default: the
+        active `section_listener`) receives each answer section as it closes.
+        """
+        client = self.client
+        if client is None:
+            raise RuntimeError("LLM gateway is disabled (no OPENAI_API_KEY)")
+        model = kwargs.pop("model", None)
+        batch = getattr(self._local, "batch", None)
+        if batch is not None:
+            # Only the combined call is routed; its rules are the union of the modules'
+            response = batch.submit(module, messages, rules)
+            if response is not None:
+                return response
+        route = None
+        if model is None and self.router.enabled:
+            route = self.router.route(module, messages, rules)
+            if route.tier == "none":
+                # Nothing worth an LLM call: the module uses its template narrative
+                return completion_response(None, "{}")
+            model = route.model
+        model = model or self.model_for(module)
+        if json_mode() == "strict":
+            kwargs.setdefault("response_format", {"type": "json_object"})
+
+        scope = current_scope()
+        priority = scope.priority if scope is not None else "interactive"
+        emit = self._section_emitter(module, on_section or current_listener()) if streaming_enabled() else None
+
+        attempted = []
+
+        def _send():
+            attempted.append(True)
+            return self._attempt(client, module, model, messages, temperature, kwargs, emit)
+
+        def _call():
+            try:
+                with self.limiter.slot(priority):
+                    if not self.breaker.acquire():
+                        self._mark_fallback("circuit_open")
+                        return completion_response(model, "{}")
+                    try:
+                        return self.resilience.call(
+                            module,
+                            _send,
+                            scope=scope,
+                            priority=priority,
+                            try_hedge_slot=lambda: self.limiter.try_acquire(priority),
+                            release_hedge_slot=lambda service: self.limiter.release(priority, service),
+                        )
+                    except Exception as exc:
+                        print(f"LLM call failed for {module}, using deterministic fallback: {exc}", flush=True)
+                        self._mark_fallback("provider_error")
+                        return completion_response(model, "{}")
+                    finally:
+                        if not attempted:
+                            # No attempt reached the breaker: hand back a half-open probe permit
+                            self.breaker.release_probe()
+            except LLMOverloaded:
+                if self.limiter.shed_mode == "reject":
+                    raise
+                # Degrade: an empty answer makes the module use its deterministic narrative
+                self._mark_shed()
+                return completion_response(model, "{}")
+
+        started = time.perf_counter()
+        if not coalescing_enabled():
+            response = _call()
+        else:
+            # Identical concurrent completions share one provider call
+            response = self._flight.do(make_key(id(client), model, messages, temperature, kwargs), _call)
+        if route is not None:
+            content = response.choices[0].message.content if response.choices else None
+            self.router.record(route.tier, time.perf_counter() - started, ok=content not in (None, "", "{}"))
+        return response
+
+    def _attempt(self, client, module: str, model: str, messages: List[dict], temperature: float, kwargs: dict, emit=None):
+        """One provider attempt: outcome goes to the breaker, tokens to the usage ledger."""
+        started = time.perf_counter()
+        try:
+            if emit is None:
+                response = client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    **kwargs,
+                )
+            else:
+                stream = client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    **kwargs,
+                )
+                response = self._consume_stream(stream, model, emit, started)
+        except Exception:
+            self.breaker.record(False, time.perf_counter() - started)
+            raise
+        elapsed = time.perf_counter() - started
+        self.breaker.record(True, elapsed)
+        self._record_usage(module, model, messages, response, elapsed)
+        return response
+
+    # ---------------------------------------------------------
+    # STREAMING
+    # ---------------------------------------------------------
+    def _section_emitter(self, module: str, listener):
+        """
+        Per-call sink for streamed sections. Hedged or retried attempts of the
+        same call share it, so each section reaches the listener once.
+        """
+        seen = set()
+        lock = threading.Lock()
+
+        def emit(path, value):
+            if module == "combined":
+                # {"<module>": {"analysis_narrative": [...]}}: route to the module
+                if len(path) < 2:
+                    return
+                target, path = path[0], path[1:]
+            else:
+                target = module
+            with lock:
+                if (target, path) in seen:
+                    return
+                seen.add((target, path))
+            self._stream_stats["sections"] += 1
+            if listener is not None:
+                try:
+                    listener(target, path, value)
+                except Exception as exc:
+                    print(f"Section listener failed for {target} {path}: {exc}", flush=True)
+
+        emit.depth = 3 if module == "combined" else 2
+        return emit
+
+    def _consume_stream(self, stream, model: str, emit, started: float):
+        """Feed a streamed completion to the incremental parser; returns it as one response."""
+        first_section = []
+
+        def on_item(path, value):
+            if not first_section:
+                first_section.append(time.perf_counter() - started)
+            emit(path, value)
+
+        parser = IncrementalJSONParser(on_item, depth=emit.depth)
+        parts: List[str] = []
+        usage, finish_reason, response_model = None, None, None
+        for chunk in stream:
+            response_model = getattr(chunk, "model", None) or response_model
+            usage = getattr(chunk, "usage", None) or usage
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            finish_reason = getattr(choice, "finish_reason", None) or finish_reason
+            text = getattr(choice.delta, "content", None)
+            if text:
+                parts.append(text)
+                parser.feed(text)
+
+        self._stream_stats["streamed_calls"] += 1
+        if first_section:
+            self._stream_stats["first_section_ms_total"] += first_section[0] * 1000
+            self._stream_stats["calls_with_sections"] += 1
+        response = completion_response(response_model or model, "".join(parts))
+        response.choices[0].finish_reason = finish_reason or "stop"
+        response.usage = usage
+        return response
+
+    def streaming_stats(self) -> dict:
+        stats = dict(self._stream_stats)
+        with_sections = stats.pop("calls_with_sections", 0)
+        total = stats.pop("first_section_ms_total", 0.0)
+        return {
+            "enabled": streaming_enabled(),
+            "json_mode": json_mode(),
+            "streamed_calls": stats.get("streamed_calls", 0),
+            "sections_emitted": stats.get("sections", 0),
+            "first_section_ms_avg": round(total / with_sections, 2) if with_sections else None,
+        }
+
+    @staticmethod
+    def _record_usage(module: str, model: str, messages: List[dict], response, elapsed: float) -> None:
+        usage = getattr(response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        estimated = prompt_tokens is None or completion_tokens is None
+        if estimated:
+            from src.app.llm.prompt_compactor import count_tokens
+
+            prompt_tokens = count_tokens("\n".join(m.get("content") or "" for m in messages))
+            try:
+                completion_tokens = count_tokens(response.choices[0].message.content or "")
+            except (AttributeError, IndexError):
+                completion_tokens = 0
+        get_usage_accountant().record(
+            module,
+            getattr(response, "model", None) or model,
+            int(prompt_tokens),
+            int(completion_tokens),
+            elapsed * 1000,
+            estimated=estimated,
+        )
+
+
+_gateway: Optional[LLMGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway() -> LLMGateway:
+    """The process-wide gateway, configured from the environment on first use."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway.from_env()
+    return _gateway
@@ -0,0 +1,268 @@
+# hedging.py
+"""
+Retry and hedging policy for provider calls.
+
+    retries   transient errors (connection errors, timeouts, 429, 5xx) are
+              retried with full-jitter exponential backoff
+    hedging   for interactive calls, if no answer has arrived after the
+              module's observed p95 latency a duplicate request is sent;
+              the first answer that is valid JSON wins
+
+Both draw on a per-request attempt cap (all provider attempts made for one
+`UsageScope`), so a struggling provider cannot multiply spend. Hedging is
+opt-in (LLM_HEDGE=1) since it sends duplicate provider requests; it only
+fires once enough latencies are known (or a fixed delay is set) and a
+limiter slot is free without queueing, so it costs about (100 - quantile)%
+extra calls.
+
+The synchronous OpenAI client cannot abort a request that is already on
+the wire, so the losing attempt is abandoned: its answer is discarded when
+it lands (its tokens are still accounted).
+
+Configuration (environment):
+    LLM_MAX_RETRIES                retries per call on transient errors (default 2)
+    LLM_RETRY_BASE_DELAY           backoff base in seconds (default 0.5)
+    LLM_RETRY_MAX_DELAY            backoff cap in seconds (default 8)
+    LLM_MAX_ATTEMPTS_PER_REQUEST   provider attempts per request scope (default 12)
+    LLM_HEDGE                      1 enables hedging (default 0: off, it adds provider calls)
+    LLM_HEDGE_DELAY                fixed hedge delay in seconds (default: per-module quantile)
+    LLM_HEDGE_QUANTILE             latency quantile that triggers the hedge (default 95)
+    LLM_HEDGE_MIN_SAMPLES          latencies needed before hedging (default 20)
+    LLM_HEDGE_PRIORITIES           priority classes that hedge (default "interactive")
+"""
+import math
+import os
+import random
+import threading
+import time
+import contextvars
+from collections import Counter, defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+from src.app.llm.json_stream import parse_llm_json
+
+try:
+    import openai
+
+    TRANSIENT_ERRORS: Tuple[type, ...] = (
+        openai.APIConnectionError,
+        openai.APITimeoutError,
+        openai.RateLimitError,
+        openai.InternalServerError,
+    )
+except ImportError:
+    openai = None
+    TRANSIENT_ERRORS = (ConnectionError, TimeoutError)
+
+
+class AttemptsExhausted(Exception):
+    """The request scope used up LLM_MAX_ATTEMPTS_PER_REQUEST."""
+
+
+@dataclass
+class RetryPolicy:
+    max_retries: int = 2
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+
+    def backoff(self, retry: int) -> float:
+        """Full jitter: uniform in [0, min(max_delay, base * 2^retry)]."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** retry)))
+
+    @staticmethod
+    def is_transient(exc: Exception) -> bool:
+        return isinstance(exc, TRANSIENT_ERRORS)
+
+
+@dataclass
+class HedgePolicy:
+    enabled: bool = False
+    delay: Optional[float] = None
+    quantile: float = 95.0
+    min_samples: int = 20
+    priorities: Tuple[str, ...] = ("interactive",)
+
+
+def is_valid_json(response) -> bool:
+    try:
+        return parse_llm_json(response.choices[0].message.content) is not None
+    except (AttributeError, IndexError, TypeError):
+        return False
+
+
+class LatencyTracker:
+    """Recent successful-call latencies per module."""
+
+    def __init__(self, window: int = 200):
+        self._samples: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def add(self, key: str, latency: float) -> None:
+        with self._lock:
+            self._samples[key].append(latency)
+
+    def quantile(self, key: str, pct: float, min_samples: int) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < max(1, min_samples):
+            return None
+        return samples[max(0, math.ceil(pct / 100 * len(samples)) - 1)]
+
+
+class ResilientCaller:
+    """Runs one logical completion as retried and hedged provider attempts."""
+
+    def __init__(
+        self,
+        retry: Optional[RetryPolicy] = None,
+        hedge: Optional[HedgePolicy] = None,
+        max_attempts_per_request: int = 12,
+        hedge_workers: int = 32,
+    ):
+        self.retry = retry or RetryPolicy()
+        self.hedge = hedge or HedgePolicy()
+        self.max_attempts_per_request = max_attempts_per_request
+        self.latencies = LatencyTracker()
+        self._pool = ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix="llm-hedge")
+        self._lock = threading.Lock()
+        self._stats: Counter = Counter()
+
+    @classmethod
+    def from_env(cls) -> "ResilientCaller":
+        delay = os.getenv("LLM_HEDGE_DELAY")
+        return cls(
+            retry=RetryPolicy(
+                max_retries=int(os.getenv("LLM_MAX_RETRIES", 2)),
+                base_delay=float(os.getenv("LLM_RETRY_BASE_DELAY", 0.5)),
+                max_delay=float(os.getenv("LLM_RETRY_MAX_DELAY", 8)),
+            ),
+            hedge=HedgePolicy(
+                enabled=os.getenv("LLM_HEDGE", "0").lower() in ("1", "true", "yes", "on"),
+                delay=float(delay) if delay else None,
+                quantile=float(os.getenv("LLM_HEDGE_QUANTILE", 95)),
+                min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", 20)),
+                priorities=tuple(
+                    p.strip() for p in os.getenv("LLM_HEDGE_PRIORITIES", "interactive").split(",") if p.strip()
+                ),
+            ),
+            max_attempts_per_request=int(os.getenv("LLM_MAX_ATTEMPTS_PER_REQUEST", 12)),
+        )
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += n
+
+    def _take_attempt(self, scope) -> None:
+        if scope is None:
+            return
+        with self._lock:
+            if scope.llm_attempts >= self.max_attempts_per_request:
+                self._stats["attempts_capped"] += 1
+                raise AttemptsExhausted(f"request used {scope.llm_attempts} LLM attempts")
+            scope.llm_attempts += 1
+
+    def hedge_delay(self, key: str) -> Optional[float]:
+        if self.hedge.delay is not None:
+            return self.hedge.delay
+        return self.latencies.quantile(key, self.hedge.quantile, self.hedge.min_samples)
+
+    # ---------------------------------------------------------
+    # CALL PATH
+    # ---------------------------------------------------------
+    def call(
+        self,
+        key: str,
+        send: Callable[[], object],
+        scope=None,
+        priority: str = "interactive",
+        try_hedge_slot: Callable[[], bool] = lambda: True,
+        release_hedge_slot: Callable[[float], None] = lambda _: None,
+    ):
+        """
+        `send` performs exactly one provider attempt. Raises the last error once
+        retries or the request's attempt budget are exhausted.
+        """
+        retry = 0
+        while True:
+            try:
+                return self._hedged(key, send, scope, priority, try_hedge_slot, release_hedge_slot)
+            except AttemptsExhausted:
+                raise
+            except Exception as exc:
+                if not self.retry.is_transient(exc) or retry >= self.retry.max_retries:
+                    raise
+                self._count("retries")
+                time.sleep(self.retry.backoff(retry))
+                retry += 1
+
+    def _timed(self, key: str, send: Callable[[], object], scope):
+        self._take_attempt(scope)
+        self._count("attempts")
+        started = time.perf_counter()
+        response = send()
+        self.latencies.add(key, time.perf_counter() - started)
+        return response
+
+    def _hedged(self, key, send, scope, priority, try_hedge_slot, release_hedge_slot):
+        delay = self.hedge_delay(key) if self.hedge.enabled and priority in self.hedge.priorities else None
+        if delay is None:
+            return self._timed(key, send, scope)
+
+        primary = self._pool.submit(contextvars.copy_context().run, self._timed, key, send, scope)
+        done, _ = wait([primary], timeout=delay)
+        if done or not try_hedge_slot():
+            return primary.result()
+
+        def _hedge_attempt():
+            started = time.perf_counter()
+            try:
+                return self._timed(key, send, scope)
+            finally:
+                release_hedge_slot(time.perf_counter() - started)
+
+        try:
+            hedge = self._pool.submit(contextvars.copy_context().run, _hedge_attempt)
+        except RuntimeError:
+            release_hedge_slot(0.0)
+            return primary.result()
+        self._count("hedges")
+
+        pending = {primary, hedge}
+        fallback, error = None, None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except Exception as exc:
+                    error = error or exc
+                    continue
+                if is_valid_json(response):
+                    # The other attempt is abandoned; its result is dropped when it lands
+                    self._count("hedge_wins" if future is hedge else "primary_wins")
+                    return response
+                fallback = fallback or response
+        if fallback is not None:
+            return fallback
+        raise error
+
+    def metrics(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        return {
+            "retry": {
+                "max_retries": self.retry.max_retries,
+                "base_delay_s": self.retry.base_delay,
+                "max_delay_s": self.retry.max_delay,
+            },
+            "hedge": {
+                "enabled": self.hedge.enabled,
+                "fixed_delay_s": self.hedge.delay,
+                "quantile": self.hedge.quantile,
+                "priorities": list(self.hedge.priorities),
+            },
+            "max_attempts_per_request": self.max_attempts_per_request,
+            "counters": stats,
+        }
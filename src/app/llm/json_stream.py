@@ -0,0 +1,203 @@
+# json_stream.py
+"""
+Streamed completions and JSON output handling for the `*_llm` modules.
+
+With LLM_STREAM=1 the gateway requests streamed completions and feeds the
+chunks to an `IncrementalJSONParser`, which reports every value one or two
+levels deep the moment it closes: each `analysis_narrative` section, each
+per-metric `trend_insights` entry, each WC red flag, `score_adjustment`.
+Those items go to the listener installed with `section_listener` (or the
+`on_section` callback passed to `LLMGateway.complete`), so a caller can emit
+or cache sections while the rest of the answer is still being generated;
+`POST /analyze/stream` (via `pipeline.stream_modules`) sends them to the
+client as NDJSON events. The module itself still receives one complete
+response and parses it as before.
+
+LLM_JSON_MODE selects how answers are constrained and parsed:
+
+    lenient  (default) plain completions; `parse_llm_json` strips markdown
+             fences and surrounding prose before giving up
+    strict   the provider is asked for a JSON object (`response_format`),
+             so answers are valid JSON by construction and are parsed as-is;
+             there is no text salvage, and no fake scores or per-module
+             re-calls on malformed answers
+
+In both modes an answer that still does not parse yields None, and the
+module uses its deterministic narrative and base score.
+
+Configuration (environment):
+    LLM_STREAM       1 streams completions (default 0)
+    LLM_JSON_MODE    lenient | strict (default lenient)
+"""
+import contextvars
+import json
+import os
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Tuple
+
+JSON_MODES = ("lenient", "strict")
+
+SectionListener = Callable[[str, Tuple, object], None]
+
+_listener: contextvars.ContextVar = contextvars.ContextVar("llm_section_listener", default=None)
+
+
+def streaming_enabled() -> bool:
+    return os.getenv("LLM_STREAM", "0").lower() in ("1", "true", "yes", "on")
+
+
+def json_mode() -> str:
+    mode = os.getenv("LLM_JSON_MODE", "lenient").lower()
+    if mode not in JSON_MODES:
+        raise ValueError(f"LLM_JSON_MODE must be one of {JSON_MODES}, got '{mode}'")
+    return mode
+
+
+@contextmanager
+def section_listener(listener: SectionListener):
+    """Send streamed sections of LLM answers in this context to `listener(module, path, value)`."""
+    token = _listener.set(listener)
+    try:
+        yield
+    finally:
+        _listener.reset(token)
+
+
+def current_listener() -> Optional[SectionListener]:
+    return _listener.get()
+
+
+# ---------------------------------------------------------
+# PARSING
+# ---------------------------------------------------------
+def strip_code_fences(content: str) -> str:
+    content = (content or "").strip()
+    if content.startswith("```"):
+        content = content.split("```")[1]
+        if content.startswith("json"):
+            content = content[4:]
+    return content.strip()
+
+
+def parse_llm_json(content: Optional[str], mode: Optional[str] = None) -> Optional[dict]:
+    """The JSON object in an LLM answer, or None when there is none."""
+    mode = mode or json_mode()
+    if mode == "strict":
+        candidates = [content or ""]
+    else:
+        stripped = strip_code_fences(content)
+        candidates = [stripped, stripped[stripped.find("{"): stripped.rfind("}") + 1]]
+    for candidate in candidates:
+        try:
+            parsed = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(parsed, dict):
+            return parsed
+    return None
+
+
+class IncrementalJSONParser:
+    """
+    Push parser for one streamed JSON object.
+
+    `feed` accepts arbitrary text chunks; whenever a value at most `depth`
+    levels below the root object closes, `on_item(path, value)` is called
+    with e.g. ("analysis_narrative", 0) or ("trend_insights", "cash").
+    Text before the opening brace (a markdown fence, a preamble) is skipped.
+    """
+
+    def __init__(self, on_item: Callable[[Tuple, object], None], depth: int = 2):
+        self.on_item = on_item
+        self.depth = depth
+        self.text = ""
+        self.complete = False
+        self._pos = 0
+        self._root_start: Optional[int] = None
+        self._root_end: Optional[int] = None
+        self._stack: List[dict] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._string_is_key = False
+        self._in_scalar = False
+
+    def feed(self, chunk: str) -> None:
+        self.text += chunk
+        text = self.text
+        for i in range(self._pos, len(text)):
+            if self.complete:
+                break
+            self._step(text, i, text[i])
+        self._pos = len(text)
+
+    def result(self) -> Optional[dict]:
+        """The whole object once it has closed."""
+        if not self.complete:
+            return None
+        return json.loads(self.text[self._root_start:self._root_end])
+
+    def _step(self, text: str, i: int, c: str) -> None:
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif c == "\\":
+                self._escape = True
+            elif c == '"':
+                self._in_string = False
+                frame = self._stack[-1]
+                if self._string_is_key:
+                    frame["key"] = json.loads(text[self._string_start:i + 1])
+                else:
+                    self._end_value(i + 1)
+            return
+
+        if self._in_scalar:
+            if c not in ",}] \t\r\n":
+                return
+            self._in_scalar = False
+            self._end_value(i)
+
+        if not self._stack:
+            if c == "{":
+                self._root_start = i
+                self._stack.append({"type": "{", "name": None, "key": None, "index": 0, "start": None})
+            return
+
+        frame = self._stack[-1]
+        if c == '"':
+            self._in_string = True
+            self._string_start = i
+            self._string_is_key = frame["type"] == "{" and frame["key"] is None
+            if not self._string_is_key:
+                frame["start"] = i
+        elif c in "{[":
+            frame["start"] = i
+            name = frame["key"] if frame["type"] == "{" else frame["index"]
+            self._stack.append({"type": c, "name": name, "key": None, "index": 0, "start": None})
+        elif c in "}]":
+            self._stack.pop()
+            if self._stack:
+                self._end_value(i + 1)
+            else:
+                self._root_end = i + 1
+                self.complete = True
+        elif c not in ",: \t\r\n":
+            frame["start"] = i
+            self._in_scalar = True
+
+    def _end_value(self, end: int) -> None:
+        frame = self._stack[-1]
+        if frame["type"] == "{":
+            key, frame["key"] = frame["key"], None
+        else:
+            key = frame["index"]
+            frame["index"] += 1
+        path = tuple(f["name"] for f in self._stack[1:]) + (key,)
+        if len(path) > self.depth:
+            return
+        try:
+            value = json.loads(self.text[frame["start"]:end])
+        except ValueError:
+            return
+        self.on_item(path, value)
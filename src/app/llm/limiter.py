@@ -0,0 +1,231 @@
+# limiter.py
+"""
+Global admission control for LLM calls.
+
+Every provider call made through the gateway takes a slot from one
+process-wide `LLMLimiter`. At most LLM_MAX_CONCURRENCY calls run at once;
+the rest wait in a priority queue (interactive before batch, FIFO within a
+class). Batch work can be capped below the global limit so dashboards keep
+headroom during bulk runs.
+
+When the queue is saturated new work is shed instead of letting latency
+collapse for everyone:
+
+    degrade  (default) new requests skip the LLM (`gateway.enabled` turns
+             false) and return their deterministic narrative; a call shed
+             after admission gets an empty answer with the same effect
+    reject   the call raises `LLMOverloaded`; the API answers 429 with a
+             Retry-After estimate
+
+A call that waits longer than LLM_QUEUE_TIMEOUT is shed the same way.
+
+Configuration (environment):
+    LLM_MAX_CONCURRENCY        concurrent provider calls (default 16)
+    LLM_BATCH_MAX_CONCURRENCY  cap for the batch class (default: no extra cap)
+    LLM_MAX_QUEUE              waiting calls before shedding (default 64)
+    LLM_QUEUE_TIMEOUT          max seconds a call waits for a slot (default 30)
+    LLM_SHED_MODE              degrade | reject (default degrade)
+"""
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Deque, List, Optional
+
+PRIORITIES = {"interactive": 0, "batch": 1}
+SHED_MODES = ("degrade", "reject")
+
+
+class LLMOverloaded(Exception):
+    """Raised when an LLM call is shed; `retry_after` is a whole number of seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"LLM capacity exhausted ({reason}); retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class LLMLimiter:
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        max_queue: int = 64,
+        queue_timeout: float = 30.0,
+        batch_max_concurrency: Optional[int] = None,
+        shed_mode: str = "degrade",
+        window: int = 1000,
+    ):
+        if shed_mode not in SHED_MODES:
+            raise ValueError(f"LLM_SHED_MODE must be one of {SHED_MODES}, got '{shed_mode}'")
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.batch_max_concurrency = batch_max_concurrency
+        self.shed_mode = shed_mode
+
+        self._cond = threading.Condition()
+        self._queue: List[tuple] = []
+        self._seq = itertools.count()
+        self._active = 0
+        self._active_batch = 0
+        self._max_depth = 0
+        self._admitted: Counter = Counter()
+        self._shed: Counter = Counter()
+        self._waits: Deque[float] = deque(maxlen=window)
+        self._service: Deque[float] = deque(maxlen=window)
+
+    @classmethod
+    def from_env(cls) -> "LLMLimiter":
+        batch_cap = os.getenv("LLM_BATCH_MAX_CONCURRENCY")
+        return cls(
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", 16)),
+            max_queue=int(os.getenv("LLM_MAX_QUEUE", 64)),
+            queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", 30)),
+            batch_max_concurrency=int(batch_cap) if batch_cap else None,
+            shed_mode=os.getenv("LLM_SHED_MODE", "degrade").lower(),
+        )
+
+    # ---------------------------------------------------------
+    # ADMISSION
+    # ---------------------------------------------------------
+    def _has_slot(self, rank: int) -> bool:
+        if self._active >= self.max_concurrency:
+            return False
+        if rank > 0 and self.batch_max_concurrency is not None:
+            return self._active_batch < self.batch_max_concurrency
+        return True
+
+    def saturated(self) -> bool:
+        """The queue is full: new work would be shed."""
+        with self._cond:
+            return len(self._queue) >= self.max_queue
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue is expected to drain."""
+        with self._cond:
+            return self._retry_after_locked()
+
+    def shed(self, reason: str) -> None:
+        """Count work shed outside the limiter (e.g. degraded before queueing)."""
+        with self._cond:
+            self._shed[reason] += 1
+
+    @contextmanager
+    def slot(self, priority: str = "interactive"):
+        """Hold one concurrency slot for the duration of the block."""
+        rank = PRIORITIES.get(priority, PRIORITIES["batch"])
+        self._acquire(rank)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._release(rank, time.perf_counter() - started)
+
+    def try_acquire(self, priority: str = "interactive") -> bool:
+        """Take a slot only if one is free without queueing (used for hedged attempts)."""
+        rank = PRIORITIES.get(priority, PRIORITIES["batch"])
+        with self._cond:
+            if self._queue or not self._has_slot(rank):
+                return False
+            self._admit(rank, 0.0)
+            return True
+
+    def release(self, priority: str, service_time: float) -> None:
+        """Return a slot taken with `try_acquire`."""
+        self._release(PRIORITIES.get(priority, PRIORITIES["batch"]), service_time)
+
+    def _acquire(self, rank: int) -> None:
+        enqueued = time.perf_counter()
+        with self._cond:
+            if not self._queue and self._has_slot(rank):
+                self._admit(rank, 0.0)
+                return
+            if len(self._queue) >= self.max_queue:
+                self._shed["queue_full"] += 1
+                raise LLMOverloaded("queue_full", self._retry_after_locked())
+
+            entry = (rank, next(self._seq))
+            heapq.heappush(self._queue, entry)
+            self._max_depth = max(self._max_depth, len(self._queue))
+            deadline = enqueued + self.queue_timeout
+            while not (self._queue[0] == entry and self._has_slot(rank)):
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+                    self._shed["timeout"] += 1
+                    self._cond.notify_all()
+                    raise LLMOverloaded("timeout", self._retry_after_locked())
+                self._cond.wait(remaining)
+            heapq.heappop(self._queue)
+            self._admit(rank, time.perf_counter() - enqueued)
+            # The next head may be admissible too (e.g. interactive behind a capped batch call)
+            self._cond.notify_all()
+
+    def _admit(self, rank: int, waited: float) -> None:
+        self._active += 1
+        if rank > 0:
+            self._active_batch += 1
+        self._admitted["interactive" if rank == 0 else "batch"] += 1
+        self._waits.append(waited)
+
+    def _release(self, rank: int, service_time: float) -> None:
+        with self._cond:
+            self._active -= 1
+            if rank > 0:
+                self._active_batch -= 1
+            self._service.append(service_time)
+            self._cond.notify_all()
+
+    def _retry_after_locked(self) -> int:
+        depth = len(self._queue) + self._active
+        service = sum(self._service) / len(self._service) if self._service else 1.0
+        return max(1, math.ceil(depth * service / max(1, self.max_concurrency)))
+
+    # ---------------------------------------------------------
+    # METRICS
+    # ---------------------------------------------------------
+    def metrics(self) -> dict:
+        with self._cond:
+            waits = list(self._waits)
+            service = list(self._service)
+            snapshot = {
+                "max_concurrency": self.max_concurrency,
+                "batch_max_concurrency": self.batch_max_concurrency,
+                "max_queue": self.max_queue,
+                "shed_mode": self.shed_mode,
+                "active": self._active,
+                "active_batch": self._active_batch,
+                "queue_depth": len(self._queue),
+                "queue_depth_max": self._max_depth,
+                "queued_by_class": dict(Counter("interactive" if r == 0 else "batch" for r, _ in self._queue)),
+                "admitted": dict(self._admitted),
+                "shed": dict(self._shed),
+            }
+
+        def _ms(value: Optional[float]) -> Optional[float]:
+            return round(value * 1000, 2) if value is not None else None
+
+        snapshot["wait_ms"] = {
+            "p50": _ms(_percentile(waits, 50)),
+            "p95": _ms(_percentile(waits, 95)),
+            "p99": _ms(_percentile(waits, 99)),
+            "max": _ms(max(waits) if waits else None),
+        }
+        snapshot["service_ms"] = {
+            "p50": _ms(_percentile(service, 50)),
+            "p95": _ms(_percentile(service, 95)),
+        }
+        return snapshot
@@ -0,0 +1,347 @@
+# narrative_cache.py
+"""
+Approximate narrative cache for companies in the same analytical situation.
+
+Across a universe many companies fire the same rules with the same flags and
+sit in similar metric bands, yet each pays for a fresh completion. This cache
+keys a module's parsed LLM answer by a situation signature:
+
+    (module, sorted (rule id, flag) pairs, key metrics quantized to log bands,
+     threshold version)
+
+When an answer is stored, every number in it that renders one of the
+company's key metrics (e.g. "1.42", "23.5%", "4,454") becomes a placeholder,
+and the company id does too. A later company with the same signature gets
+the cached answer with its own exact numbers and name filled in, and no LLM
+call.
+
+Fidelity is the share of the numbers in an answer that could be templated.
+Numbers that are not tied to a metric would be stale for another company, so
+answers below NARRATIVE_CACHE_MIN_FIDELITY are never stored. `metrics()`
+reports the hit rate, the fidelity of the answers served and the calls
+saved.
+
+Configuration (environment):
+    NARRATIVE_CACHE                1 enables the cache (default 0)
+    NARRATIVE_CACHE_BAND           log-band width for metric quantization (default 1.0:
+                                   values within ~2x share a band; the rule flags
+                                   already capture threshold crossings)
+    NARRATIVE_CACHE_MIN_FIDELITY   minimum templated share of numbers (default 0.8)
+    NARRATIVE_CACHE_SIZE           in-memory entries (default 5000)
+    NARRATIVE_CACHE_PATH           SQLite file shared across processes (default: memory only)
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+from src.app.thresholds import thresholds_version
+
+NUMBER_RE = re.compile(r"(?<![\w.])-?\d[\d,]*(?:\.\d+)?%?")
+PLACEHOLDER_RE = re.compile(r"\{\{(\w+)\|(\w+)\}\}")
+COMPANY_PLACEHOLDER = "{{company|s}}"
+
+# fmt code -> renderer of a metric value
+FORMATS = {
+    "f0": lambda v: f"{v:.0f}",
+    "f1": lambda v: f"{v:.1f}",
+    "f2": lambda v: f"{v:.2f}",
+    "c0": lambda v: f"{v:,.0f}",
+    "c2": lambda v: f"{v:,.2f}",
+    "p0": lambda v: f"{v * 100:.0f}%",
+    "p1": lambda v: f"{v * 100:.1f}%",
+}
+
+
+@dataclass
+class CacheConfig:
+    enabled: bool = False
+    band: float = 1.0
+    min_fidelity: float = 0.8
+    size: int = 5000
+    path: Optional[str] = None
+
+    @classmethod
+    def from_env(cls) -> "CacheConfig":
+        return cls(
+            enabled=os.getenv("NARRATIVE_CACHE", "0").lower() in ("1", "true", "yes", "on"),
+            band=float(os.getenv("NARRATIVE_CACHE_BAND", 1.0)),
+            min_fidelity=float(os.getenv("NARRATIVE_CACHE_MIN_FIDELITY", 0.8)),
+            size=int(os.getenv("NARRATIVE_CACHE_SIZE", 5000)),
+            path=os.getenv("NARRATIVE_CACHE_PATH") or None,
+        )
+
+
+# ---------------------------------------------------------
+# SIGNATURE
+# ---------------------------------------------------------
+def numeric_metrics(metrics: Optional[dict]) -> Dict[str, float]:
+    """Numeric key metrics, one level of nesting flattened (`year` excluded)."""
+    flat: Dict[str, float] = {}
+    for name, value in (metrics or {}).items():
+        if isinstance(value, dict):
+            for sub, sub_value in value.items():
+                if isinstance(sub_value, (int, float)) and not isinstance(sub_value, bool):
+                    flat[f"{name}_{sub}"] = float(sub_value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and name != "year":
+            flat[name] = float(value)
+    return {k: v for k, v in flat.items() if math.isfinite(v)}
+
+
+def quantize(value: float, band: float) -> str:
+    """Signed log band: values within ~`band` of each other share a bucket."""
+    if abs(value) < 1e-9:
+        return "0"
+    bucket = int(math.floor(math.log(abs(value)) / math.log1p(band)))
+    return f"{'+' if value > 0 else '-'}{bucket}"
+
+
+def _rule_key(rule) -> Tuple[str, str]:
+    data = rule if isinstance(rule, dict) else rule.dict()
+    return str(data.get("rule_id") or data.get("rule_name")), str(data.get("flag"))
+
+
+def situation_signature(
+    module: str, metrics: Optional[dict], rules: Iterable, band: float = 1.0, version: str = ""
+) -> str:
+    payload = {
+        "module": module,
+        "thresholds": version,
+        "rules": sorted(_rule_key(r) for r in rules or []),
+        "metrics": sorted((k, quantize(v, band)) for k, v in numeric_metrics(metrics).items()),
+    }
+    return hashlib.sha256(json.dumps(payload, separators=(",", ":")).encode()).hexdigest()
+
+
+# ---------------------------------------------------------
+# TEMPLATES
+# ---------------------------------------------------------
+def _renderings(metrics: Dict[str, float]) -> Dict[str, Optional[Tuple[str, str]]]:
+    """Rendered string -> (metric, fmt); None marks renderings shared by two metrics."""
+    table: Dict[str, Optional[Tuple[str, str]]] = {}
+    for name, value in metrics.items():
+        for fmt, render in FORMATS.items():
+            text = render(value)
+            if text.lstrip("-") in ("0", "0%", "0.0", "0.00", "0.0%"):
+                continue
+            existing = table.get(text, ())
+            if existing == ():
+                table[text] = (name, fmt)
+            elif existing is not None and existing[0] != name:
+                table[text] = None
+    return table
+
+
+def _countable(token: str) -> bool:
+    """Numbers that matter for fidelity: not years, not single-digit list markers."""
+    bare = token.rstrip("%").replace(",", "").lstrip("-")
+    if re.fullmatch(r"(19|20)\d\d", bare):
+        return False
+    return not (bare.isdigit() and len(bare) == 1 and not token.endswith("%"))
+
+
+def make_template(obj, company_id: str, metrics: Dict[str, float]) -> Tuple[object, int, int]:
+    """(template, templated numbers, total countable numbers) for a parsed answer."""
+    table = _renderings(metrics)
+    counts = [0, 0]
+
+    def _number(match: re.Match) -> str:
+        token = match.group(0)
+        if not _countable(token):
+            return token
+        hit = table.get(token)
+        if hit is None and token.endswith("%") and token[:-1] in table:
+            # "12.50%" where the metric is already a percentage
+            hit, suffix = table.get(token[:-1]), "%"
+        else:
+            suffix = ""
+        counts[1] += 1
+        if not hit:
+            return token
+        counts[0] += 1
+        return "{{%s|%s}}%s" % (hit[0], hit[1], suffix)
+
+    def _walk(value):
+        if isinstance(value, str):
+            if company_id:
+                value = value.replace(company_id, COMPANY_PLACEHOLDER)
+            return NUMBER_RE.sub(_number, value)
+        if isinstance(value, list):
+            return [_walk(v) for v in value]
+        if isinstance(value, dict):
+            return {k: _walk(v) for k, v in value.items()}
+        return value
+
+    template = _walk(obj)
+    return template, counts[0], counts[1]
+
+
+def render_template(template, company_id: str, metrics: Dict[str, float]):
+    """Fill a template for another company; KeyError if one of its metrics is missing."""
+
+    def _sub(match: re.Match) -> str:
+        name, fmt = match.group(1), match.group(2)
+        if name == "company":
+            return company_id
+        return FORMATS[fmt](metrics[name])
+
+    def _walk(value):
+        if isinstance(value, str):
+            return PLACEHOLDER_RE.sub(_sub, value)
+        if isinstance(value, list):
+            return [_walk(v) for v in value]
+        if isinstance(value, dict):
+            return {k: _walk(v) for k, v in value.items()}
+        return value
+
+    return _walk(template)
+
+
+# ---------------------------------------------------------
+# CACHE
+# ---------------------------------------------------------
+class NarrativeCache:
+    def __init__(self, config: Optional[CacheConfig] = None):
+        self.config = config or CacheConfig()
+        self._entries: "OrderedDict[str, Tuple[object, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats: Counter = Counter()
+        # Running totals of the fidelity of served answers (hits are unbounded)
+        self._fidelity_sum = 0.0
+        self._fidelity_min: Optional[float] = None
+        self._conn = None
+        if self.config.enabled and self.config.path:
+            self._conn = sqlite3.connect(self.config.path, check_same_thread=False)
+            with self._lock:
+                self._conn.execute(
+                    """CREATE TABLE IF NOT EXISTS narrative_cache (
+                        signature TEXT PRIMARY KEY, module TEXT, template TEXT, fidelity REAL
+                    )"""
+                )
+                self._conn.commit()
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.enabled
+
+    def lookup(self, module: str, company_id: str, metrics: Optional[dict], rules: Iterable) -> Optional[dict]:
+        """The cached answer adapted to this company, or None on a miss."""
+        if not self.config.enabled:
+            return None
+        signature = situation_signature(module, metrics, rules, self.config.band, thresholds_version())
+        entry = self._get(signature)
+        if entry is None:
+            self._count(module, "misses")
+            return None
+        template, fidelity = entry
+        try:
+            answer = render_template(template, company_id, numeric_metrics(metrics))
+        except (KeyError, ValueError, TypeError):
+            self._count(module, "render_failures")
+            return None
+        self._count(module, "hits")
+        with self._lock:
+            self._fidelity_sum += fidelity
+            self._fidelity_min = fidelity if self._fidelity_min is None else min(self._fidelity_min, fidelity)
+        return answer
+
+    def store(self, module: str, company_id: str, metrics: Optional[dict], rules: Iterable, answer: dict) -> bool:
+        """Template and cache a parsed LLM answer; False when its fidelity is too low."""
+        if not self.config.enabled or not answer:
+            return False
+        values = numeric_metrics(metrics)
+        template, templated, total = make_template(answer, company_id, values)
+        fidelity = templated / total if total else 1.0
+        if fidelity < self.config.min_fidelity:
+            self._count(module, "low_fidelity")
+            return False
+        signature = situation_signature(module, metrics, rules, self.config.band, thresholds_version())
+        with self._lock:
+            self._entries[signature] = (template, fidelity)
+            self._entries.move_to_end(signature)
+            while len(self._entries) > self.config.size:
+                self._entries.popitem(last=False)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO narrative_cache VALUES (?, ?, ?, ?)",
+                    (signature, module, json.dumps(template), fidelity),
+                )
+                self._conn.commit()
+        self._count(module, "stores")
+        return True
+
+    def _get(self, signature: str) -> Optional[Tuple[object, float]]:
+        with self._lock:
+            entry = self._entries.get(signature)
+            if entry is not None:
+                self._entries.move_to_end(signature)
+                return entry
+            if self._conn is None:
+                return None
+            row = self._conn.execute(
+                "SELECT template, fidelity FROM narrative_cache WHERE signature = ?", (signature,)
+            ).fetchone()
+            if row is None:
+                return None
+            entry = (json.loads(row[0]), row[1])
+            self._entries[signature] = entry
+            return entry
+
+    def _count(self, module: str, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+            self._stats[f"{module}.{name}"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._stats.clear()
+            self._fidelity_sum = 0.0
+            self._fidelity_min = None
+
+    def metrics(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            fidelity_sum, fidelity_min = self._fidelity_sum, self._fidelity_min
+            entries = len(self._entries)
+        lookups = stats.get("hits", 0) + stats.get("misses", 0) + stats.get("render_failures", 0)
+        modules = sorted({k.split(".")[0] for k in stats if "." in k})
+        return {
+            "enabled": self.config.enabled,
+            "entries": entries,
+            "lookups": lookups,
+            "hits": stats.get("hits", 0),
+            "hit_rate": round(stats.get("hits", 0) / lookups, 4) if lookups else 0.0,
+            "llm_calls_saved": stats.get("hits", 0),
+            "stores": stats.get("stores", 0),
+            "rejected_low_fidelity": stats.get("low_fidelity", 0),
+            "render_failures": stats.get("render_failures", 0),
+            "fidelity_served_avg": round(fidelity_sum / stats["hits"], 4) if stats.get("hits") else None,
+            "fidelity_served_min": round(fidelity_min, 4) if fidelity_min is not None else None,
+            "by_module": {
+                m: {
+                    name: stats.get(f"{m}.{name}", 0)
+                    for name in ("hits", "misses", "stores", "low_fidelity", "render_failures")
+                }
+                for m in modules
+            },
+        }
+
+
+_cache: Optional[NarrativeCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_narrative_cache() -> NarrativeCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = NarrativeCache(CacheConfig.from_env())
+    return _cache
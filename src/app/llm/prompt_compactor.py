@@ -0,0 +1,326 @@
+# prompt_compactor.py
+"""
+Compact encoding of the structured INPUT block sent with every module prompt.
+
+Latency and cost of a completion scale with input size, and the raw module
+payloads are verbose: full-precision floats, every `RuleResult` with its
+long `reason` sentence, pretty-printed JSON. `compact_json` shrinks a
+payload before it is embedded in a prompt:
+
+    - floats rounded (LLM_PROMPT_DIGITS decimals, default 2)
+    - rules reduced to their codes: rule_id, rule_name, flag, value,
+      threshold (reasons and null fields dropped)
+    - GREEN rules omitted when LLM_PROMPT_DROP_GREEN=1
+    - whitespace-free JSON
+    - optional hard budget (LLM_PROMPT_TOKEN_BUDGET tokens) enforced by
+      trimming the lowest-priority content first, see TRIM_STEPS
+
+LLM_PROMPT_COMPACT=0 restores the original encoding. Raw and compact sizes
+are counted per module; `compaction_report()` returns the tokens saved
+(also served under "prompt_compaction" at GET /llm/metrics).
+
+Usage (tokens saved on a synthetic universe, stand-in LLM):
+    python -m src.app.llm.prompt_compactor --companies 50
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+RULE_KEEP_FIELDS = ("rule_id", "rule_name", "metric", "year", "flag", "value", "threshold")
+TREND_KEYS = ("trend_data", "trends")
+
+
+@dataclass
+class CompactionConfig:
+    enabled: bool = True
+    digits: int = 2
+    drop_green: bool = False
+    token_budget: Optional[int] = None
+
+    @classmethod
+    def from_env(cls) -> "CompactionConfig":
+        budget = os.getenv("LLM_PROMPT_TOKEN_BUDGET")
+        return cls(
+            enabled=os.getenv("LLM_PROMPT_COMPACT", "1").lower() not in ("0", "false", "no", "off"),
+            digits=int(os.getenv("LLM_PROMPT_DIGITS", 2)),
+            drop_green=os.getenv("LLM_PROMPT_DROP_GREEN", "0").lower() in ("1", "true", "yes", "on"),
+            token_budget=int(budget) if budget else None,
+        )
+
+
+@dataclass
+class ModuleCompactionStats:
+    sections: int = 0
+    raw_tokens: int = 0
+    compact_tokens: int = 0
+    trimmed: int = 0
+    trim_steps: Dict[str, int] = field(default_factory=dict)
+
+    def summary(self) -> dict:
+        saved = self.raw_tokens - self.compact_tokens
+        return {
+            "sections": self.sections,
+            "raw_tokens": self.raw_tokens,
+            "compact_tokens": self.compact_tokens,
+            "tokens_saved": saved,
+            "saved_pct": round(100.0 * saved / self.raw_tokens, 1) if self.raw_tokens else 0.0,
+            "budget_trimmed": self.trimmed,
+            "trim_steps": dict(self.trim_steps),
+        }
+
+
+_config: Optional[CompactionConfig] = None
+_stats: Dict[str, ModuleCompactionStats] = {}
+_stats_lock = threading.Lock()
+_encoding = None
+
+
+def get_config() -> CompactionConfig:
+    global _config
+    if _config is None:
+        _config = CompactionConfig.from_env()
+    return _config
+
+
+def set_config(config: Optional[CompactionConfig]) -> None:
+    """Replace the process-wide config (None re-reads the environment on next use)."""
+    global _config
+    _config = config
+
+
+def count_tokens(text: str) -> int:
+    """tiktoken count when installed, else the usual ~4 characters per token."""
+    global _encoding
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return len(_encoding.encode(text))
+    return max(1, len(text) // 4)
+
+
+# ---------------------------------------------------------
+# ENCODING
+# ---------------------------------------------------------
+def round_numbers(obj: Any, digits: int) -> Any:
+    if isinstance(obj, bool) or obj is None:
+        return obj
+    if isinstance(obj, float):
+        value = round(obj, digits)
+        return int(value) if value.is_integer() and abs(value) < 1e15 else value
+    if isinstance(obj, dict):
+        return {k: round_numbers(v, digits) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [round_numbers(v, digits) for v in obj]
+    return obj
+
+
+def _is_rule(item: Any) -> bool:
+    return isinstance(item, dict) and "flag" in item and ("rule_id" in item or "rule_name" in item)
+
+
+def compact_rules(rules: List[dict], drop_green: bool = False) -> List[dict]:
+    """Rules as codes: reasons and null fields dropped, optionally no GREEN rules."""
+    compact = []
+    for rule in rules:
+        if not _is_rule(rule):
+            compact.append(rule)
+            continue
+        if drop_green and rule.get("flag") == "GREEN":
+            continue
+        compact.append({k: rule[k] for k in RULE_KEEP_FIELDS if rule.get(k) is not None})
+    return compact
+
+
+def _compact_tree(obj: Any, config: CompactionConfig) -> Any:
+    if isinstance(obj, dict):
+        return {k: _compact_tree(v, config) for k, v in obj.items()}
+    if isinstance(obj, list):
+        if obj and all(_is_rule(item) for item in obj):
+            return compact_rules(obj, config.drop_green)
+        return [_compact_tree(v, config) for v in obj]
+    return obj
+
+
+def _encode(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+# ---------------------------------------------------------
+# BUDGET TRIMMING (lowest priority first)
+# ---------------------------------------------------------
+def _drop_key(key: str) -> Callable[[Any], bool]:
+    def _step(obj: Any) -> bool:
+        if isinstance(obj, dict) and key in obj:
+            del obj[key]
+            return True
+        return False
+
+    return _step
+
+
+def _drop_rules_with_flag(flag: str) -> Callable[[Any], bool]:
+    def _step(obj: Any) -> bool:
+        changed = False
+        if isinstance(obj, dict):
+            for value in obj.values():
+                changed = _step(value) or changed
+        elif isinstance(obj, list):
+            kept = [item for item in obj if not (_is_rule(item) and item.get("flag") == flag)]
+            changed = len(kept) != len(obj)
+            obj[:] = kept
+            for item in obj:
+                changed = _step(item) or changed
+        return changed
+
+    return _step
+
+
+def _trim_trends(obj: Any) -> bool:
+    """Trend data reduced to the latest values: no insights or YoY maps, series cut to 3 points."""
+    changed = False
+    if not isinstance(obj, dict):
+        return False
+    for key in TREND_KEYS:
+        trends = obj.get(key)
+        if not isinstance(trends, dict):
+            continue
+        for name, series in list(trends.items()):
+            if isinstance(series, list) and len(series) > 3:
+                trends[name] = series[-3:]
+                changed = True
+            elif isinstance(series, dict):
+                for drop in ("insight", "yoy_growth_pct"):
+                    if drop in series:
+                        del series[drop]
+                        changed = True
+                values = series.get("values")
+                if isinstance(values, dict) and len(values) > 3:
+                    series["values"] = dict(list(values.items())[:3])
+                    changed = True
+    return changed
+
+
+def _drop_trends(obj: Any) -> bool:
+    changed = False
+    for key in TREND_KEYS:
+        changed = _drop_key(key)(obj) or changed
+    return changed
+
+
+TRIM_STEPS = [
+    ("deterministic_narrative", _drop_key("deterministic_narrative")),
+    ("green_rules", _drop_rules_with_flag("GREEN")),
+    ("trend_detail", _trim_trends),
+    ("trends", _drop_trends),
+    ("yellow_rules", _drop_rules_with_flag("YELLOW")),
+]
+
+
+# ---------------------------------------------------------
+# PUBLIC API
+# ---------------------------------------------------------
+def compact_json(module: str, obj: Any, config: Optional[CompactionConfig] = None, **raw_dumps_kwargs) -> str:
+    """
+    JSON text of `obj` for embedding in a module prompt. `raw_dumps_kwargs`
+    are the json.dumps options the module used before compaction, so the
+    saved tokens are measured against what it actually sent.
+    """
+    config = config or get_config()
+    raw = json.dumps(obj, ensure_ascii=False, default=str, **raw_dumps_kwargs)
+    if not config.enabled:
+        _record(module, raw, raw, [])
+        return raw
+
+    compact_obj = round_numbers(_compact_tree(obj, config), config.digits)
+    text = _encode(compact_obj)
+    applied: List[str] = []
+    if config.token_budget:
+        for name, step in TRIM_STEPS:
+            if count_tokens(text) <= config.token_budget:
+                break
+            if step(compact_obj):
+                applied.append(name)
+                text = _encode(compact_obj)
+
+    _record(module, raw, text, applied)
+    return text
+
+
+def _record(module: str, raw: str, compact: str, applied: List[str]) -> None:
+    raw_tokens, compact_tokens = count_tokens(raw), count_tokens(compact)
+    with _stats_lock:
+        stats = _stats.setdefault(module, ModuleCompactionStats())
+        stats.sections += 1
+        stats.raw_tokens += raw_tokens
+        stats.compact_tokens += compact_tokens
+        if applied:
+            stats.trimmed += 1
+            for name in applied:
+                stats.trim_steps[name] = stats.trim_steps.get(name, 0) + 1
+
+
+def compaction_report() -> Dict[str, dict]:
+    """Tokens saved per module since start (or the last reset)."""
+    with _stats_lock:
+        report = {module: stats.summary() for module, stats in sorted(_stats.items())}
+        total = ModuleCompactionStats(
+            sections=sum(s.sections for s in _stats.values()),
+            raw_tokens=sum(s.raw_tokens for s in _stats.values()),
+            compact_tokens=sum(s.compact_tokens for s in _stats.values()),
+            trimmed=sum(s.trimmed for s in _stats.values()),
+        )
+    report["TOTAL"] = total.summary()
+    return report
+
+
+def reset_stats() -> None:
+    with _stats_lock:
+        _stats.clear()
+
+
+def format_report(report: Dict[str, dict]) -> str:
+    header = f"{'module':<18}{'sections':>9}{'raw_tok':>10}{'compact':>10}{'saved':>9}{'saved%':>8}{'trimmed':>9}"
+    lines = [header, "-" * len(header)]
+    for module, s in report.items():
+        lines.append(
+            f"{module:<18}{s['sections']:>9}{s['raw_tokens']:>10}{s['compact_tokens']:>10}"
+            f"{s['tokens_saved']:>9}{s['saved_pct']:>8}{s['budget_trimmed']:>9}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure prompt tokens saved by compaction per module")
+    parser.add_argument("--companies", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mix", default=None)
+    parser.add_argument("--drop-green", action="store_true")
+    parser.add_argument("--token-budget", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    from src.app import pipeline
+    from src.app.benchmarking.llm_stub_server import StubLLMClient
+    from src.app.benchmarking.synthetic_data import iter_universe, parse_mix
+    # The modules record into the imported module, not this __main__ copy
+    from src.app.llm import prompt_compactor as compactor
+
+    compactor.set_config(compactor.CompactionConfig(drop_green=args.drop_green, token_budget=args.token_budget))
+    with pipeline.llm_client_override(StubLLMClient()):
+        for payload in iter_universe(args.companies, seed=args.seed, mix=parse_mix(args.mix)):
+            pipeline.run_modules(payload, combined_llm=False)
+
+    print(format_report(compactor.compaction_report()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
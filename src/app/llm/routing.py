@@ -0,0 +1,193 @@
+# routing.py
+"""
+Adaptive model routing: one model tier per completion.
+
+Without routing every call goes to the module's configured model, so an
+all-GREEN company gets the same treatment as a distressed one. With
+LLM_ROUTING=1 the gateway routes each call to a tier:
+
+    none    no LLM call; the module returns its deterministic template
+            narrative (nothing was flagged, so there is nothing to explain)
+    small   LLM_MODEL_SMALL, for YELLOW-only or lightly flagged cases
+    large   LLM_MODEL_LARGE, when enough RED flags fire or the prompt is
+            big enough to need the stronger model
+
+The signals are the rule severity counts of the call, its prompt size and
+the remaining latency budget of the request: with LLM_LATENCY_BUDGET_MS set,
+a tier whose observed p90 latency no longer fits in what is left of the
+budget is stepped down (large -> small -> none). Per-tier latency, call
+counts and routing reasons are reported by `metrics()`.
+
+An explicit `model=` passed to `LLMGateway.complete` bypasses routing. In
+combined mode (`src.app.llm.combined`) only the combined call is routed, on
+the union of the modules' rules; module calls it answers are not.
+
+Configuration (environment):
+    LLM_ROUTING                  1 enables tier routing (default 0)
+    LLM_MODEL_SMALL              small-tier model (default OPENAI_MODEL)
+    LLM_MODEL_LARGE              large-tier model (default gpt-4o)
+    LLM_ROUTE_SKIP_CLEAN         1 sends cases with no RED/YELLOW flag to tier none (default 1)
+    LLM_ROUTE_LARGE_MIN_RED      RED flags that select the large tier (default 2)
+    LLM_ROUTE_LARGE_MIN_TOKENS   prompt tokens that select the large tier (default 4000)
+    LLM_LATENCY_BUDGET_MS        per-request latency budget (default 0: none)
+    LLM_ROUTE_MIN_SAMPLES        latencies needed before a tier's p90 is trusted (default 20)
+"""
+import os
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+
+from src.app.config import OPENAI_MODEL
+from src.app.llm.hedging import LatencyTracker
+from src.app.llm.usage import current_scope
+
+TIERS = ("none", "small", "large")
+
+
+@dataclass
+class RoutingConfig:
+    enabled: bool = False
+    small_model: str = OPENAI_MODEL
+    large_model: str = "gpt-4o"
+    skip_clean: bool = True
+    large_min_red: int = 2
+    large_min_tokens: int = 4000
+    latency_budget_ms: float = 0.0
+    min_samples: int = 20
+
+    @classmethod
+    def from_env(cls) -> "RoutingConfig":
+        return cls(
+            enabled=os.getenv("LLM_ROUTING", "0").lower() in ("1", "true", "yes", "on"),
+            small_model=os.getenv("LLM_MODEL_SMALL") or OPENAI_MODEL,
+            large_model=os.getenv("LLM_MODEL_LARGE") or "gpt-4o",
+            skip_clean=os.getenv("LLM_ROUTE_SKIP_CLEAN", "1").lower() not in ("0", "false", "no", "off"),
+            large_min_red=int(os.getenv("LLM_ROUTE_LARGE_MIN_RED", 2)),
+            large_min_tokens=int(os.getenv("LLM_ROUTE_LARGE_MIN_TOKENS", 4000)),
+            latency_budget_ms=float(os.getenv("LLM_LATENCY_BUDGET_MS", 0)),
+            min_samples=int(os.getenv("LLM_ROUTE_MIN_SAMPLES", 20)),
+        )
+
+
+@dataclass
+class RouteDecision:
+    tier: str
+    model: Optional[str]
+    reason: str
+
+
+def severity_counts(rules: Optional[Iterable]) -> Tuple[int, int]:
+    """(RED, YELLOW) counts of RuleResults or their dict forms."""
+    red = yellow = 0
+    for rule in rules or []:
+        flag = rule.get("flag") if isinstance(rule, dict) else getattr(rule, "flag", None)
+        if flag == "RED":
+            red += 1
+        elif flag == "YELLOW":
+            yellow += 1
+    return red, yellow
+
+
+class ModelRouter:
+    def __init__(self, config: Optional[RoutingConfig] = None):
+        self.config = config or RoutingConfig()
+        self.latencies = LatencyTracker(window=500)
+        self._lock = threading.Lock()
+        self._stats: Counter = Counter()
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.enabled
+
+    def model(self, tier: str) -> Optional[str]:
+        return {"small": self.config.small_model, "large": self.config.large_model}.get(tier)
+
+    def route(self, module: str, messages: List[dict], rules: Optional[Iterable] = None) -> RouteDecision:
+        """
+        Tier for one call. `rules` are the rule results behind the prompt;
+        without them severity is unknown and only the prompt size decides.
+        """
+        from src.app.llm.prompt_compactor import count_tokens
+
+        tokens = count_tokens("\n".join(m.get("content") or "" for m in messages))
+        if rules is not None:
+            red, yellow = severity_counts(rules)
+        else:
+            red, yellow = None, None
+
+        if red == 0 and yellow == 0 and self.config.skip_clean:
+            tier, reason = "none", "clean"
+        elif red is not None and red >= self.config.large_min_red:
+            tier, reason = "large", "severity"
+        elif tokens >= self.config.large_min_tokens:
+            tier, reason = "large", "prompt_size"
+        else:
+            tier, reason = "small", "default"
+
+        remaining = self._remaining_budget_ms()
+        while tier != "none" and remaining is not None:
+            expected = self.latencies.quantile(tier, 90, self.config.min_samples)
+            if expected is None or expected * 1000 <= remaining:
+                break
+            tier = TIERS[TIERS.index(tier) - 1]
+            reason = "latency_budget"
+
+        with self._lock:
+            self._stats[f"{tier}.calls"] += 1
+            self._stats[f"{tier}.{reason}"] += 1
+            self._stats[f"{module}.{tier}"] += 1
+        return RouteDecision(tier=tier, model=self.model(tier), reason=reason)
+
+    def _remaining_budget_ms(self) -> Optional[float]:
+        if self.config.latency_budget_ms <= 0:
+            return None
+        scope = current_scope()
+        if scope is None:
+            return None
+        return self.config.latency_budget_ms - (time.perf_counter() - scope.started) * 1000
+
+    def record(self, tier: str, latency: float, ok: bool = True) -> None:
+        """Latency (seconds) of one completed call on `tier`."""
+        self.latencies.add(tier, latency)
+        with self._lock:
+            self._stats[f"{tier}.latency_total"] += latency
+            self._stats[f"{tier}.completed"] += 1
+            if not ok:
+                self._stats[f"{tier}.empty_answers"] += 1
+
+    def metrics(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        tiers = {}
+        for tier in TIERS:
+            completed = stats.get(f"{tier}.completed", 0)
+            p50 = self.latencies.quantile(tier, 50, 1)
+            p95 = self.latencies.quantile(tier, 95, 1)
+            tiers[tier] = {
+                "model": self.model(tier),
+                "calls": stats.get(f"{tier}.calls", 0),
+                "reasons": {
+                    reason: stats[f"{tier}.{reason}"]
+                    for reason in ("clean", "severity", "prompt_size", "default", "latency_budget")
+                    if stats.get(f"{tier}.{reason}")
+                },
+            }
+            if tier != "none":
+                tiers[tier].update(
+                    {
+                        "completed": completed,
+                        "empty_answers": stats.get(f"{tier}.empty_answers", 0),
+                        "latency_ms_avg": round(stats[f"{tier}.latency_total"] / completed * 1000, 2) if completed else None,
+                        "latency_ms_p50": round(p50 * 1000, 2) if p50 is not None else None,
+                        "latency_ms_p95": round(p95 * 1000, 2) if p95 is not None else None,
+                    }
+                )
+        modules = sorted({k.split(".")[0] for k in stats} - set(TIERS))
+        return {
+            "enabled": self.config.enabled,
+            "latency_budget_ms": self.config.latency_budget_ms or None,
+            "tiers": tiers,
+            "by_module": {m: {t: stats.get(f"{m}.{t}", 0) for t in TIERS} for m in modules},
+        }
@@ -0,0 +1,485 @@
+# usage.py
+"""
+Token and cost accounting for every LLM completion.
+
+The gateway records one `UsageRecord` per provider call: model, prompt and
+completion tokens (from the provider's `usage`, estimated when absent),
+latency and an approximate cost. Records are attributed to the active
+`UsageScope` (one per HTTP request or pipeline run, carried in a
+contextvar), aggregated in memory per module, company and day, and
+optionally appended to a local SQLite ledger.
+
+Budgets: a scope with a tenant and/or run id draws on per-tenant daily and
+per-run token budgets. Once one is exhausted, `budget_allows()` turns false
+and the modules take their deterministic fallback paths.
+
+Configuration (environment):
+    LLM_USAGE_LEDGER              SQLite ledger path (unset: in-memory aggregates only)
+    LLM_TOKEN_BUDGET_PER_TENANT   tokens per tenant per UTC day
+    LLM_TOKEN_BUDGET_PER_RUN      tokens per run id
+    LLM_RUN_ID                    run id for pipeline / CLI runs
+    LLM_PRICING                   JSON {"model": [input_usd_per_1m, output_usd_per_1m]} merged over PRICING
+
+Usage (ledger report):
+    python -m src.app.llm.usage --ledger llm_usage.sqlite --group-by day,module
+"""
+import argparse
+import contextvars
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+# USD per 1M tokens (input, output)
+PRICING: Dict[str, Tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+}
+
+GROUP_FIELDS = ("day", "module", "company", "model", "tenant", "run_id")
+
+
+def _pricing() -> Dict[str, Tuple[float, float]]:
+    table = dict(PRICING)
+    extra = os.getenv("LLM_PRICING")
+    if extra:
+        table.update({model: tuple(prices) for model, prices in json.loads(extra).items()})
+    return table
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    table = _pricing()
+    # Dated snapshots ("gpt-4o-mini-2024-07-18") price like their base model
+    base = max((name for name in table if model and model.startswith(name)), key=len, default=None)
+    if base is None:
+        return 0.0
+    input_price, output_price = table[base]
+    return round((prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000, 8)
+
+
+@dataclass
+class UsageRecord:
+    ts: float
+    day: str
+    request_id: str
+    tenant: Optional[str]
+    run_id: Optional[str]
+    company: Optional[str]
+    module: str
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+    latency_ms: float
+    cost_usd: float
+    estimated: bool = False
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+@dataclass
+class UsageTotals:
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency_ms: float = 0.0
+    cost_usd: float = 0.0
+
+    def add(self, record: UsageRecord) -> None:
+        self.calls += 1
+        self.prompt_tokens += record.prompt_tokens
+        self.completion_tokens += record.completion_tokens
+        self.latency_ms += record.latency_ms
+        self.cost_usd += record.cost_usd
+
+    def summary(self) -> dict:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+            "llm_latency_ms": round(self.latency_ms, 2),
+            "cost_usd": round(self.cost_usd, 6),
+        }
+
+
+# ---------------------------------------------------------
+# SCOPES (one per request / run)
+# ---------------------------------------------------------
+@dataclass
+class UsageScope:
+    request_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    tenant: Optional[str] = None
+    run_id: Optional[str] = None
+    company: Optional[str] = None
+    company_resolver: Optional[Callable[[], Optional[str]]] = None
+    started: float = field(default_factory=time.perf_counter)
+    records: List[UsageRecord] = field(default_factory=list)
+    budget_exhausted: bool = False
+    coalesced: bool = False
+    priority: str = "interactive"
+    llm_shed: bool = False
+    llm_fallback: Optional[str] = None
+    llm_attempts: int = 0
+
+    def resolve_company(self) -> Optional[str]:
+        if self.company is None and self.company_resolver is not None:
+            self.company = self.company_resolver()
+        return self.company
+
+    def timing(self) -> dict:
+        """The timing block returned with a response."""
+        totals = UsageTotals()
+        modules: Dict[str, UsageTotals] = defaultdict(UsageTotals)
+        for record in list(self.records):
+            totals.add(record)
+            modules[record.module].add(record)
+        block = {"elapsed_ms": round((time.perf_counter() - self.started) * 1000, 2)}
+        block.update(totals.summary())
+        block["modules"] = {module: t.summary() for module, t in modules.items()}
+        if self.budget_exhausted:
+            block["budget_exhausted"] = True
+        if self.llm_shed:
+            # LLM skipped under load; deterministic narrative returned
+            block["llm_shed"] = True
+        if self.llm_fallback:
+            # LLM unavailable (circuit_open / provider_error); deterministic narrative returned
+            block["llm_fallback"] = self.llm_fallback
+        if self.coalesced:
+            # Result shared with an identical in-flight request; its usage is counted there
+            block["coalesced"] = True
+        return block
+
+
+_current_scope: contextvars.ContextVar = contextvars.ContextVar("llm_usage_scope", default=None)
+
+
+def current_scope() -> Optional[UsageScope]:
+    return _current_scope.get()
+
+
+@contextmanager
+def usage_scope(
+    company: Optional[str] = None,
+    tenant: Optional[str] = None,
+    run_id: Optional[str] = None,
+    company_resolver: Optional[Callable[[], Optional[str]]] = None,
+    priority: str = "interactive",
+):
+    """Attribute LLM usage inside the block to a new scope (yields the scope)."""
+    scope = UsageScope(
+        tenant=tenant,
+        run_id=run_id or os.getenv("LLM_RUN_ID") or None,
+        company=company,
+        company_resolver=company_resolver,
+        priority=priority,
+    )
+    token = _current_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _current_scope.reset(token)
+
+
+# ---------------------------------------------------------
+# LEDGER
+# ---------------------------------------------------------
+class UsageLedger:
+    """Append-only SQLite ledger of usage records."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS llm_usage (
+                    ts REAL, day TEXT, request_id TEXT, tenant TEXT, run_id TEXT,
+                    company TEXT, module TEXT, model TEXT,
+                    prompt_tokens INTEGER, completion_tokens INTEGER,
+                    latency_ms REAL, cost_usd REAL, estimated INTEGER
+                )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS llm_usage_day ON llm_usage (day)")
+            self._conn.commit()
+
+    def append(self, record: UsageRecord) -> None:
+        row = asdict(record)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO llm_usage VALUES (:ts, :day, :request_id, :tenant, :run_id, :company, :module, "
+                ":model, :prompt_tokens, :completion_tokens, :latency_ms, :cost_usd, :estimated)",
+                row,
+            )
+            self._conn.commit()
+
+    def report(self, group_by: List[str], day: Optional[str] = None) -> List[dict]:
+        columns = [c for c in group_by if c in GROUP_FIELDS]
+        select = ", ".join(columns + [
+            "COUNT(*) AS calls",
+            "SUM(prompt_tokens) AS prompt_tokens",
+            "SUM(completion_tokens) AS completion_tokens",
+            "ROUND(SUM(cost_usd), 6) AS cost_usd",
+            "ROUND(AVG(latency_ms), 2) AS avg_latency_ms",
+        ])
+        sql = f"SELECT {select} FROM llm_usage"
+        params: Tuple = ()
+        if day:
+            sql += " WHERE day = ?"
+            params = (day,)
+        if columns:
+            sql += f" GROUP BY {', '.join(columns)} ORDER BY {', '.join(columns)}"
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            names = [d[0] for d in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# ---------------------------------------------------------
+# ACCOUNTANT (process-wide aggregates + budgets)
+# ---------------------------------------------------------
+class UsageAccountant:
+    def __init__(
+        self,
+        ledger: Optional[UsageLedger] = None,
+        tenant_budget: Optional[int] = None,
+        run_budget: Optional[int] = None,
+    ):
+        self.ledger = ledger
+        self.tenant_budget = tenant_budget
+        self.run_budget = run_budget
+        self._lock = threading.Lock()
+        self._totals: Dict[Tuple[str, str, str], UsageTotals] = defaultdict(UsageTotals)
+        self._tenant_tokens: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._run_tokens: Dict[str, int] = defaultdict(int)
+
+    @classmethod
+    def from_env(cls) -> "UsageAccountant":
+        path = os.getenv("LLM_USAGE_LEDGER")
+        tenant_budget = os.getenv("LLM_TOKEN_BUDGET_PER_TENANT")
+        run_budget = os.getenv("LLM_TOKEN_BUDGET_PER_RUN")
+        return cls(
+            ledger=UsageLedger(path) if path else None,
+            tenant_budget=int(tenant_budget) if tenant_budget else None,
+            run_budget=int(run_budget) if run_budget else None,
+        )
+
+    def record(
+        self,
+        module: str,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        latency_ms: float,
+        estimated: bool = False,
+    ) -> UsageRecord:
+        scope = current_scope()
+        now = time.time()
+        record = UsageRecord(
+            ts=now,
+            day=time.strftime("%Y-%m-%d", time.gmtime(now)),
+            request_id=scope.request_id if scope else "",
+            tenant=scope.tenant if scope else None,
+            run_id=scope.run_id if scope else None,
+            company=scope.resolve_company() if scope else None,
+            module=module,
+            model=model,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            latency_ms=round(latency_ms, 2),
+            cost_usd=estimate_cost(model, prompt_tokens, completion_tokens),
+            estimated=estimated,
+        )
+        if scope is not None:
+            scope.records.append(record)
+        with self._lock:
+            self._totals[(record.day, module, record.company or "")].add(record)
+            if record.tenant:
+                self._tenant_tokens[(record.tenant, record.day)] += record.total_tokens
+            if record.run_id:
+                self._run_tokens[record.run_id] += record.total_tokens
+        if self.ledger is not None:
+            try:
+                self.ledger.append(record)
+            except sqlite3.Error as exc:
+                print(f"LLM usage ledger write failed: {exc}", flush=True)
+        return record
+
+    def budget_allows(self, mark: bool = True) -> bool:
+        """False once the active scope's tenant or run budget is used up (flagged on the scope with `mark`)."""
+        scope = current_scope()
+        if scope is None or (self.tenant_budget is None and self.run_budget is None):
+            return True
+        day = time.strftime("%Y-%m-%d", time.gmtime())
+        with self._lock:
+            over = (
+                self.tenant_budget is not None
+                and scope.tenant
+                and self._tenant_tokens[(scope.tenant, day)] >= self.tenant_budget
+            ) or (
+                self.run_budget is not None
+                and scope.run_id
+                and self._run_tokens[scope.run_id] >= self.run_budget
+            )
+        if over and mark:
+            scope.budget_exhausted = True
+        return not over
+
+    def totals(self, group_by: List[str]) -> List[dict]:
+        """In-process aggregates grouped by any of day, module, company."""
+        keys = [g for g in group_by if g in ("day", "module", "company")]
+        grouped: Dict[tuple, UsageTotals] = defaultdict(UsageTotals)
+        with self._lock:
+            for (day, module, company), totals in self._totals.items():
+                row = {"day": day, "module": module, "company": company}
+                merged = grouped[tuple(row[k] for k in keys)]
+                merged.calls += totals.calls
+                merged.prompt_tokens += totals.prompt_tokens
+                merged.completion_tokens += totals.completion_tokens
+                merged.latency_ms += totals.latency_ms
+                merged.cost_usd += totals.cost_usd
+        return [dict(zip(keys, key), **totals.summary()) for key, totals in sorted(grouped.items())]
+
+
+_accountant: Optional[UsageAccountant] = None
+_accountant_lock = threading.Lock()
+
+
+def get_usage_accountant() -> UsageAccountant:
+    global _accountant
+    if _accountant is None:
+        with _accountant_lock:
+            if _accountant is None:
+                _accountant = UsageAccountant.from_env()
+    return _accountant
+
+
+# ---------------------------------------------------------
+# HTTP: per-request scope + timing block
+# ---------------------------------------------------------
+class UsageTimingMiddleware:
+    """
+    Pure ASGI middleware opening a `UsageScope` per analyze request and
+    adding its `timing` block to JSON object responses. The tenant is taken
+    from the X-Tenant-Id header, the LLM priority class from X-Priority
+    (interactive by default), the company from the request body.
+    """
+
+    def __init__(
+        self,
+        app,
+        path_suffixes=("/analyze",),
+        tenant_header: str = "x-tenant-id",
+        priority_header: str = "x-priority",
+    ):
+        self.app = app
+        self.path_suffixes = tuple(path_suffixes)
+        self.tenant_header = tenant_header.lower().encode()
+        self.priority_header = priority_header.lower().encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope.get("path", "").endswith(self.path_suffixes):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        tenant = headers.get(self.tenant_header)
+        priority = headers.get(self.priority_header, b"interactive").decode().lower()
+        body_chunks: List[bytes] = []
+        start_message: Dict = {}
+        response_chunks: List[bytes] = []
+
+        def _company() -> Optional[str]:
+            try:
+                company = json.loads(b"".join(body_chunks) or b"{}").get("company")
+            except (ValueError, AttributeError):
+                return None
+            return str(company).upper() if company else None
+
+        async def _receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                body_chunks.append(message.get("body", b""))
+            return message
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                start_message.update(message)
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            response_chunks.append(message.get("body", b""))
+            if message.get("more_body"):
+                return
+            body = _with_timing(start_message, b"".join(response_chunks), usage.timing())
+            response_headers = [
+                (k, v) for k, v in start_message.get("headers", []) if k.lower() != b"content-length"
+            ]
+            response_headers.append((b"content-length", str(len(body)).encode()))
+            await send(dict(start_message, headers=response_headers))
+            await send({"type": "http.response.body", "body": body})
+
+        with usage_scope(
+            tenant=tenant.decode() if tenant else None,
+            company_resolver=_company,
+            priority=priority,
+        ) as usage:
+            await self.app(scope, _receive, _send)
+
+
+def _with_timing(start_message: dict, body: bytes, timing: dict) -> bytes:
+    content_type = dict(start_message.get("headers", [])).get(b"content-type", b"")
+    if not content_type.startswith(b"application/json"):
+        return body
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return body
+    if not isinstance(payload, dict):
+        return body
+    payload["timing"] = timing
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def format_rows(rows: List[dict]) -> str:
+    if not rows:
+        return "(no usage recorded)"
+    columns = list(rows[0].keys())
+    widths = {c: max(len(c), *(len(str(r.get(c))) for r in rows)) for c in columns}
+    lines = ["  ".join(c.ljust(widths[c]) for c in columns)]
+    lines.append("  ".join("-" * widths[c] for c in columns))
+    lines.extend("  ".join(str(r.get(c)).ljust(widths[c]) for c in columns) for r in rows)
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Report LLM token usage and cost from the local ledger")
+    parser.add_argument("--ledger", default=os.getenv("LLM_USAGE_LEDGER", "llm_usage.sqlite"))
+    parser.add_argument("--group-by", default="day,module", help=f"comma-separated subset of {','.join(GROUP_FIELDS)}")
+    parser.add_argument("--day", default=None, help="YYYY-MM-DD")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    ledger = UsageLedger(args.ledger)
+    rows = ledger.report([g.strip() for g in args.group_by.split(",") if g.strip()], day=args.day)
+    print(json.dumps(rows, indent=2) if args.json else format_rows(rows))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
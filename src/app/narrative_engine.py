@@ -0,0 +1,303 @@
+# narrative_engine.py
+"""
+Deterministic four-section narrative engine.
+
+Produces the structure the module prompts ask the LLM for:
+
+    1. overall assessment   tone from the rule outcomes, headline metrics
+                            and trend patterns
+    2. key concerns         RED then YELLOW rules
+    3. positives            GREEN rules and favourable trends
+    4. conclusion           tone-dependent closing line
+
+from rule outcomes, key metrics and trend data only: well under a millisecond
+per company, so batch runs get usable narratives at CPU speed. It is the
+narrative every module falls back to when the LLM is unavailable or its
+answer does not parse, and with NARRATIVE_ENGINE=template the LLM is
+skipped entirely. The terse module notes still go into the LLM prompts.
+
+Phrasing lives in TEMPLATES (str.format strings). A JSON file named by
+NARRATIVE_TEMPLATES_PATH overrides entries, either for every module
+("default") or for one module ("liquidity", ...):
+
+    {"default": {"concerns_none": "Nothing alarming surfaced."},
+     "liquidity": {"topic": "near-term liquidity"}}
+
+Configuration (environment):
+    NARRATIVE_ENGINE           llm (default) | template
+    NARRATIVE_TEMPLATES_PATH   JSON phrasing overrides
+"""
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+NARRATIVE_ENGINES = ("llm", "template")
+
+TEMPLATES: Dict[str, str] = {
+    "topic": "balance sheet",
+    "tone_strong": "strong",
+    "tone_adequate": "adequate",
+    "tone_stretched": "stretched",
+    "tone_weak": "weak",
+    "assessment": "{company}'s {topic} profile is {tone}, with {red} red and {yellow} amber flags across {total} checks.",
+    "headline": "Key metrics: {metrics}.",
+    "trends": "Trends: {trends}.",
+    "concern_item": "{rule} ({flag}): {reason}",
+    "concerns": "Key concerns: {items}.",
+    "concerns_none": "No material {topic} concerns were flagged by the rule checks.",
+    "positive_item": "{rule}",
+    "positives": "Positives: {items}.",
+    "positives_none": "Few mitigating factors stand out; none of the {topic} checks passed cleanly.",
+    "conclusion_strong": "Overall, {topic} is a credit strength for {company}.",
+    "conclusion_adequate": "Overall, {topic} is acceptable for {company}, with {yellow} area(s) to monitor.",
+    "conclusion_stretched": "Overall, {topic} is a watch item for {company}: {red} red flag(s) warrant closer monitoring.",
+    "conclusion_weak": "Overall, {topic} is a material credit weakness for {company} and needs mitigation.",
+    "trend_rising": "{label} up {rate:.1f}% a year",
+    "trend_declining": "{label} down {rate:.1f}% a year",
+    "trend_volatile": "{label} volatile (YoY swings of {swing:.0f} pts)",
+    "trend_stable": "{label} broadly stable",
+}
+
+MODULE_TEMPLATES: Dict[str, Dict[str, str]] = {
+    "borrowings": {"topic": "leverage and debt servicing"},
+    "asset_quality": {"topic": "asset quality"},
+    "capex_cwip": {"topic": "capital investment"},
+    "liquidity": {"topic": "short-term liquidity"},
+    "working_capital": {"topic": "working capital"},
+}
+
+# (metric, label, format) shown in the assessment, in order
+HEADLINE_METRICS: Dict[str, List[Tuple[str, str, str]]] = {
+    "borrowings": [
+        ("debt_to_equity", "debt/equity", "{:.2f}x"),
+        ("debt_to_ebitda", "debt/EBITDA", "{:.1f}x"),
+        ("interest_coverage", "interest coverage", "{:.1f}x"),
+        ("st_debt_share", "short-term share of debt", "{:.0%}"),
+    ],
+    "asset_quality": [
+        ("asset_turnover", "asset turnover", "{:.2f}x"),
+        ("asset_age_proxy", "asset age proxy", "{:.0%}"),
+        ("goodwill_pct", "goodwill share", "{:.1%}"),
+        ("impairment_pct", "impairment", "{:.1%}"),
+    ],
+    "capex_cwip": [
+        ("capex_intensity", "capex intensity", "{:.1%}"),
+        ("cwip_pct", "CWIP share", "{:.1%}"),
+        ("asset_turnover", "asset turnover", "{:.2f}x"),
+        ("fcf_coverage", "FCF coverage", "{:.2f}x"),
+    ],
+    "liquidity": [
+        ("current_ratio", "current ratio", "{:.2f}x"),
+        ("quick_ratio", "quick ratio", "{:.2f}x"),
+        ("cash_ratio", "cash ratio", "{:.2f}x"),
+        ("defensive_interval_ratio_days", "defensive interval", "{:.0f} days"),
+    ],
+    "working_capital": [
+        ("ccc", "cash conversion cycle", "{:.0f} days"),
+        ("dso", "DSO", "{:.0f} days"),
+        ("dio", "DIO", "{:.0f} days"),
+        ("dpo", "DPO", "{:.0f} days"),
+    ],
+}
+
+# Trend series where growth is bad news (rising debt, slower collections, ...)
+ADVERSE_WHEN_RISING = {
+    "short_term_debt", "long_term_debt", "finance_cost", "cwip", "current_liabilities",
+    "trade_receivables", "receivables", "inventory", "goodwill",
+}
+
+# Trend labels that are not plain words
+LABELS = {
+    "cwip": "CWIP",
+    "nfa": "Net fixed assets",
+    "ocf": "OCF",
+    "op_asset": "Operating assets",
+    "cash_and_equivalents": "Cash",
+}
+
+# WC trend summaries carry YoY growth as fractions, the other modules as percent
+YOY_AS_FRACTION = {"working_capital"}
+
+MAX_ITEMS = 3
+
+_templates: Optional[Dict[str, Dict[str, str]]] = None
+_templates_lock = threading.Lock()
+
+
+def narrative_engine() -> str:
+    engine = os.getenv("NARRATIVE_ENGINE", "llm").lower()
+    if engine not in NARRATIVE_ENGINES:
+        raise ValueError(f"NARRATIVE_ENGINE must be one of {NARRATIVE_ENGINES}, got '{engine}'")
+    return engine
+
+
+def load_templates(path: Optional[str] = None) -> Dict[str, Dict[str, str]]:
+    """Per-module phrasing: built-ins merged with the JSON overrides."""
+    overrides: Dict[str, Dict[str, str]] = {}
+    path = path or os.getenv("NARRATIVE_TEMPLATES_PATH")
+    if path:
+        with open(path) as fh:
+            overrides = json.load(fh)
+    merged = {}
+    for module in set(MODULE_TEMPLATES) | (set(overrides) - {"default"}):
+        merged[module] = {
+            **TEMPLATES,
+            **overrides.get("default", {}),
+            **MODULE_TEMPLATES.get(module, {}),
+            **overrides.get(module, {}),
+        }
+    merged["default"] = {**TEMPLATES, **overrides.get("default", {})}
+    return merged
+
+
+def templates_for(module: str) -> Dict[str, str]:
+    global _templates
+    if _templates is None:
+        with _templates_lock:
+            if _templates is None:
+                _templates = load_templates()
+    return _templates.get(module) or _templates["default"]
+
+
+def reload_templates() -> None:
+    global _templates
+    with _templates_lock:
+        _templates = None
+
+
+# ---------------------------------------------------------
+# BUILDING BLOCKS
+# ---------------------------------------------------------
+def _rule_fields(rule) -> Tuple[str, str, str]:
+    """(name, flag, reason) of a RuleResult or its dict form."""
+    get = rule.get if isinstance(rule, dict) else lambda field: getattr(rule, field, None)
+    return get("rule_name") or get("rule_id") or "", get("flag") or "", (get("reason") or "").rstrip(". ")
+
+
+def _tone(red: int, yellow: int) -> str:
+    if red == 0:
+        return "strong" if yellow <= 1 else "adequate"
+    return "stretched" if red <= 2 else "weak"
+
+
+def _label(metric: str) -> str:
+    return LABELS.get(metric) or metric.replace("_", " ").capitalize()
+
+
+def _headline(module: str, key_metrics: Optional[dict]) -> List[str]:
+    parts = []
+    for metric, label, fmt in HEADLINE_METRICS.get(module, []):
+        value = (key_metrics or {}).get(metric)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            parts.append(f"{label} {fmt.format(value)}")
+    return parts
+
+
+def trend_patterns(module: str, trend_data: Optional[dict]) -> List[Tuple[str, str, float, float]]:
+    """(metric, pattern, mean YoY %, swing) per trend series; CAGR entries count as one-point series."""
+    patterns = []
+    scale = 100.0 if module in YOY_AS_FRACTION else 1.0
+    for metric, block in (trend_data or {}).items():
+        if isinstance(block, dict):
+            growth = [
+                v * scale for v in (block.get("yoy_growth_pct") or {}).values()
+                if isinstance(v, (int, float)) and not isinstance(v, bool)
+            ]
+        elif metric.endswith("_cagr") and isinstance(block, (int, float)) and not isinstance(block, bool):
+            metric, growth = metric[:-len("_cagr")], [float(block)]
+        else:
+            continue
+        if not growth:
+            continue
+        mean = sum(growth) / len(growth)
+        swing = max(growth) - min(growth)
+        if swing > 60:
+            pattern = "volatile"
+        elif mean > 8:
+            pattern = "rising"
+        elif mean < -5:
+            pattern = "declining"
+        else:
+            pattern = "stable"
+        patterns.append((metric, pattern, mean, swing))
+    return patterns
+
+
+def _trend_phrase(templates: Dict[str, str], metric: str, pattern: str, mean: float, swing: float) -> str:
+    return templates[f"trend_{pattern}"].format(label=_label(metric), rate=abs(mean), swing=swing)
+
+
+def _adverse(metric: str, pattern: str) -> bool:
+    if pattern == "volatile":
+        return True
+    rising_is_bad = metric in ADVERSE_WHEN_RISING
+    return (pattern == "rising" and rising_is_bad) or (pattern == "declining" and not rising_is_bad)
+
+
+# ---------------------------------------------------------
+# NARRATIVE
+# ---------------------------------------------------------
+def build_narrative(
+    module: str,
+    company_id: str,
+    key_metrics: Optional[dict],
+    rule_results: Iterable,
+    trend_data: Optional[dict] = None,
+) -> List[str]:
+    """Four narrative sections: assessment, concerns, positives, conclusion."""
+    t = templates_for(module)
+    rules = [_rule_fields(r) for r in rule_results or []]
+    red = [r for r in rules if r[1] == "RED"]
+    yellow = [r for r in rules if r[1] == "YELLOW"]
+    green = [r for r in rules if r[1] == "GREEN"]
+    tone = _tone(len(red), len(yellow))
+    fields = {
+        "company": company_id,
+        "topic": t["topic"],
+        "tone": t[f"tone_{tone}"],
+        "red": len(red),
+        "yellow": len(yellow),
+        "total": len(rules),
+    }
+
+    patterns = trend_patterns(module, trend_data)
+
+    assessment = [t["assessment"].format(**fields)]
+    headline = _headline(module, key_metrics)
+    if headline:
+        assessment.append(t["headline"].format(metrics=", ".join(headline)))
+    if patterns:
+        trends = [_trend_phrase(t, *p) for p in patterns[:MAX_ITEMS + 1]]
+        assessment.append(t["trends"].format(trends="; ".join(trends)))
+
+    concern_items = [
+        t["concern_item"].format(rule=r[0], flag=r[1], reason=r[2])
+        for r in (red + yellow)[:MAX_ITEMS]
+    ]
+    concern_items += [_trend_phrase(t, *p) for p in patterns if _adverse(p[0], p[1])][:1]
+    concerns = t["concerns"].format(items="; ".join(concern_items)) if concern_items else t["concerns_none"].format(**fields)
+
+    positive_items = [t["positive_item"].format(rule=r[0], reason=r[2]) for r in green[:MAX_ITEMS]]
+    positive_items += [_trend_phrase(t, *p) for p in patterns if p[1] != "stable" and not _adverse(p[0], p[1])][:1]
+    positives = (
+        t["positives"].format(items="; ".join(positive_items)) if positive_items else t["positives_none"].format(**fields)
+    )
+
+    conclusion = t[f"conclusion_{tone}"].format(**fields)
+    return [" ".join(assessment), concerns, positives, conclusion]
+
+
+def from_llm_answer(answer: dict, template_narrative: List[str], base_score: int = 0) -> Tuple[List[str], int, dict]:
+    """
+    (narrative, adjusted score, trend_insights) of a parsed (or cached) LLM
+    answer: a missing narrative falls back to `template_narrative`, a missing
+    score adjustment leaves `base_score` unchanged.
+    """
+    narrative = answer.get("analysis_narrative") or template_narrative
+    score_adj = answer.get("score_adjustment")
+    if isinstance(score_adj, (int, float)) and not isinstance(score_adj, bool):
+        adjusted_score = max(0, min(100, base_score + int(score_adj)))
+    else:
+        adjusted_score = base_score
+    return narrative, adjusted_score, answer.get("trend_insights") or {}
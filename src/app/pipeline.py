@@ -0,0 +1,257 @@
+# pipeline.py
+"""
+In-process entry points for the five analysis modules.
+
+Each runner takes an `AnalysisRequest`-shaped payload, performs the same
+input conversion as the matching endpoint in `src/main.py` and returns the
+module output as a plain dict. Used by the benchmarking tools and any
+caller that wants module results without going through HTTP.
+
+Set LLM_COMBINED_CALL=1 (or pass combined_llm=True) to have `run_modules`
+answer all modules of a company from one combined LLM completion.
+LLM token usage is attributed to a per-company usage scope unless the
+caller already opened one (see `src.app.llm.usage`). Rule thresholds
+follow the payload's `industry_code` (see `src.app.thresholds`). Outputs
+go to the results store (`src.app.results_store`) only with `persist=True`,
+so benchmarking and replay runs never write stub answers into it.
+`stream_modules` yields streamed LLM answer sections (LLM_STREAM=1) while
+the modules are still running, followed by the outputs.
+"""
+import contextvars
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+from src.app.request_model import AnalysisRequest
+
+from src.app.borrowing_module.debt_models import (
+    BorrowingsInput,
+    YearFinancialInput,
+)
+from src.app.borrowing_module.debt_orchestrator import BorrowingsModule
+from src.app.asset_quality_module.asset_models import (
+    AssetQualityInput,
+    AssetFinancialYearInput,
+)
+from src.app.asset_quality_module.asset_orchestrator import AssetIntangibleQualityModule
+from src.app.capex_cwip_module.orchestrator import CapexCwipModule
+from src.app.liquidity_module.liquidity_models import LiquidityModuleInput
+from src.app.liquidity_module.liquidity_orchestrator import LiquidityModule, build_financial_list
+from src.app.results_store import persist_result
+from src.app.thresholds import get_thresholds
+from src.app.working_capital_module.wc_orchestrator import run_working_capital_module
+
+MODULES = ("borrowings", "asset_quality", "working_capital", "capex_cwip", "liquidity")
+
+_borrowings_engine = BorrowingsModule()
+_asset_engine = AssetIntangibleQualityModule()
+
+
+def normalize_request(payload: dict) -> dict:
+    """Validate against AnalysisRequest and return a fresh dict (modules mutate their input)."""
+    return AnalysisRequest(**payload).dict()
+
+
+# ---------------------------------------------------------
+# INPUT BUILDERS (mirror the endpoint conversions)
+# ---------------------------------------------------------
+def industry_code(req: dict) -> str:
+    return (req.get("industry_code") or "GENERAL").upper()
+
+
+def build_borrowings_input(req: dict) -> BorrowingsInput:
+    thresholds = get_thresholds(industry_code(req))
+    return BorrowingsInput(
+        company_id=req["company"].upper(),
+        industry_code=industry_code(req),
+        financials_5y=[YearFinancialInput(**fy) for fy in req["financial_data"]["financial_years"]],
+        industry_benchmarks=thresholds.benchmarks,
+        covenant_limits=thresholds.covenants,
+    )
+
+
+def build_asset_input(req: dict) -> AssetQualityInput:
+    return AssetQualityInput(
+        company_id=req["company"].upper(),
+        industry_code=industry_code(req),
+        financials_5y=[AssetFinancialYearInput(**fy) for fy in req["financial_data"]["financial_years"]],
+        industry_asset_quality_benchmarks=get_thresholds(industry_code(req)).asset_quality,
+    )
+
+
+def build_liquidity_input(req: dict) -> LiquidityModuleInput:
+    return LiquidityModuleInput(
+        company_id=req["company"].upper(),
+        industry_code=industry_code(req),
+        financials_5y=build_financial_list(req),
+    )
+
+
+# ---------------------------------------------------------
+# MODULE RUNNERS
+# ---------------------------------------------------------
+def run_borrowings(req: dict) -> dict:
+    return _borrowings_engine.run(build_borrowings_input(req)).dict()
+
+
+def run_asset_quality(req: dict) -> dict:
+    return _asset_engine.run(build_asset_input(req)).dict()
+
+
+def run_working_capital(req: dict) -> dict:
+    return run_working_capital_module(req)
+
+
+def run_capex_cwip(req: dict) -> dict:
+    return CapexCwipModule().run(req)
+
+
+def run_liquidity(req: dict) -> dict:
+    return LiquidityModule().run(build_liquidity_input(req)).dict()
+
+
+RUNNERS: Dict[str, Callable[[dict], dict]] = {
+    "borrowings": run_borrowings,
+    "asset_quality": run_asset_quality,
+    "working_capital": run_working_capital,
+    "capex_cwip": run_capex_cwip,
+    "liquidity": run_liquidity,
+}
+
+
+def run_module(module: str, payload: dict, persist: bool = False) -> dict:
+    """Run one module on a raw payload (validated and copied first); `persist` stores the output."""
+    with _usage_scope(payload):
+        req = normalize_request(payload)
+        output = RUNNERS[module](req)
+        if persist:
+            persist_result(module, req, output)
+        return output
+
+
+@contextmanager
+def _usage_scope(payload: dict):
+    from src.app.llm.usage import current_scope, usage_scope
+
+    if current_scope() is not None:
+        yield current_scope()
+        return
+    with usage_scope(
+        company=str(payload.get("company", "")).upper() or None,
+        priority=os.getenv("LLM_PRIORITY", "batch"),
+    ) as scope:
+        yield scope
+
+
+def run_modules(
+    payload: dict,
+    modules: Optional[Iterable[str]] = None,
+    combined_llm: Optional[bool] = None,
+    persist: bool = False,
+) -> Dict[str, dict]:
+    """
+    Run several modules on one payload; a failing module yields {"error": ...}.
+
+    With `combined_llm` the modules run concurrently and share one LLM call
+    (see `src.app.llm.combined`); it defaults to the LLM_COMBINED_CALL env var.
+    """
+    modules = list(modules or MODULES)
+    if combined_llm is None:
+        combined_llm = os.getenv("LLM_COMBINED_CALL", "0").lower() in ("1", "true", "yes", "on")
+
+    from src.app.llm.gateway import get_llm_gateway
+
+    gateway = get_llm_gateway()
+    with _usage_scope(payload):
+        if not combined_llm or len(modules) < 2 or not gateway.enabled:
+            return {module: _run_safely(module, payload, persist) for module in modules}
+
+        from src.app.llm.combined import CombinedLLMBatch
+
+        batch = CombinedLLMBatch(str(payload.get("company", "")).upper(), modules, gateway)
+
+        def _run_in_batch(module: str) -> dict:
+            try:
+                with gateway.combined_batch(batch):
+                    return _run_safely(module, payload, persist)
+            finally:
+                batch.module_done(module)
+
+        # Each worker runs in a copy of this context so usage lands in the same scope
+        with ThreadPoolExecutor(max_workers=len(modules)) as pool:
+            futures = [pool.submit(contextvars.copy_context().run, _run_in_batch, m) for m in modules]
+            return {module: future.result() for module, future in zip(modules, futures)}
+
+
+def stream_modules(
+    payload: dict,
+    modules: Optional[Iterable[str]] = None,
+    combined_llm: Optional[bool] = None,
+    priority: str = "interactive",
+    persist: bool = False,
+) -> Iterator[dict]:
+    """
+    `run_modules` on a worker thread, as events in the order they happen:
+
+        {"event": "section", "module", "path", "value"}   each streamed answer section
+        {"event": "result", "modules": {module: output}}  once every module is done
+        {"event": "error", "error"}                       the run itself failed
+    """
+    from src.app.llm.json_stream import section_listener
+    from src.app.llm.usage import usage_scope
+
+    events: "queue.Queue" = queue.Queue()
+
+    def _on_section(module: str, path, value) -> None:
+        events.put({"event": "section", "module": module, "path": list(path), "value": value})
+
+    def _run() -> None:
+        try:
+            with usage_scope(company=str(payload.get("company", "")).upper() or None, priority=priority), \
+                    section_listener(_on_section):
+                events.put({"event": "result", "modules": run_modules(payload, modules, combined_llm, persist)})
+        except Exception as exc:
+            events.put({"event": "error", "error": str(exc)})
+        finally:
+            events.put(None)
+
+    threading.Thread(target=contextvars.copy_context().run, args=(_run,), daemon=True).start()
+    while True:
+        event = events.get()
+        if event is None:
+            return
+        yield event
+
+
+def _run_safely(module: str, payload: dict, persist: bool = False) -> dict:
+    try:
+        return run_module(module, payload, persist)
+    except Exception as exc:
+        return {"error": str(exc)}
+
+
+@contextmanager
+def deterministic_llm():
+    """
+    Run the modules without any LLM call: the shared gateway is disabled so
+    every module takes its deterministic fallback path.
+    """
+    from src.app.llm.gateway import get_llm_gateway
+
+    with get_llm_gateway().use_client(None):
+        yield
+
+
+@contextmanager
+def llm_client_override(client):
+    """
+    Point every `*_llm` module at `client` (anything exposing
+    `chat.completions.create`), e.g. a stub or a response cache.
+    """
+    from src.app.llm.gateway import get_llm_gateway
+
+    with get_llm_gateway().use_client(client):
+        yield
@@ -46,4 +46,5 @@ class FinancialData(BaseModel):
 
 class AnalysisRequest(BaseModel):
     company: str
-    financial_data: FinancialData
\ No newline at end of file
+    financial_data: FinancialData
+    industry_code: Optional[str] = None  # selects industry thresholds; GENERAL when unset
\ No newline at end of file
@@ -0,0 +1,364 @@
+# results_store.py
+"""
+Persistent store of module outputs.
+
+Every module output computed by the API or `src.app.pipeline` is written to
+a local SQLite file, one row per (company, module, run) with:
+
+    fiscal_year      latest year in the request
+    industry_code    request industry (threshold set)
+    config_version   threshold version the output was computed with
+    model            LLM model that wrote the narrative ("none": deterministic)
+    score / color    module score and summary colour where the module has them
+    red/yellow/green rule flag counts
+    payload          the full output, zlib-compressed JSON
+
+Key metrics and rule flags also go to indexed side tables
+(`result_metrics(module, name, value)`, `result_flags(module, rule_id,
+flag)`), so outputs can be looked up by metric ranges or flags without
+decoding blobs; `results_latest` points at the newest row per company and
+module (see `src.app.screening`). Listeners registered with `add_listener`
+are told about each committed batch (see `src.app.flag_index`).
+
+Writes happen on a background thread: the request path only queues the
+output (dropped and counted when the queue is full). Reads serve the latest
+stored output per module, optionally subject to staleness rules: a maximum
+age and/or the current threshold version.
+
+Configuration (environment):
+    RESULTS_STORE_PATH        SQLite file; enables the store (default: disabled)
+    RESULTS_MAX_AGE_SECONDS   default staleness limit for reads (default 0: none)
+    RESULTS_COMPRESS_LEVEL    zlib level for payloads (default 6)
+    RESULTS_QUEUE_SIZE        pending writes before outputs are dropped (default 10000)
+"""
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Callable, Dict, List, Optional
+
+from src.app.llm.narrative_cache import numeric_metrics
+from src.app.llm.usage import current_scope
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    company TEXT NOT NULL,
+    module TEXT NOT NULL,
+    fiscal_year INTEGER,
+    industry_code TEXT,
+    config_version TEXT,
+    model TEXT,
+    created_at REAL NOT NULL,
+    score REAL,
+    color TEXT,
+    red INTEGER,
+    yellow INTEGER,
+    green INTEGER,
+    payload BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_lookup ON results (company, module, fiscal_year, created_at);
+CREATE INDEX IF NOT EXISTS results_module_score ON results (module, score);
+CREATE TABLE IF NOT EXISTS results_latest (
+    company TEXT NOT NULL,
+    module TEXT NOT NULL,
+    result_id INTEGER NOT NULL,
+    PRIMARY KEY (company, module)
+);
+CREATE INDEX IF NOT EXISTS results_latest_result ON results_latest (result_id);
+CREATE TABLE IF NOT EXISTS result_metrics (
+    result_id INTEGER NOT NULL,
+    module TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS result_metrics_range ON result_metrics (module, name, value);
+CREATE INDEX IF NOT EXISTS result_metrics_result ON result_metrics (result_id);
+CREATE TABLE IF NOT EXISTS result_flags (
+    result_id INTEGER NOT NULL,
+    module TEXT NOT NULL,
+    rule_id TEXT NOT NULL,
+    flag TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS result_flags_rule ON result_flags (module, rule_id, flag);
+CREATE INDEX IF NOT EXISTS result_flags_result ON result_flags (result_id);
+"""
+
+COLUMNS = (
+    "id", "company", "module", "fiscal_year", "industry_code", "config_version", "model",
+    "created_at", "score", "color", "red", "yellow", "green",
+)
+
+
+def _as_dict(output) -> dict:
+    return output.dict() if hasattr(output, "dict") else dict(output)
+
+
+def fiscal_year(request: dict) -> Optional[int]:
+    years = [fy.get("year") for fy in (request.get("financial_data") or {}).get("financial_years") or []]
+    years = [y for y in years if isinstance(y, int)]
+    return max(years) if years else None
+
+
+def llm_model(module: str) -> str:
+    """Model that answered `module` in the current usage scope; "none" when no LLM call was made."""
+    scope = current_scope()
+    models = [r.model for r in list(scope.records) if r.module in (module, "combined")] if scope else []
+    return models[-1] if models else "none"
+
+
+class ResultsStore:
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_age_seconds: float = 0.0,
+        compress_level: int = 6,
+        queue_size: int = 10000,
+    ):
+        self.path = path
+        self.max_age_seconds = max_age_seconds
+        self.compress_level = compress_level
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self._conn = None
+        self._thread = None
+        self._read_lock = threading.Lock()
+        self._listeners: List[Callable[[List[tuple]], None]] = []
+        self.queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        if path:
+            self._conn = self._connect()
+            self._conn.executescript(SCHEMA)
+            self._backfill_latest()
+            self._thread = threading.Thread(target=self._run, name="results-store", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    @classmethod
+    def from_env(cls) -> "ResultsStore":
+        return cls(
+            path=os.getenv("RESULTS_STORE_PATH") or None,
+            max_age_seconds=float(os.getenv("RESULTS_MAX_AGE_SECONDS", 0)),
+            compress_level=int(os.getenv("RESULTS_COMPRESS_LEVEL", 6)),
+            queue_size=int(os.getenv("RESULTS_QUEUE_SIZE", 10000)),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self._conn is not None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _backfill_latest(self) -> None:
+        """Stores written before `results_latest` existed."""
+        if self._conn.execute("SELECT 1 FROM results_latest LIMIT 1").fetchone() is None:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT INTO results_latest SELECT company, module, MAX(id) FROM results GROUP BY company, module"
+                )
+
+    # ---------------------------------------------------------
+    # WRITES
+    # ---------------------------------------------------------
+    def submit(self, module: str, request: dict, output) -> None:
+        """Queue one output; request-side values (model, threshold version) are read here."""
+        if not self.enabled:
+            return
+        from src.app.thresholds import thresholds_version
+
+        item = {
+            "module": module,
+            "company": str(request.get("company", "")).upper(),
+            "fiscal_year": fiscal_year(request),
+            "industry_code": (request.get("industry_code") or "GENERAL").upper(),
+            "config_version": thresholds_version(),
+            "model": llm_model(module),
+            "created_at": time.time(),
+            "output": output,
+        }
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self) -> None:
+        """Block until every queued output is written."""
+        if self.enabled:
+            self.queue.join()
+
+    def close(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        writer = self._connect()
+        while True:
+            item = self.queue.get()
+            items = [item]
+            # Drain what is already queued into the same transaction
+            while item is not None and len(items) < 500:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                items.append(item)
+            written = []
+            try:
+                with writer:
+                    written = [self._insert(writer, entry) for entry in items if entry is not None]
+                self.written += len(written)
+            except Exception as exc:
+                written = []
+                self.errors += len(items)
+                print(f"Results store write failed: {exc}", flush=True)
+            try:
+                for listener in list(self._listeners) if written else []:
+                    listener(written)
+            except Exception as exc:
+                print(f"Results store listener failed: {exc}", flush=True)
+            finally:
+                for _ in items:
+                    self.queue.task_done()
+            if items[-1] is None:
+                writer.close()
+                return
+
+    def add_listener(self, listener: Callable[[List[tuple]], None]) -> None:
+        """Call `listener([(company, module, rules), ...])` after each committed batch of outputs."""
+        self._listeners.append(listener)
+
+    def _insert(self, conn: sqlite3.Connection, item: dict) -> tuple:
+        output = _as_dict(item["output"])
+        rules = [_as_dict(r) for r in output.get("rules") or []]
+        flags = [str(r.get("flag")) for r in rules]
+        blob = zlib.compress(json.dumps(output, default=str).encode(), self.compress_level)
+        cursor = conn.execute(
+            "INSERT INTO results (company, module, fiscal_year, industry_code, config_version, model, "
+            "created_at, score, color, red, yellow, green, payload) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                item["company"], item["module"], item["fiscal_year"], item["industry_code"],
+                item["config_version"], item["model"], item["created_at"],
+                output.get("sub_score_adjusted"), output.get("summary_color"),
+                flags.count("RED"), flags.count("YELLOW"), flags.count("GREEN"),
+                blob,
+            ),
+        )
+        result_id = cursor.lastrowid
+        conn.execute(
+            "INSERT OR REPLACE INTO results_latest VALUES (?, ?, ?)", (item["company"], item["module"], result_id)
+        )
+        conn.executemany(
+            "INSERT INTO result_metrics VALUES (?, ?, ?, ?)",
+            [(result_id, item["module"], name, value) for name, value in numeric_metrics(output.get("key_metrics")).items()],
+        )
+        conn.executemany(
+            "INSERT INTO result_flags VALUES (?, ?, ?, ?)",
+            [(result_id, item["module"], str(r.get("rule_id")), str(r.get("flag"))) for r in rules if r.get("rule_id")],
+        )
+        return item["company"], item["module"], rules
+
+    # ---------------------------------------------------------
+    # READS
+    # ---------------------------------------------------------
+    def query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._read_lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def latest(
+        self,
+        company: str,
+        module: Optional[str] = None,
+        fiscal_year: Optional[int] = None,
+        max_age_seconds: Optional[float] = None,
+        config_version: Optional[str] = None,
+    ) -> Dict[str, dict]:
+        """Newest stored output per module for `company` that satisfies the staleness rules."""
+        if not self.enabled:
+            return {}
+        where, params = ["company = ?"], [company.upper()]
+        if module:
+            where.append("module = ?")
+            params.append(module)
+        if fiscal_year is not None:
+            where.append("fiscal_year = ?")
+            params.append(fiscal_year)
+        max_age = self.max_age_seconds if max_age_seconds is None else max_age_seconds
+        if max_age and max_age > 0:
+            where.append("created_at >= ?")
+            params.append(time.time() - max_age)
+        if config_version:
+            where.append("config_version = ?")
+            params.append(config_version)
+        # Newest row per module (SQLite returns the bare columns of the MAX row)
+        rows = self.query(
+            f"SELECT {', '.join(COLUMNS)}, payload, MAX(created_at) FROM results "
+            f"WHERE {' AND '.join(where)} GROUP BY module",
+            tuple(params),
+        )
+        return {row[2]: self._entry(row[:len(COLUMNS)], row[len(COLUMNS)]) for row in rows}
+
+    def history(self, company: str, module: str, limit: int = 20) -> List[dict]:
+        """Stored runs of one module for `company`, newest first (metadata only)."""
+        if not self.enabled:
+            return []
+        rows = self.query(
+            f"SELECT {', '.join(COLUMNS)} FROM results WHERE company = ? AND module = ? "
+            "ORDER BY created_at DESC LIMIT ?",
+            (company.upper(), module, limit),
+        )
+        return [self._entry(row) for row in rows]
+
+    def load(self, result_id: int) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        rows = self.query(f"SELECT {', '.join(COLUMNS)}, payload FROM results WHERE id = ?", (result_id,))
+        return self._entry(rows[0][:-1], rows[0][-1]) if rows else None
+
+    @staticmethod
+    def _entry(row: tuple, payload: Optional[bytes] = None) -> dict:
+        from src.app.thresholds import thresholds_version
+
+        entry = dict(zip(COLUMNS, row))
+        entry["age_seconds"] = round(time.time() - entry["created_at"], 3)
+        entry["current_config"] = entry["config_version"] == thresholds_version()
+        if payload is not None:
+            entry["output"] = json.loads(zlib.decompress(payload))
+        return entry
+
+    def metrics(self) -> dict:
+        stored = self.query("SELECT COUNT(*) FROM results", ())[0][0] if self.enabled else 0
+        return {
+            "enabled": self.enabled,
+            "stored": stored,
+            "written": self.written,
+            "pending": self.queue.qsize(),
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+
+
+_store: Optional[ResultsStore] = None
+_store_lock = threading.Lock()
+
+
+def get_results_store() -> ResultsStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ResultsStore.from_env()
+    return _store
+
+
+def persist_result(module: str, request: dict, output) -> None:
+    """Queue a module output for the results store (no-op when it is disabled)."""
+    get_results_store().submit(module, request, output)
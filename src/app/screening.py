@@ -0,0 +1,247 @@
+# screening.py
+"""
+Universe-wide metric screens over the results store.
+
+A screen is a conjunction of conditions on the latest stored output of each
+company, e.g.
+
+    borrowings.interest_coverage < 1.5
+    borrowings.debt_cagr > borrowings.ebitda_cagr
+    working_capital.ccc > 120
+    0.1 <= liquidity.cash_ratio < 0.2
+
+Fields are `module.metric` for any key metric, or `module.score`,
+`module.red`, `module.yellow`, `module.green` for the stored score and flag
+counts; a bare metric name works when only one module reports it.
+Conditions against constants become range scans on the B-tree index of
+`result_metrics (module, name, value)`, restricted to each company's newest
+row via `results_latest`. The company sets are intersected starting from the
+smallest, so the remaining conditions (field against field) and the sort
+only touch the candidates. Results can be sorted on any field ("-" prefix
+for descending) and cut to the top K.
+
+Companies that lack a metric never match a condition on it.
+"""
+import heapq
+import operator
+import re
+import time
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from src.app.results_store import ResultsStore
+
+OPERATORS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "=": operator.eq,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+# Operator as seen with the operands swapped ("1 < x" is "x > 1")
+MIRRORED = {"<": ">", "<=": ">=", ">": "<", ">=": "<=", "=": "=", "==": "==", "!=": "!="}
+
+RESULT_COLUMNS = ("score", "red", "yellow", "green")
+
+OPERATOR_RE = re.compile(r"\s*(<=|>=|==|!=|<|>|=)\s*")
+
+Field = Tuple[str, str]
+
+
+def _number(token: str) -> Optional[float]:
+    try:
+        return float(token)
+    except ValueError:
+        return None
+
+
+class Screener:
+    def __init__(self, store: ResultsStore):
+        self.store = store
+        self._fields: Optional[Set[Field]] = None
+        self._fields_written = -1
+
+    # ---------------------------------------------------------
+    # FIELDS
+    # ---------------------------------------------------------
+    def fields(self) -> Set[Field]:
+        """Every (module, metric) present in the store, refreshed after new writes."""
+        if self._fields is None or self._fields_written != self.store.written:
+            self._fields_written = self.store.written
+            fields = set(self.store.query("SELECT DISTINCT module, name FROM result_metrics"))
+            modules = {row[0] for row in self.store.query("SELECT DISTINCT module FROM results_latest")}
+            fields |= {(module, column) for module in modules for column in RESULT_COLUMNS}
+            self._fields = fields
+        return self._fields
+
+    def resolve(self, name: str) -> Field:
+        name = name.strip()
+        if "." in name:
+            module, metric = name.split(".", 1)
+            if (module, metric) not in self.fields():
+                raise ValueError(f"Unknown field '{name}'")
+            return module, metric
+        matches = sorted(field for field in self.fields() if field[1] == name)
+        if len(matches) == 1:
+            return matches[0]
+        if not matches:
+            raise ValueError(f"Unknown field '{name}'")
+        raise ValueError(f"Ambiguous field '{name}': use one of {['.'.join(m) for m in matches]}")
+
+    # ---------------------------------------------------------
+    # PARSING
+    # ---------------------------------------------------------
+    def parse(self, condition: str) -> List[tuple]:
+        """
+        ("range", field, op, value) or ("compare", field, op, field) terms;
+        a chained condition ("a <= x < b") yields one term per comparison.
+        """
+        parts = OPERATOR_RE.split(condition.strip())
+        if len(parts) not in (3, 5) or not all(parts[::2]):
+            raise ValueError(f"Cannot parse condition '{condition}'")
+        terms = []
+        for i in range(1, len(parts), 2):
+            left, op, right = parts[i - 1], parts[i], parts[i + 1]
+            left_value, right_value = _number(left), _number(right)
+            if left_value is not None and right_value is not None:
+                raise ValueError(f"Condition '{condition}' compares two constants")
+            if right_value is not None:
+                terms.append(("range", self.resolve(left), op, right_value))
+            elif left_value is not None:
+                terms.append(("range", self.resolve(right), MIRRORED[op], left_value))
+            else:
+                terms.append(("compare", self.resolve(left), op, self.resolve(right)))
+        return terms
+
+    # ---------------------------------------------------------
+    # QUERIES
+    # ---------------------------------------------------------
+    def _staleness(self, max_age_seconds: Optional[float], config_version: Optional[str]) -> Tuple[str, list]:
+        sql, params = "", []
+        if max_age_seconds:
+            sql += " AND r.created_at >= ?"
+            params.append(time.time() - max_age_seconds)
+        if config_version:
+            sql += " AND r.config_version = ?"
+            params.append(config_version)
+        return sql, params
+
+    def values(
+        self,
+        field: Field,
+        bounds: Sequence[Tuple[str, float]] = (),
+        staleness: Tuple[str, list] = ("", []),
+    ) -> Dict[str, float]:
+        """company -> value of `field` on its newest row, within `bounds`."""
+        module, name = field
+        params: list = [module]
+        if name in RESULT_COLUMNS:
+            value_sql = f"r.{name}"
+            sql = (
+                f"SELECT l.company, r.{name} FROM results_latest l JOIN results r ON r.id = l.result_id "
+                f"WHERE l.module = ? AND r.{name} IS NOT NULL"
+            )
+        else:
+            value_sql = "m.value"
+            sql = (
+                "SELECT l.company, m.value FROM result_metrics m "
+                "JOIN results_latest l ON l.result_id = m.result_id "
+            )
+            if staleness[0]:
+                sql += "JOIN results r ON r.id = m.result_id "
+            sql += "WHERE m.module = ? AND m.name = ?"
+            params.append(name)
+        for op, value in bounds:
+            sql += f" AND {value_sql} {'=' if op == '==' else op} ?"
+            params.append(value)
+        sql += staleness[0]
+        params += staleness[1]
+        return dict(self.store.query(sql, tuple(params)))
+
+    def screen(
+        self,
+        where: Sequence[str],
+        sort: Optional[str] = None,
+        limit: int = 50,
+        fields: Sequence[str] = (),
+        max_age_seconds: Optional[float] = None,
+        config_version: Optional[str] = None,
+    ) -> dict:
+        started = time.perf_counter()
+        if not where:
+            raise ValueError("A screen needs at least one condition")
+        terms = [term for condition in where for term in self.parse(condition)]
+        staleness = self._staleness(max_age_seconds, config_version)
+
+        # Range terms on the same field share one index scan
+        ranges: Dict[Field, List[Tuple[str, float]]] = {}
+        for kind, field, op, value in terms:
+            if kind == "range":
+                ranges.setdefault(field, []).append((op, value))
+        columns: Dict[Field, Dict[str, float]] = {
+            field: self.values(field, bounds, staleness) for field, bounds in ranges.items()
+        }
+
+        candidates: Optional[Set[str]] = None
+        for matched in sorted(columns.values(), key=len):
+            candidates = set(matched) if candidates is None else candidates & matched.keys()
+            if not candidates:
+                break
+
+        def _column(field: Field) -> Dict[str, float]:
+            if field not in columns:
+                columns[field] = self.values(field, (), staleness)
+            return columns[field]
+
+        for kind, left, op, right in terms:
+            if kind != "compare" or candidates == set():
+                continue
+            lhs, rhs = _column(left), _column(right)
+            pool = candidates if candidates is not None else lhs.keys()
+            candidates = {c for c in pool if c in lhs and c in rhs and OPERATORS[op](lhs[c], rhs[c])}
+
+        companies = candidates or set()
+        sort_field, descending = None, False
+        if sort:
+            descending = sort.startswith("-")
+            sort_field = self.resolve(sort.lstrip("-+"))
+            sort_values = _column(sort_field)
+            ranked = [c for c in companies if c in sort_values]
+            pick = heapq.nlargest if descending else heapq.nsmallest
+            top = pick(limit, ranked, key=lambda c: (sort_values[c], c)) if limit else []
+        else:
+            top = sorted(companies)[:limit]
+
+        shown = list(dict.fromkeys(
+            [field for _, field, _, _ in terms]
+            + [right for kind, _, _, right in terms if kind == "compare"]
+            + ([sort_field] if sort_field else [])
+            + [self.resolve(f) for f in fields]
+        ))
+        rows = []
+        for company in top:
+            row = {"company": company}
+            for field in shown:
+                row[".".join(field)] = _column(field).get(company)
+            rows.append(row)
+        return {
+            "where": list(where),
+            "sort": sort,
+            "matches": len(companies),
+            "returned": len(rows),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+            "results": rows,
+        }
+
+
+_screener: Optional[Screener] = None
+
+
+def get_screener() -> Screener:
+    global _screener
+    if _screener is None:
+        from src.app.results_store import get_results_store
+
+        _screener = Screener(get_results_store())
+    return _screener
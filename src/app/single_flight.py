@@ -0,0 +1,155 @@
+# single_flight.py
+"""
+Single-flight coalescing of identical in-flight work.
+
+When the same company analysis is requested several times at once (one
+market event, many dashboards), only the first caller computes; concurrent
+callers with the same key wait for and share its result or exception.
+Nothing is cached: once the computation finishes the key is released and
+the next request computes afresh.
+
+    SingleFlight       thread-based, used by the LLM gateway
+    AsyncSingleFlight  asyncio-based, used by the API endpoints; the shared
+                       computation runs in the threadpool, so it also keeps
+                       the module code off the event loop
+
+Set REQUEST_COALESCING=0 to disable coalescing at both layers.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import weakref
+from typing import Any, Callable, Dict
+
+from starlette.concurrency import run_in_threadpool
+
+
+def coalescing_enabled() -> bool:
+    return os.getenv("REQUEST_COALESCING", "1").lower() not in ("0", "false", "no", "off")
+
+
+def make_key(*parts: Any) -> str:
+    """Stable hash of JSON-able parts (dict keys sorted)."""
+    encoded = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"leaders": self.leaders, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+
+class AsyncSingleFlight:
+    """
+    Coalesces per event loop (Mangum gives each Lambda worker thread its own
+    loop, and asyncio tasks cannot be awaited across loops).
+    """
+
+    def __init__(self):
+        self._tasks: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        loop = asyncio.get_running_loop()
+        tasks: Dict[str, asyncio.Future] = self._tasks.setdefault(loop, {})
+        task = tasks.get(key)
+        if task is None:
+            # The task runs in the leader's context, so usage is attributed to it
+            task = asyncio.ensure_future(run_in_threadpool(fn))
+            tasks[key] = task
+            task.add_done_callback(lambda _: tasks.pop(key, None))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+            _mark_coalesced()
+        # A cancelled caller must not cancel the computation the others wait on
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        in_flight = sum(len(tasks) for tasks in list(self._tasks.values()))
+        return {"leaders": self.leaders, "coalesced": self.coalesced, "in_flight": in_flight}
+
+
+def _mark_coalesced() -> None:
+    from src.app.llm.usage import current_scope
+
+    scope = current_scope()
+    if scope is not None:
+        scope.coalesced = True
+
+
+_analysis_flight = AsyncSingleFlight()
+
+
+async def coalesced(module: str, payload: dict, fn: Callable[[], Any]) -> Any:
+    """
+    Run `fn` (the module computation for `payload`) in the threadpool, shared
+    with any identical request already in flight: same module, normalized
+    payload, tenant and LLM configuration.
+    """
+    if not coalescing_enabled():
+        return await run_in_threadpool(fn)
+
+    from src.app.llm.gateway import get_llm_gateway
+    from src.app.llm.prompt_compactor import get_config
+    from src.app.llm.usage import current_scope
+
+    scope = current_scope()
+    key = make_key(
+        module,
+        payload,
+        scope.tenant if scope else None,
+        get_llm_gateway().model_for(module),
+        get_config(),
+    )
+    return await _analysis_flight.do(key, fn)
+
+
+def analysis_flight_stats() -> dict:
+    return _analysis_flight.stats()
@@ -0,0 +1,284 @@
+# thresholds.py
+"""
+Industry-aware threshold store.
+
+Every rule threshold the modules use comes from here, keyed by
+`industry_code`:
+
+    borrowings      BorrowingsRuleThresholds (debt rule engine)
+    benchmarks      IndustryBenchmarks (borrowings targets)
+    covenants       CovenantLimits
+    asset_quality   IndustryAssetBenchmarks
+    liquidity       LiquidityRuleThresholds
+
+The file is parsed once into immutable objects, one resolved
+`IndustryThresholds` per industry (the GENERAL entry, overlaid with the
+industry's own values), so a lookup is a dict access and per-industry
+thresholds cost nothing per request. Unknown industry codes get GENERAL.
+
+A YAML or JSON file maps industry codes to sections; only values that
+differ from the built-in defaults need to be listed:
+
+    GENERAL:
+      covenants: {de_ratio_limit: 1.0}
+    UTILITIES:
+      benchmarks: {max_safe_de_ratio: 2.5, max_safe_debt_ebitda: 6.0}
+      liquidity: {critical_current_ratio: 0.6}
+
+A SQLite file holds the same data as rows of
+`thresholds(industry_code, section, name, value)`.
+
+`reload_thresholds()` parses the file into a new snapshot and swaps it in
+atomically; a file that does not parse raises and the running snapshot stays
+in place. With THRESHOLDS_RELOAD_SECONDS set the store also checks the
+file's modification time at most that often and reloads by itself. Each
+snapshot carries a `version` hash of its resolved values, for caches whose
+entries depend on thresholds.
+
+Configuration (environment):
+    THRESHOLDS_PATH             .yaml/.yml, .json or .db/.sqlite file (default: built-in thresholds)
+    THRESHOLDS_RELOAD_SECONDS   poll the file for changes this often (default 0: reload on demand only)
+"""
+import dataclasses
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from src.app.asset_quality_module.asset_models import IndustryAssetBenchmarks
+from src.app.borrowing_module.borrowings_config import BorrowingsRuleConfig, BorrowingsRuleThresholds
+from src.app.borrowing_module.debt_models import CovenantLimits, IndustryBenchmarks
+from src.app.liquidity_module.liquidity_config import LiquidityRuleConfig, LiquidityRuleThresholds
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+DEFAULT_INDUSTRY = "GENERAL"
+
+# Built-in GENERAL values; the file only overrides them
+DEFAULTS: Dict[str, dict] = {
+    "borrowings": dataclasses.asdict(BorrowingsRuleThresholds()),
+    "benchmarks": {
+        "target_de_ratio": 0.5,
+        "max_safe_de_ratio": 1,
+        "max_safe_debt_ebitda": 4.0,
+        "min_safe_icr": 2.0,
+        "high_floating_share": 0.60,
+        "high_wacd": 0.12,
+    },
+    "covenants": {
+        "de_ratio_limit": 1.0,
+        "icr_limit": 2.0,
+        "debt_ebitda_limit": 4.0,
+    },
+    "asset_quality": IndustryAssetBenchmarks().dict(),
+    "liquidity": dataclasses.asdict(LiquidityRuleThresholds()),
+}
+
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+YAML_SUFFIXES = (".yaml", ".yml")
+
+
+@dataclass(frozen=True)
+class IndustryThresholds:
+    industry_code: str
+    borrowings: BorrowingsRuleConfig
+    benchmarks: IndustryBenchmarks
+    covenants: CovenantLimits
+    asset_quality: IndustryAssetBenchmarks
+    liquidity: LiquidityRuleConfig
+
+
+@dataclass(frozen=True)
+class ThresholdSnapshot:
+    version: str
+    source: Optional[str]
+    mtime: Optional[float]
+    industries: Dict[str, IndustryThresholds]
+
+    def get(self, industry_code: Optional[str] = None) -> IndustryThresholds:
+        industry = (industry_code or DEFAULT_INDUSTRY).upper()
+        return self.industries.get(industry) or self.industries[DEFAULT_INDUSTRY]
+
+
+# ---------------------------------------------------------
+# PARSING
+# ---------------------------------------------------------
+def read_overrides(path: str) -> Dict[str, Dict[str, dict]]:
+    """{industry: {section: {name: value}}} as stored in the file."""
+    if path.endswith(SQLITE_SUFFIXES):
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            rows = conn.execute("SELECT industry_code, section, name, value FROM thresholds").fetchall()
+        finally:
+            conn.close()
+        data: Dict[str, Dict[str, dict]] = {}
+        for industry, section, name, value in rows:
+            data.setdefault(industry, {}).setdefault(section, {})[name] = value
+        return data
+    with open(path, encoding="utf-8") as fh:
+        if path.endswith(YAML_SUFFIXES):
+            if yaml is None:
+                raise RuntimeError(f"PyYAML is required to read {path}")
+            data = yaml.safe_load(fh) or {}
+        else:
+            data = json.load(fh)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: expected a mapping of industry codes")
+    return data
+
+
+def _section(industry: str, section: str, values: dict) -> dict:
+    unknown = set(values) - set(DEFAULTS[section])
+    if unknown:
+        raise ValueError(f"{industry}.{section}: unknown thresholds {sorted(unknown)}")
+    return values
+
+
+def resolve(overrides: Dict[str, Dict[str, dict]]) -> Dict[str, dict]:
+    """Plain values per industry: defaults < GENERAL < industry."""
+    overrides = {str(k).upper(): v or {} for k, v in overrides.items()}
+    for industry, sections in overrides.items():
+        unknown = set(sections) - set(DEFAULTS)
+        if unknown:
+            raise ValueError(f"{industry}: unknown sections {sorted(unknown)}")
+    general = overrides.get(DEFAULT_INDUSTRY, {})
+    resolved = {}
+    for industry in set(overrides) | {DEFAULT_INDUSTRY}:
+        own = overrides.get(industry, {})
+        resolved[industry] = {
+            section: {
+                **defaults,
+                **_section(DEFAULT_INDUSTRY, section, general.get(section) or {}),
+                **_section(industry, section, own.get(section) or {}),
+            }
+            for section, defaults in DEFAULTS.items()
+        }
+    return resolved
+
+
+def _build(industry: str, values: Dict[str, dict]) -> IndustryThresholds:
+    return IndustryThresholds(
+        industry_code=industry,
+        borrowings=BorrowingsRuleConfig(generic=BorrowingsRuleThresholds(**values["borrowings"])),
+        benchmarks=IndustryBenchmarks(**values["benchmarks"]),
+        covenants=CovenantLimits(**values["covenants"]),
+        asset_quality=IndustryAssetBenchmarks(**values["asset_quality"]),
+        liquidity=LiquidityRuleConfig(generic=LiquidityRuleThresholds(**values["liquidity"])),
+    )
+
+
+def load_snapshot(path: Optional[str] = None) -> ThresholdSnapshot:
+    # mtime first: a write racing the read is picked up by the next poll
+    mtime = os.path.getmtime(path) if path else None
+    overrides = read_overrides(path) if path else {}
+    resolved = resolve(overrides)
+    version = hashlib.sha256(json.dumps(resolved, sort_keys=True).encode()).hexdigest()[:16]
+    return ThresholdSnapshot(
+        version=version,
+        source=path,
+        mtime=mtime,
+        industries={industry: _build(industry, values) for industry, values in resolved.items()},
+    )
+
+
+# ---------------------------------------------------------
+# STORE
+# ---------------------------------------------------------
+class ThresholdStore:
+    def __init__(self, path: Optional[str] = None, reload_seconds: float = 0.0):
+        self.path = path
+        self.reload_seconds = reload_seconds
+        self._lock = threading.Lock()
+        self._snapshot = load_snapshot(path)
+        self._checked = time.monotonic()
+        self._seen_mtime = self._snapshot.mtime
+        self.reloads = 0
+        self.reload_errors = 0
+
+    @classmethod
+    def from_env(cls) -> "ThresholdStore":
+        return cls(
+            path=os.getenv("THRESHOLDS_PATH") or None,
+            reload_seconds=float(os.getenv("THRESHOLDS_RELOAD_SECONDS", 0)),
+        )
+
+    @property
+    def snapshot(self) -> ThresholdSnapshot:
+        if self.reload_seconds > 0 and self.path:
+            self._poll()
+        return self._snapshot
+
+    @property
+    def version(self) -> str:
+        return self.snapshot.version
+
+    def get(self, industry_code: Optional[str] = None) -> IndustryThresholds:
+        return self.snapshot.get(industry_code)
+
+    def reload(self, path: Optional[str] = None) -> ThresholdSnapshot:
+        """Parse the file (or `path`) and swap the new snapshot in; the old one stays on error."""
+        with self._lock:
+            snapshot = load_snapshot(path or self.path)
+            if path:
+                self.path = path
+            self._snapshot = snapshot
+            self.reloads += 1
+            return snapshot
+
+    def _poll(self) -> None:
+        now = time.monotonic()
+        if now - self._checked < self.reload_seconds:
+            return
+        self._checked = now
+        try:
+            mtime = os.path.getmtime(self.path)
+            if mtime == self._seen_mtime:
+                return
+            # A file that fails to parse is retried only once it changes again
+            self._seen_mtime = mtime
+            self.reload()
+        except Exception as exc:
+            self.reload_errors += 1
+            print(f"Threshold reload failed, keeping version {self._snapshot.version}: {exc}", flush=True)
+
+    def info(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "version": snapshot.version,
+            "source": snapshot.source,
+            "industries": sorted(snapshot.industries),
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+        }
+
+
+_store: Optional[ThresholdStore] = None
+_store_lock = threading.Lock()
+
+
+def get_threshold_store() -> ThresholdStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ThresholdStore.from_env()
+    return _store
+
+
+def get_thresholds(industry_code: Optional[str] = None) -> IndustryThresholds:
+    return get_threshold_store().get(industry_code)
+
+
+def thresholds_version() -> str:
+    return get_threshold_store().version
+
+
+def reload_thresholds(path: Optional[str] = None) -> ThresholdSnapshot:
+    return get_threshold_store().reload(path)
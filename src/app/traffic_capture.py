@@ -0,0 +1,326 @@
+# traffic_capture.py
+"""
+Opt-in sampled capture of analyze traffic to a rotating local corpus.
+
+A pure ASGI middleware samples a fraction of matching requests, buffers the
+request and response bodies and hands the raw bytes to a background writer
+thread. Parsing, redaction, compression and file rotation all happen on the
+writer thread, so the request path only pays for a random draw and two
+list appends. When the writer queue is full, captures are dropped rather
+than slowing requests down.
+
+Files are gzip-compressed JSONL, written as `*.jsonl.gz.part` and renamed to
+`*.jsonl.gz` once rotated (by size, or by age so low-traffic instances
+publish their captures too), so a corpus directory can be replayed directly
+with `src.app.benchmarking.replay` while capture is running. Each batch of
+records the writer drains is appended as its own gzip member and flushed,
+so a `.part` file left by a crash or a frozen Lambda is readable up to its
+last batch; such orphans are renamed into the corpus when a writer starts.
+
+Configuration (environment):
+    TRAFFIC_CAPTURE_DIR           enable capture into this directory
+    TRAFFIC_CAPTURE_SAMPLE_RATE   fraction of requests captured (default 0.01)
+    TRAFFIC_CAPTURE_MAX_BYTES     approx. compressed bytes per file before rotation (default 50 MB)
+    TRAFFIC_CAPTURE_ROTATE_SECONDS  rotate a file once it is this old (default 300)
+    TRAFFIC_CAPTURE_MAX_FILES     rotated files kept, oldest deleted first (default 20)
+    TRAFFIC_CAPTURE_REDACT        comma-separated field paths, e.g. "company,financial_data.financial_years.*.investments"
+    TRAFFIC_CAPTURE_PATHS         comma-separated path suffixes to capture (default "/analyze")
+"""
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from typing import Iterable, List, Optional
+
+REDACTED_PREFIX = "REDACTED-"
+
+
+def redact(obj, paths: Iterable[str]):
+    """
+    Redact dotted field paths in place (`*` matches every list item or key).
+    Strings become a stable hashed token so distinct values stay distinct;
+    other values become null, which makes the record unreplayable for
+    required numeric fields.
+    """
+    for path in paths:
+        _redact_path(obj, path.split("."))
+    return obj
+
+
+def _redact_path(node, parts: List[str]):
+    if not parts or node is None:
+        return
+    head, rest = parts[0], parts[1:]
+    if isinstance(node, list):
+        targets = range(len(node)) if head == "*" else ([int(head)] if head.isdigit() and int(head) < len(node) else [])
+    elif isinstance(node, dict):
+        targets = list(node.keys()) if head == "*" else ([head] if head in node else [])
+    else:
+        return
+    for key in targets:
+        if rest:
+            _redact_path(node[key], rest)
+        else:
+            value = node[key]
+            if isinstance(value, str):
+                node[key] = REDACTED_PREFIX + hashlib.sha256(value.encode()).hexdigest()[:12]
+            else:
+                node[key] = None
+
+
+class RotatingCaptureWriter:
+    """Background thread writing capture records to size- and age-rotated gzip JSONL files."""
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 50 * 1024 * 1024,
+        max_files: int = 20,
+        redact_paths: Optional[List[str]] = None,
+        queue_size: int = 1000,
+        rotate_seconds: float = 300.0,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.redact_paths = redact_paths or []
+        self.rotate_seconds = rotate_seconds
+        self.queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.written = 0
+        self._raw = None
+        self._path = None
+        self._opened_at = 0.0
+        self._seq = 0
+        os.makedirs(directory, exist_ok=True)
+        self._recover_orphans()
+        self._thread = threading.Thread(target=self._run, name="traffic-capture", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, item: dict) -> None:
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join(timeout=5)
+        self._rotate()
+
+    # -- writer thread -------------------------------------------------
+    def _run(self):
+        while True:
+            try:
+                # Wake up now and then so an idle file is still rotated on age
+                item = self.queue.get(timeout=min(self.rotate_seconds, 5.0) if self.rotate_seconds else None)
+            except queue.Empty:
+                self._rotate_if_old()
+                continue
+            items = [item]
+            # Drain what is already queued into the same gzip member
+            while item is not None and len(items) < 500:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                items.append(item)
+            records = []
+            for entry in items:
+                if entry is None:
+                    continue
+                try:
+                    records.append(self._build_record(entry))
+                except Exception as exc:
+                    print(f"Traffic capture record failed: {exc}", flush=True)
+            try:
+                if records:
+                    self._write(records)
+                self._rotate_if_old()
+            except Exception as exc:
+                print(f"Traffic capture write failed: {exc}", flush=True)
+            if items[-1] is None:
+                return
+
+    def _build_record(self, item: dict) -> dict:
+        request = _loads(item["request_body"])
+        response = _loads(item["response_body"])
+        if self.redact_paths:
+            redact(request, self.redact_paths)
+            if isinstance(response, dict):
+                redact(response, self.redact_paths)
+        return {
+            "id": item["id"],
+            "ts": item["ts"],
+            "path": item["path"],
+            "status": item["status"],
+            "elapsed_ms": item["elapsed_ms"],
+            "request": request,
+            "response": response,
+        }
+
+    def _write(self, records: List[dict]):
+        if self._raw is None:
+            self._open()
+        data = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+        # One complete gzip member per batch: readers see every flushed batch
+        self._raw.write(gzip.compress(data.encode("utf-8")))
+        self._raw.flush()
+        self.written += len(records)
+        if self._raw.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _rotate_if_old(self):
+        if self._raw is not None and self.rotate_seconds and time.monotonic() - self._opened_at >= self.rotate_seconds:
+            self._rotate()
+
+    def _open(self):
+        self._seq += 1
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime())
+        name = f"capture-{stamp}-{os.getpid()}-{self._seq:04d}.jsonl.gz"
+        self._path = os.path.join(self.directory, name)
+        self._raw = open(self._path + ".part", "wb")
+        self._opened_at = time.monotonic()
+
+    def _rotate(self):
+        if self._raw is None:
+            return
+        self._raw.close()
+        os.replace(self._path + ".part", self._path)
+        self._raw = None
+        self._prune()
+
+    def _recover_orphans(self):
+        """Publish `.part` files whose writer process is gone (crash, SIGKILL, frozen Lambda)."""
+        for name in os.listdir(self.directory):
+            if not (name.startswith("capture-") and name.endswith(".jsonl.gz.part")):
+                continue
+            try:
+                pid = int(name.split("-")[3])
+            except (IndexError, ValueError):
+                continue
+            # A file with our own pid is from an earlier incarnation of this process id
+            if pid != os.getpid() and _process_alive(pid):
+                continue
+            path = os.path.join(self.directory, name)
+            if os.path.getsize(path):
+                os.replace(path, path[: -len(".part")])
+            else:
+                os.remove(path)
+
+    def _prune(self):
+        files = sorted(
+            (os.path.join(self.directory, f) for f in os.listdir(self.directory) if f.endswith(".jsonl.gz")),
+            key=os.path.getmtime,
+        )
+        for stale in files[: max(0, len(files) - self.max_files)]:
+            os.remove(stale)
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _loads(raw: bytes):
+    if not raw:
+        return None
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return {"_raw": raw[:2000].decode("utf-8", "replace")}
+
+
+class TrafficCaptureMiddleware:
+    """Pure ASGI middleware; unsampled requests pass straight through."""
+
+    def __init__(
+        self,
+        app,
+        writer: RotatingCaptureWriter,
+        sample_rate: float = 0.01,
+        path_suffixes: Iterable[str] = ("/analyze",),
+    ):
+        self.app = app
+        self.writer = writer
+        self.sample_rate = sample_rate
+        self.path_suffixes = tuple(path_suffixes)
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope.get("method") != "POST"
+            or not scope.get("path", "").endswith(self.path_suffixes)
+            or random.random() >= self.sample_rate
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        request_chunks: List[bytes] = []
+        response_chunks: List[bytes] = []
+        status = {"code": None}
+        started = time.perf_counter()
+
+        async def _receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                request_chunks.append(message.get("body", b""))
+            return message
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response_chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, _receive, _send)
+        finally:
+            self.writer.submit(
+                {
+                    "id": uuid.uuid4().hex,
+                    "ts": time.time(),
+                    "path": scope["path"],
+                    "status": status["code"],
+                    "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+                    "request_body": b"".join(request_chunks),
+                    "response_body": b"".join(response_chunks),
+                }
+            )
+
+
+def install_from_env(app) -> Optional[RotatingCaptureWriter]:
+    """Add the capture middleware to `app` when TRAFFIC_CAPTURE_DIR is set."""
+    directory = os.getenv("TRAFFIC_CAPTURE_DIR")
+    if not directory:
+        return None
+
+    redact_spec = os.getenv("TRAFFIC_CAPTURE_REDACT", "")
+    writer = RotatingCaptureWriter(
+        directory=directory,
+        max_bytes=int(os.getenv("TRAFFIC_CAPTURE_MAX_BYTES", 50 * 1024 * 1024)),
+        max_files=int(os.getenv("TRAFFIC_CAPTURE_MAX_FILES", 20)),
+        rotate_seconds=float(os.getenv("TRAFFIC_CAPTURE_ROTATE_SECONDS", 300)),
+        redact_paths=[p.strip() for p in redact_spec.split(",") if p.strip()],
+    )
+    app.add_middleware(
+        TrafficCaptureMiddleware,
+        writer=writer,
+        sample_rate=float(os.getenv("TRAFFIC_CAPTURE_SAMPLE_RATE", 0.01)),
+        path_suffixes=[p.strip() for p in os.getenv("TRAFFIC_CAPTURE_PATHS", "/analyze").split(",") if p.strip()],
+    )
+    return writer
@@ -1,10 +1,11 @@
 # fundamental_analysis/src/main.py
+import json
 import os
 import sys
 from typing import List, Optional
 
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field, ValidationError
 from fastapi import Request
 from src.app.request_model import AnalysisRequest
@@ -18,29 +19,17 @@ if ROOT not in sys.path:
 from src.app.borrowing_module.debt_models import (
     BorrowingsInput,
     YearFinancialInput,
-    IndustryBenchmarks,
-    CovenantLimits,
 )
 from src.app.borrowing_module.debt_orchestrator import BorrowingsModule
 
 from src.app.asset_quality_module.asset_models import (
     AssetQualityInput,
     AssetFinancialYearInput,
-    IndustryAssetBenchmarks,
 )
 from src.app.asset_quality_module.asset_orchestrator import AssetIntangibleQualityModule
 from src.app.borrowing_module.debt_orchestrator import BorrowingsModule
 from src.app.capex_cwip_module.orchestrator import CapexCwipModule
 
-
-DEFAULT_BENCHMARKS = IndustryBenchmarks(
-    target_de_ratio=0.5,
-    max_safe_de_ratio=1,
-    max_safe_debt_ebitda=4.0,
-    min_safe_icr=2.0,
-    high_floating_share=0.60,
-    high_wacd=0.12,
-)
 # =============================================================
 # IMPORT LIQUIDITY MODULE
 # =============================================================
@@ -51,6 +40,16 @@ from src.app.liquidity_module.liquidity_orchestrator import (
     LiquidityModule,
     build_financial_list,  # Add this import
 )
+from src.app.traffic_capture import install_from_env as install_traffic_capture
+from src.app.llm.usage import UsageTimingMiddleware
+from src.app.single_flight import coalesced, analysis_flight_stats
+from src.app.llm.gateway import get_llm_gateway
+from src.app.llm.limiter import LLMOverloaded
+from src.app.thresholds import get_thresholds, get_threshold_store, thresholds_version
+from src.app.results_store import get_results_store, persist_result
+from src.app.screening import get_screener
+from src.app.flag_index import get_flag_index
+from src.app import pipeline
 
 # ---------------------------------------------------------
 # FASTAPI APP
@@ -61,19 +60,146 @@ app = FastAPI(
     description="API for Borrowings + Liquidity Analysis"
 )
 
-DEFAULT_COVENANTS = CovenantLimits(
-    de_ratio_limit=1.0,
-    icr_limit=2.0,
-    debt_ebitda_limit=4.0,
-)
-
-DEFAULT_ASSET_BENCHMARKS = IndustryAssetBenchmarks()
+# Per-request LLM token/cost accounting, returned in the "timing" block
+app.add_middleware(UsageTimingMiddleware)
 
+# Opt-in sampled traffic capture (TRAFFIC_CAPTURE_DIR); no-op when unset
+capture_writer = install_traffic_capture(app)
 
 borrowings_engine = BorrowingsModule()
 asset_quality_engine = AssetIntangibleQualityModule()
 
 
+def overloaded_response(exc: LLMOverloaded) -> JSONResponse:
+    # LLM capacity shed (LLM_SHED_MODE=reject or queue timeout)
+    return JSONResponse(
+        {"error": str(exc), "reason": exc.reason},
+        status_code=429,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+def persisted(module: str, request: dict, fn):
+    """Wrap an analysis so its output is stored once, by the caller that runs it (not per coalesced caller)."""
+    def _run():
+        result = fn()
+        persist_result(module, request, result)
+        return result
+    return _run
+
+
+@app.get("/llm/metrics")
+async def llm_metrics():
+    metrics = get_llm_gateway().metrics()
+    metrics["coalescing"] = {"analysis": analysis_flight_stats(), "llm": metrics["coalescing"]}
+    return metrics
+
+
+@app.get("/thresholds")
+async def thresholds_info():
+    return get_threshold_store().info()
+
+
+@app.post("/thresholds/reload")
+async def thresholds_reload():
+    # Atomic swap; an invalid file leaves the running thresholds in place
+    try:
+        get_threshold_store().reload()
+    except Exception as exc:
+        raise HTTPException(status_code=400, detail=f"Threshold reload failed: {exc}")
+    return get_threshold_store().info()
+
+
+@app.get("/results/{company}")
+async def stored_results(
+    company: str,
+    module: Optional[str] = None,
+    fiscal_year: Optional[int] = None,
+    max_age: Optional[float] = None,
+    current_config: bool = False,
+):
+    # Latest stored output per module; max_age (seconds) and current_config are staleness rules
+    store = get_results_store()
+    if not store.enabled:
+        raise HTTPException(status_code=503, detail="Results store is disabled (RESULTS_STORE_PATH)")
+    results = store.latest(
+        company,
+        module=module,
+        fiscal_year=fiscal_year,
+        max_age_seconds=max_age,
+        config_version=thresholds_version() if current_config else None,
+    )
+    if not results:
+        raise HTTPException(status_code=404, detail=f"No stored results for {company.upper()}")
+    return {"company": company.upper(), "results": results}
+
+
+@app.get("/results/{company}/{module}/history")
+async def stored_result_history(company: str, module: str, limit: int = 20):
+    store = get_results_store()
+    if not store.enabled:
+        raise HTTPException(status_code=503, detail="Results store is disabled (RESULTS_STORE_PATH)")
+    return {"company": company.upper(), "module": module, "runs": store.history(company, module, limit)}
+
+
+@app.get("/screen")
+async def screen_results(
+    where: List[str] = Query(..., description='e.g. "borrowings.interest_coverage < 1.5"; repeat for AND'),
+    sort: Optional[str] = Query(None, description='field, "-" prefix for descending'),
+    limit: int = 50,
+    fields: List[str] = Query([]),
+    max_age: Optional[float] = None,
+    current_config: bool = False,
+):
+    # Conjunctive metric screen over the latest stored result of every company
+    if not get_results_store().enabled:
+        raise HTTPException(status_code=503, detail="Results store is disabled (RESULTS_STORE_PATH)")
+    try:
+        return get_screener().screen(
+            where,
+            sort=sort,
+            limit=limit,
+            fields=fields,
+            max_age_seconds=max_age,
+            config_version=thresholds_version() if current_config else None,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@app.get("/flags/companies")
+async def flagged_companies(
+    match: List[str] = Query(..., description='e.g. "borrowings.F2:RED", "liquidity.D1:RED|YELLOW"; repeat for AND, "!" to exclude'),
+    limit: Optional[int] = None,
+):
+    # Companies whose latest outputs carry every listed rule flag
+    if not get_results_store().enabled:
+        raise HTTPException(status_code=503, detail="Results store is disabled (RESULTS_STORE_PATH)")
+    try:
+        return get_flag_index().query(match, limit=limit)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@app.get("/flags/distribution")
+async def flag_distribution(module: Optional[str] = None, rule_id: Optional[str] = None):
+    if not get_results_store().enabled:
+        raise HTTPException(status_code=503, detail="Results store is disabled (RESULTS_STORE_PATH)")
+    index = get_flag_index()
+    return {"distribution": index.distribution(module, rule_id), "index": index.metrics()}
+
+
+@app.post("/analyze/stream")
+async def analyze_stream(req: AnalysisRequest, modules: List[str] = Query([])):
+    # NDJSON events: LLM answer sections as they stream in (LLM_STREAM=1), then the outputs
+    unknown = set(modules) - set(pipeline.MODULES)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown modules {sorted(unknown)}")
+    events = pipeline.stream_modules(req.dict(), modules or None, persist=True)
+    lines = (json.dumps(event, default=str) + "\n" for event in events)
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+
 @app.post("/borrowings/analyze")
 async def analyze_borrowings(req: AnalysisRequest):
     try:
@@ -83,15 +209,20 @@ async def analyze_borrowings(req: AnalysisRequest):
             for fy in req["financial_data"]["financial_years"]
         ]
 
+        industry_code = (req["industry_code"] or "GENERAL").upper()
+        thresholds = get_thresholds(industry_code)
+
         module_input = BorrowingsInput(
             company_id=req["company"].upper(),
-            industry_code=(req["industry_code"] if "industry_code" in req else "GENERAL").upper(),
+            industry_code=industry_code,
             financials_5y=financial_years,
-            industry_benchmarks=DEFAULT_BENCHMARKS,
-            covenant_limits=DEFAULT_COVENANTS,
+            industry_benchmarks=thresholds.benchmarks,
+            covenant_limits=thresholds.covenants,
         )
-        result = borrowings_engine.run(module_input)
+        result = await coalesced("borrowings", req, persisted("borrowings", req, lambda: borrowings_engine.run(module_input)))
         return result.dict()
+    except LLMOverloaded as exc:
+        return overloaded_response(exc)
     except ValidationError as ve:
         raise HTTPException(status_code=422, detail=ve.errors())
     except Exception as exc:
@@ -107,14 +238,20 @@ async def analyze_asset_quality(req: AnalysisRequest):
             for fy in req["financial_data"]["financial_years"]
         ]
 
+        industry_code = (req["industry_code"] or "GENERAL").upper()
+
         module_input = AssetQualityInput(
-            company_id=req.company.upper(),
-            industry_code=(req.industry_code or "GENERAL").upper(),
+            company_id=req["company"].upper(),
+            industry_code=industry_code,
             financials_5y=financial_years,
-            industry_asset_quality_benchmarks=DEFAULT_ASSET_BENCHMARKS,
+            industry_asset_quality_benchmarks=get_thresholds(industry_code).asset_quality,
+        )
+        result = await coalesced(
+            "asset_quality", req, persisted("asset_quality", req, lambda: asset_quality_engine.run(module_input))
         )
-        result = asset_quality_engine.run(module_input)
         return result.dict()
+    except LLMOverloaded as exc:
+        return overloaded_response(exc)
     except ValidationError as ve:
         raise HTTPException(status_code=422, detail=ve.errors())
     except Exception as exc:
@@ -126,10 +263,14 @@ async def analyze(request: AnalysisRequest):
         input_data = request.dict()
         print("Input to WC Module:", input_data)
 
-        result = run_working_capital_module(input_data)
+        result = await coalesced(
+            "working_capital", input_data, persisted("working_capital", input_data, lambda: run_working_capital_module(input_data))
+        )
         
         return result
 
+    except LLMOverloaded as exc:
+        return overloaded_response(exc)
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
 
@@ -138,8 +279,10 @@ async def analyze(req: AnalysisRequest):
     try:
         analyzer = CapexCwipModule()
         req_data = req.dict()
-        result = analyzer.run(req_data)
+        result = await coalesced("capex_cwip", req_data, persisted("capex_cwip", req_data, lambda: analyzer.run(req_data)))
         return result
+    except LLMOverloaded as exc:
+        return overloaded_response(exc)
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
 
@@ -154,16 +297,18 @@ async def analyze_liquidity(req: AnalysisRequest):
 
         module_input = LiquidityModuleInput(
             company_id=company,
-            industry_code="GENERAL",
+            industry_code=(req_data["industry_code"] or "GENERAL").upper(),
             financials_5y=fin_list,
             # industry_liquidity_thresholds=req_data["thresholds"],
         )
 
         module = LiquidityModule()
 
-        result = module.run(module_input)
+        result = await coalesced("liquidity", req_data, persisted("liquidity", req_data, lambda: module.run(module_input)))
         return result
 
+    except LLMOverloaded as exc:
+        return overloaded_response(exc)
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
 
@@ -0,0 +1,25 @@
+import sqlite3
+
+import pytest
+
+from src.app.results_store import ResultsStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultsStore(path=str(tmp_path / "results.db"))
+    yield store
+    store.close()
+
+
+def write(store: ResultsStore, company: str, module: str, key_metrics=None, rules=(), score=None) -> None:
+    """Store one module output for `company` and wait for it to be written."""
+    output = {"key_metrics": key_metrics or {}, "rules": list(rules), "sub_score_adjusted": score}
+    store.submit(module, {"company": company}, output)
+    store.flush()
+
+
+def backdate(store: ResultsStore, company: str, seconds: float) -> None:
+    """Move every stored output of `company` `seconds` into the past."""
+    with sqlite3.connect(store.path) as conn:
+        conn.execute("UPDATE results SET created_at = created_at - ? WHERE company = ?", (seconds, company))
@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+from src.app import bulk
+from src.app.benchmarking.synthetic_data import iter_universe, write_universe
+
+
+@pytest.fixture
+def universe(tmp_path, monkeypatch):
+    # In-process runs set this for the worker; keep it scoped to the test
+    monkeypatch.setenv("RESULTS_STORE_PATH", "")
+    path = tmp_path / "universe.jsonl"
+    write_universe(iter_universe(7, seed=11), str(path))
+    return str(path)
+
+
+def _run(universe, output, **kwargs):
+    return bulk.run_bulk(universe, str(output), workers=0, chunk_size=2, llm="off", progress_seconds=0, **kwargs)
+
+
+def _records(path):
+    with open(path, encoding="utf-8") as fh:
+        records = [json.loads(line) for line in fh]
+    for record in records:
+        record.pop("elapsed_ms")
+    return records
+
+
+def test_resume_matches_a_straight_run(universe, tmp_path):
+    straight = tmp_path / "straight.jsonl"
+    assert _run(universe, straight)["total_companies"] == 7
+
+    resumed = tmp_path / "resumed.jsonl"
+    assert _run(universe, resumed, limit=4)["total_companies"] == 4
+    # A crash mid-chunk leaves a partial record past the checkpoint
+    with open(resumed, "a", encoding="utf-8") as fh:
+        fh.write('{"id": "partial", "comp')
+    result = _run(universe, resumed, resume=True)
+
+    assert result["resumed_from"] == 4
+    assert result["companies"] == 3
+    assert result["total_companies"] == 7
+    assert _records(resumed) == _records(straight)
+
+
+def test_csv_resume_matches_a_straight_run(universe, tmp_path):
+    straight = tmp_path / "straight.csv"
+    _run(universe, straight, modules=["borrowings", "liquidity"])
+
+    resumed = tmp_path / "resumed.csv"
+    _run(universe, resumed, modules=["borrowings", "liquidity"], limit=3)
+    _run(universe, resumed, modules=["borrowings", "liquidity"], resume=True)
+
+    assert resumed.read_text(encoding="utf-8") == straight.read_text(encoding="utf-8")
+
+
+def test_resume_rejects_other_modules(universe, tmp_path):
+    output = tmp_path / "results.jsonl"
+    _run(universe, output, modules=["borrowings"], limit=2)
+    with pytest.raises(ValueError, match="Checkpoint was written for modules"):
+        _run(universe, output, modules=["liquidity"], resume=True)
@@ -0,0 +1,99 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src.app.llm.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from src.app.llm.gateway import LLMGateway, completion_response
+from src.app.llm.hedging import ResilientCaller
+from src.app.llm.usage import usage_scope
+
+
+def _tripped(cooldown: float = 0.0) -> CircuitBreaker:
+    breaker = CircuitBreaker(min_calls=2, error_rate=0.5, p95_latency=None, cooldown=cooldown)
+    breaker.record(False, 0.1)
+    breaker.record(False, 0.1)
+    return breaker
+
+
+class _Client:
+    """Stand-in for the OpenAI client: answers "{}" and counts calls."""
+
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model=None, messages=None, **kwargs):
+        self.calls += 1
+        return completion_response(model, "{}")
+
+
+def test_trips_open_on_error_rate():
+    breaker = _tripped(cooldown=60)
+    assert breaker.state == OPEN
+    assert not breaker.acquire()
+    assert breaker.metrics()["trips"] == {"error_rate": 1}
+
+
+def test_stays_closed_below_min_calls():
+    breaker = CircuitBreaker(min_calls=3, error_rate=0.5, p95_latency=None)
+    breaker.record(False, 0.1)
+    breaker.record(False, 0.1)
+    assert breaker.state == CLOSED
+
+
+def test_half_open_allows_one_probe():
+    breaker = _tripped()
+    assert breaker.state == HALF_OPEN
+    assert breaker.acquire()
+    assert not breaker.acquire()
+    assert not breaker.available(count=False)
+
+
+def test_probe_success_closes():
+    breaker = _tripped()
+    assert breaker.acquire()
+    breaker.record(True, 0.1)
+    assert breaker.state == CLOSED
+
+
+def test_probe_failure_reopens():
+    breaker = _tripped()
+    assert breaker.acquire()
+    breaker.cooldown = 60
+    breaker.record(False, 0.1)
+    assert breaker.state == OPEN
+    assert breaker.metrics()["trips"] == {"error_rate": 1, "probe_failed": 1}
+
+
+def test_release_probe_returns_the_permit():
+    breaker = _tripped()
+    assert breaker.acquire()
+    breaker.release_probe()
+    assert breaker.state == HALF_OPEN
+    assert breaker.acquire()
+
+
+def test_available_counts_only_when_asked():
+    breaker = _tripped(cooldown=60)
+    assert not breaker.available(count=False)
+    assert breaker.metrics()["short_circuited"] == 0
+    assert not breaker.available()
+    assert breaker.metrics()["short_circuited"] == 1
+
+
+@pytest.mark.parametrize("attempts_used", [0, 12])
+def test_gateway_probe_is_not_leaked(attempts_used):
+    # A half-open probe whose request has no attempts left must not hold the permit
+    breaker = _tripped()
+    gateway = LLMGateway(api_key=None, breaker=breaker, resilience=ResilientCaller(max_attempts_per_request=12))
+    client = _Client()
+    with gateway.use_client(client):
+        with usage_scope(company="ACME") as scope:
+            scope.llm_attempts = attempts_used
+            gateway.complete("borrowings", [{"role": "user", "content": "x"}])
+        assert breaker.state == (CLOSED if attempts_used == 0 else HALF_OPEN)
+        assert gateway.enabled
+        with usage_scope(company="GLOBEX"):
+            gateway.complete("borrowings", [{"role": "user", "content": "y"}])
+    assert client.calls == 2 - (attempts_used > 0)
+    assert breaker.state == CLOSED
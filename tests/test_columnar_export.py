@@ -0,0 +1,61 @@
+import csv
+import gzip
+import math
+
+from src.app.columnar_export import METRIC_COLUMNS, SCHEMAS, export, flatten, iter_store
+from tests.conftest import write
+
+OUTPUT = {
+    "key_metrics": {"year": 2024, "interest_coverage": 1.2, "cash_ratio": 0.15, "wacd": math.nan, "floating_share": True},
+    "rules": [
+        {"rule_id": "F2", "rule_name": "Coverage", "metric": "interest_coverage", "flag": "RED", "value": 1.2},
+        {"rule_id": "F3", "flag": "GREEN"},
+    ],
+    "trends": {"total_debt": {"values": {"Y": 120, "Y-1": 100}, "yoy_growth_pct": {"Y_vs_Y-1": 20.0}}, "bad": "x"},
+    "sub_score_adjusted": 42,
+    "summary_color": "Red",
+}
+
+
+def _read(path):
+    with gzip.open(path, "rt", encoding="utf-8", newline="") as fh:
+        return list(csv.DictReader(fh))
+
+
+def test_flatten_keeps_the_fixed_schema():
+    module_row, rule_rows, trend_rows = flatten("ACME", "borrowings", OUTPUT)
+    row = dict(zip([name for name, _ in SCHEMAS["modules"]], module_row))
+    assert len(module_row) == len(SCHEMAS["modules"])
+    assert (row["fiscal_year"], row["score"], row["red"], row["green"]) == (2024, 42.0, 1, 1)
+    assert row["interest_coverage"] == 1.2
+    # Not a borrowings metric, not finite, not a number
+    assert row["cash_ratio"] is row["wacd"] is row["floating_share"] is None
+
+    assert [r[2] for r in rule_rows] == ["F2", "F3"]
+    assert all(len(r) == len(SCHEMAS["rules"]) for r in rule_rows)
+    [trend] = trend_rows
+    assert trend[:5] == ("ACME", "borrowings", "total_debt", 120.0, 100.0)
+    assert trend[8] == 20.0 and len(trend) == len(SCHEMAS["trends"])
+
+
+def test_csv_export_in_chunks(tmp_path):
+    records = [(company, module, OUTPUT) for company in ("A", "B", "C") for module in ("borrowings", "liquidity")]
+    result = export(iter(records), str(tmp_path), fmt="csv", chunk_size=2)
+    assert result["companies"] == 3
+    assert result["rows"] == {"modules": 6, "rules": 12, "trends": 6}
+
+    modules = _read(result["files"]["modules"])
+    assert list(modules[0]) == [name for name, _ in SCHEMAS["modules"]]
+    assert [(m["company"], m["module"]) for m in modules] == [(c, m) for c, m, _ in records]
+    assert modules[1]["cash_ratio"] == "0.15" and modules[1]["interest_coverage"] == ""
+    assert len(METRIC_COLUMNS) == len(set(METRIC_COLUMNS))
+
+
+def test_export_from_the_results_store(store, tmp_path):
+    write(store, "ACME", "borrowings", {"interest_coverage": 2.0}, score=60)
+    write(store, "ACME", "borrowings", {"interest_coverage": 3.0}, score=70)
+    write(store, "GLOBEX", "liquidity", {"cash_ratio": 0.2}, rules=[{"rule_id": "L1", "flag": "YELLOW"}])
+    result = export(iter_store(store, page_size=1), str(tmp_path), fmt="csv")
+    modules = _read(result["files"]["modules"])
+    assert [(m["company"], m["module"], m["score"]) for m in modules] == [("ACME", "borrowings", "70.0"), ("GLOBEX", "liquidity", "")]
+    assert _read(result["files"]["rules"])[0]["rule_id"] == "L1"
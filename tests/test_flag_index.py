@@ -0,0 +1,78 @@
+import pytest
+
+from src.app.flag_index import FlagIndex
+from tests.conftest import write
+
+
+def _rules(**flags):
+    return [{"rule_id": rule_id, "flag": flag} for rule_id, flag in flags.items()]
+
+
+@pytest.fixture
+def index():
+    index = FlagIndex()
+    index.update("ACME", "borrowings", _rules(F2="RED", F3="GREEN"))
+    index.update("GLOBEX", "borrowings", _rules(F2="YELLOW", F3="GREEN"))
+    index.update("INITECH", "borrowings", _rules(F2="GREEN", F3="RED"))
+    index.update("ACME", "liquidity", _rules(D1="RED"))
+    index.update("GLOBEX", "liquidity", _rules(D1="GREEN"))
+    return index
+
+
+def test_parse_term():
+    assert FlagIndex.parse(" !liquidity.D1:red|Yellow ") == (True, "liquidity", "D1", ["RED", "YELLOW"])
+
+
+@pytest.mark.parametrize("term", ["borrowings.F2", "borrowingsF2:RED"])
+def test_parse_rejects_malformed_terms(term):
+    with pytest.raises(ValueError, match="Cannot parse"):
+        FlagIndex.parse(term)
+
+
+def test_single_term(index):
+    assert index.companies(["borrowings.F2:RED"]) == {"ACME"}
+
+
+def test_union_of_flags(index):
+    assert index.companies(["borrowings.F2:RED|YELLOW"]) == {"ACME", "GLOBEX"}
+
+
+def test_terms_intersect(index):
+    assert index.companies(["borrowings.F3:GREEN", "liquidity.D1:GREEN"]) == {"GLOBEX"}
+
+
+def test_negation_excludes(index):
+    assert index.companies(["borrowings.F3:GREEN", "!liquidity.D1:RED"]) == {"GLOBEX"}
+    assert index.companies(["borrowings.F2:RED|YELLOW|GREEN", "!borrowings.F2:GREEN"]) == {"ACME", "GLOBEX"}
+
+
+def test_negation_alone_is_rejected(index):
+    with pytest.raises(ValueError, match="positive term"):
+        index.companies(["!borrowings.F2:RED"])
+
+
+def test_update_replaces_previous_postings(index):
+    index.update("ACME", "borrowings", _rules(F2="GREEN"))
+    assert index.companies(["borrowings.F2:RED"]) == set()
+    assert index.companies(["borrowings.F2:GREEN"]) == {"ACME", "INITECH"}
+    assert index.companies(["borrowings.F3:GREEN"]) == {"GLOBEX"}
+
+
+def test_distribution(index):
+    assert index.distribution("borrowings", "F2") == {
+        "borrowings": {"F2": {"total": 3, "RED": 1, "YELLOW": 1, "GREEN": 1}}
+    }
+
+
+def test_load_and_listener_agree(store):
+    index = FlagIndex()
+    store.add_listener(index.on_written)
+    write(store, "ACME", "borrowings", rules=_rules(F2="RED"))
+    write(store, "GLOBEX", "borrowings", rules=_rules(F2="YELLOW"))
+    write(store, "ACME", "borrowings", rules=_rules(F2="GREEN"))
+
+    loaded = FlagIndex()
+    loaded.load(store)
+    assert index.distribution() == loaded.distribution() == {
+        "borrowings": {"F2": {"total": 2, "GREEN": 1, "YELLOW": 1}}
+    }
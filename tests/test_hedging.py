@@ -0,0 +1,97 @@
+import threading
+
+import httpx
+import openai
+import pytest
+
+from src.app.llm.gateway import completion_response
+from src.app.llm.hedging import AttemptsExhausted, HedgePolicy, ResilientCaller, RetryPolicy
+from src.app.llm.usage import UsageScope
+
+NO_WAIT = RetryPolicy(max_retries=2, base_delay=0.0, max_delay=0.0)
+
+
+def _transient():
+    return openai.APIConnectionError(request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+
+
+def _flaky(failures: int, content: str = '{"ok": true}'):
+    calls = []
+
+    def send():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise _transient()
+        return completion_response("m", content)
+
+    return send, calls
+
+
+def test_transient_errors_are_retried():
+    send, calls = _flaky(2)
+    caller = ResilientCaller(retry=NO_WAIT)
+    assert caller.call("borrowings", send).choices[0].message.content == '{"ok": true}'
+    assert len(calls) == 3
+    assert caller.metrics()["counters"]["retries"] == 2
+
+
+def test_retries_stop_at_max_retries():
+    send, calls = _flaky(5)
+    with pytest.raises(openai.APIConnectionError):
+        ResilientCaller(retry=NO_WAIT).call("borrowings", send)
+    assert len(calls) == 3
+
+
+def test_other_errors_are_not_retried():
+    calls = []
+
+    def send():
+        calls.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        ResilientCaller(retry=NO_WAIT).call("borrowings", send)
+    assert len(calls) == 1
+
+
+def test_attempt_budget_is_per_request_scope():
+    send, calls = _flaky(10)
+    scope = UsageScope()
+    caller = ResilientCaller(retry=RetryPolicy(max_retries=10, base_delay=0.0), max_attempts_per_request=4)
+    with pytest.raises(AttemptsExhausted):
+        caller.call("borrowings", send, scope=scope)
+    assert len(calls) == scope.llm_attempts == 4
+
+
+def test_hedging_is_off_by_default():
+    assert not ResilientCaller().hedge.enabled
+    assert not ResilientCaller.from_env().hedge.enabled
+
+
+def test_slow_primary_is_hedged_and_the_fast_answer_wins():
+    release = threading.Event()
+    calls = []
+
+    def send():
+        calls.append(1)
+        if len(calls) == 1:
+            release.wait(5)
+            return completion_response("m", '{"from": "primary"}')
+        return completion_response("m", '{"from": "hedge"}')
+
+    caller = ResilientCaller(retry=NO_WAIT, hedge=HedgePolicy(enabled=True, delay=0.01))
+    try:
+        response = caller.call("borrowings", send)
+    finally:
+        release.set()
+    assert response.choices[0].message.content == '{"from": "hedge"}'
+    assert caller.metrics()["counters"]["hedge_wins"] == 1
+
+
+def test_no_hedge_without_a_free_slot_or_for_batch_work():
+    send, calls = _flaky(0)
+    caller = ResilientCaller(retry=NO_WAIT, hedge=HedgePolicy(enabled=True, delay=0.0))
+    caller.call("borrowings", send, priority="batch")
+    caller.call("borrowings", send, try_hedge_slot=lambda: False)
+    assert len(calls) == 2
+    assert "hedges" not in caller.metrics()["counters"]
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from src.app.llm.json_stream import IncrementalJSONParser, parse_llm_json
+
+ANSWER = {
+    "analysis_narrative": ["Coverage fell to 1.2x.", 'Cash "buffer" is thin, \\ note'],
+    "trend_insights": {"cash": "down", "debt": {"direction": "up"}},
+    "score_adjustment": -5,
+    "ok": True,
+}
+
+
+def _items(text: str, chunk_size: int, depth: int = 2):
+    items = []
+    parser = IncrementalJSONParser(lambda path, value: items.append((path, value)), depth=depth)
+    for start in range(0, len(text), chunk_size):
+        parser.feed(text[start:start + chunk_size])
+    return parser, items
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 17, 10_000])
+def test_sections_are_reported_as_they_close(chunk_size):
+    parser, items = _items("```json\n" + json.dumps(ANSWER) + "\n```", chunk_size)
+    assert items == [
+        (("analysis_narrative", 0), "Coverage fell to 1.2x."),
+        (("analysis_narrative", 1), 'Cash "buffer" is thin, \\ note'),
+        (("analysis_narrative",), ANSWER["analysis_narrative"]),
+        (("trend_insights", "cash"), "down"),
+        (("trend_insights", "debt"), {"direction": "up"}),
+        (("trend_insights",), ANSWER["trend_insights"]),
+        (("score_adjustment",), -5),
+        (("ok",), True),
+    ]
+    assert parser.complete and parser.result() == ANSWER
+
+
+def test_depth_limits_reported_paths():
+    _, items = _items(json.dumps(ANSWER), 5, depth=1)
+    assert [path for path, _ in items] == [("analysis_narrative",), ("trend_insights",), ("score_adjustment",), ("ok",)]
+
+
+def test_unfinished_object_has_no_result():
+    parser, items = _items('{"analysis_narrative": ["one", "tw', 4)
+    assert items == [(("analysis_narrative", 0), "one")]
+    assert not parser.complete and parser.result() is None
+
+
+def test_parse_llm_json_modes():
+    fenced = "Here you go:\n```json\n{\"a\": 1}\n```"
+    assert parse_llm_json(fenced, "lenient") == {"a": 1}
+    assert parse_llm_json(fenced, "strict") is None
+    assert parse_llm_json('{"a": 1}', "strict") == {"a": 1}
+    assert parse_llm_json("[1, 2]", "lenient") is None
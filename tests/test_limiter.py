@@ -0,0 +1,70 @@
+import threading
+import time
+
+import pytest
+
+from src.app.llm.limiter import LLMLimiter, LLMOverloaded
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert predicate()
+
+
+def test_unknown_shed_mode_is_rejected():
+    with pytest.raises(ValueError):
+        LLMLimiter(shed_mode="drop")
+
+
+def test_full_queue_sheds_with_retry_after():
+    limiter = LLMLimiter(max_concurrency=1, max_queue=0)
+    with limiter.slot():
+        with pytest.raises(LLMOverloaded) as excinfo:
+            with limiter.slot():
+                pass
+    assert excinfo.value.reason == "queue_full"
+    assert excinfo.value.retry_after >= 1
+    assert limiter.metrics()["shed"] == {"queue_full": 1}
+
+
+def test_queued_call_times_out():
+    limiter = LLMLimiter(max_concurrency=1, queue_timeout=0.05)
+    with limiter.slot():
+        with pytest.raises(LLMOverloaded) as excinfo:
+            with limiter.slot():
+                pass
+    assert excinfo.value.reason == "timeout"
+    assert limiter.metrics()["queue_depth"] == 0
+
+
+def test_interactive_is_admitted_before_earlier_batch_work():
+    limiter = LLMLimiter(max_concurrency=1)
+    order = []
+
+    def call(priority):
+        with limiter.slot(priority):
+            order.append(priority)
+
+    with limiter.slot():
+        batch = threading.Thread(target=call, args=("batch",))
+        batch.start()
+        _wait_for(lambda: limiter.metrics()["queue_depth"] == 1)
+        interactive = threading.Thread(target=call, args=("interactive",))
+        interactive.start()
+        _wait_for(lambda: limiter.metrics()["queue_depth"] == 2)
+    for thread in (batch, interactive):
+        thread.join(timeout=5)
+    assert order == ["interactive", "batch"]
+
+
+def test_batch_cap_leaves_headroom_for_interactive():
+    limiter = LLMLimiter(max_concurrency=2, batch_max_concurrency=1)
+    assert limiter.try_acquire("batch")
+    assert not limiter.try_acquire("batch")
+    assert limiter.try_acquire("interactive")
+    assert limiter.metrics()["active"] == 2
+    limiter.release("batch", 0.01)
+    limiter.release("interactive", 0.01)
+    assert limiter.metrics()["active"] == limiter.metrics()["active_batch"] == 0
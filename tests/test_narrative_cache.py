@@ -0,0 +1,79 @@
+from src.app.llm.narrative_cache import CacheConfig, NarrativeCache, quantize
+
+RULES = [{"rule_id": "F2", "flag": "RED"}]
+ANSWER = {"analysis_narrative": ["ACME covers its interest 1.20x, cash ratio 15%."], "score_adjustment": -5}
+METRICS = {"interest_coverage": 1.2, "cash_ratio": 0.15}
+
+
+def _cache(**config) -> NarrativeCache:
+    return NarrativeCache(CacheConfig(enabled=True, **config))
+
+
+def test_quantize_bands():
+    assert quantize(1.2, 1.0) == quantize(1.35, 1.0) == "+0"
+    assert quantize(2.5, 1.0) == "+1"
+    assert quantize(-2.5, 1.0) == "-1"
+    assert quantize(0.0, 1.0) == "0"
+
+
+def test_hit_renders_the_other_companys_numbers():
+    cache = _cache()
+    assert cache.store("borrowings", "ACME", {"interest_coverage": 1.2, "cash_ratio": 0.15}, RULES, ANSWER)
+    answer = cache.lookup("borrowings", "GLOBEX", {"interest_coverage": 1.35, "cash_ratio": 0.18}, RULES)
+    assert answer == {
+        "analysis_narrative": ["GLOBEX covers its interest 1.35x, cash ratio 18%."],
+        "score_adjustment": -5,
+    }
+
+
+def test_other_flags_miss():
+    cache = _cache()
+    cache.store("borrowings", "ACME", {"interest_coverage": 1.2}, RULES, ANSWER)
+    assert cache.lookup("borrowings", "GLOBEX", {"interest_coverage": 1.2}, [{"rule_id": "F2", "flag": "GREEN"}]) is None
+    assert cache.lookup("borrowings", "GLOBEX", {"interest_coverage": 5.0}, RULES) is None
+
+
+def test_low_fidelity_answers_are_not_stored():
+    cache = _cache()
+    answer = {"analysis_narrative": ["Leverage of 3.7x and coverage of 1.20x."]}
+    assert not cache.store("borrowings", "ACME", {"interest_coverage": 1.2}, RULES, answer)
+    assert cache.metrics()["rejected_low_fidelity"] == 1
+
+
+def test_disabled_cache():
+    cache = NarrativeCache(CacheConfig(enabled=False))
+    assert not cache.store("borrowings", "ACME", {"interest_coverage": 1.2}, RULES, ANSWER)
+    assert cache.lookup("borrowings", "ACME", {"interest_coverage": 1.2}, RULES) is None
+
+
+def test_lru_eviction():
+    cache = _cache(size=1)
+    cache.store("borrowings", "ACME", METRICS, RULES, ANSWER)
+    cache.store("liquidity", "ACME", METRICS, RULES, ANSWER)
+    assert cache.metrics()["entries"] == 1
+    assert cache.lookup("borrowings", "ACME", METRICS, RULES) is None
+    assert cache.lookup("liquidity", "ACME", METRICS, RULES) is not None
+
+
+def test_served_fidelity_is_a_running_total():
+    cache = _cache(min_fidelity=0.5)
+    metrics = {"interest_coverage": 1.2, "cash_ratio": 0.15}
+    cache.store("borrowings", "ACME", metrics, RULES, ANSWER)
+    partial = {"analysis_narrative": ["ACME covers its interest 1.20x; leverage 3.7x."]}
+    cache.store("liquidity", "ACME", metrics, RULES, partial)
+    for _ in range(3):
+        cache.lookup("borrowings", "GLOBEX", metrics, RULES)
+    cache.lookup("liquidity", "GLOBEX", metrics, RULES)
+
+    report = cache.metrics()
+    assert report["hits"] == 4
+    assert report["fidelity_served_avg"] == 0.875
+    assert report["fidelity_served_min"] == 0.5
+    cache.clear()
+    assert cache.metrics()["fidelity_served_avg"] is None
+
+
+def test_sqlite_entries_survive_a_restart(tmp_path):
+    path = str(tmp_path / "narratives.db")
+    _cache(path=path).store("borrowings", "ACME", METRICS, RULES, ANSWER)
+    assert _cache(path=path).lookup("borrowings", "GLOBEX", METRICS, RULES) is not None
@@ -0,0 +1,38 @@
+import pytest
+
+from src.app import pipeline
+from src.app.benchmarking.llm_stub_server import StubLLMClient
+from src.app.benchmarking.synthetic_data import iter_universe
+from src.app.llm.narrative_cache import get_narrative_cache
+from src.app.narrative_engine import from_llm_answer
+
+
+@pytest.fixture
+def narrative_cache(monkeypatch):
+    cache = get_narrative_cache()
+    monkeypatch.setattr(cache.config, "enabled", True)
+    monkeypatch.setattr(cache.config, "min_fidelity", 0.0)
+    cache.clear()
+    yield cache
+    cache.clear()
+
+
+def test_from_llm_answer_falls_back_to_the_template():
+    assert from_llm_answer({}, ["template"], 50) == (["template"], 50, {})
+    answer = {"analysis_narrative": ["llm"], "score_adjustment": 70, "trend_insights": {"debt": "up"}}
+    assert from_llm_answer(answer, ["template"], 50) == (["llm"], 100, {"debt": "up"})
+    assert from_llm_answer({"score_adjustment": True}, ["template"], 50)[1] == 50
+
+
+def test_template_engine_ignores_cached_answers(narrative_cache, monkeypatch):
+    payload = next(iter_universe(1, seed=9))
+    with pipeline.deterministic_llm():
+        deterministic = pipeline.run_modules(payload)
+    with pipeline.llm_client_override(StubLLMClient()):
+        pipeline.run_modules(payload, combined_llm=False)
+    assert narrative_cache.metrics()["entries"] > 0
+
+    monkeypatch.setenv("NARRATIVE_ENGINE", "template")
+    with pipeline.llm_client_override(StubLLMClient()):
+        templated = pipeline.run_modules(payload, combined_llm=False)
+    assert templated == deterministic
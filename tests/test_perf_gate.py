@@ -0,0 +1,45 @@
+import pytest
+
+from src.app.benchmarking.perf_gate import compare, tolerance_for
+
+TOLERANCES = {"micro.*": 0.35, "micro.*.run": 0.5, "macro.*": 0.5}
+
+
+def _status(key, base, cur, **kwargs):
+    [(_, _, _, _, status)] = compare({key: cur}, {key: base}, TOLERANCES, 0.25, **kwargs)
+    return status
+
+
+def test_most_specific_tolerance_wins():
+    assert tolerance_for("micro.borrowings.run", TOLERANCES, 0.25) == 0.5
+    assert tolerance_for("micro.borrowings.rules", TOLERANCES, 0.25) == 0.35
+    assert tolerance_for("other", TOLERANCES, 0.25) == 0.25
+
+
+@pytest.mark.parametrize(
+    "base, cur, status",
+    [
+        (20.0, 29.0, "OK"),          # +45% but within the floor (10us = half the baseline)
+        (20.0, 40.0, "REGRESSED"),   # a short stage that doubles fails
+        (200.0, 260.0, "OK"),        # +30%: within tolerance
+        (200.0, 280.0, "REGRESSED"), # +40%, and 80us over the 25us floor
+        (200.0, 120.0, "IMPROVED"),
+    ],
+)
+def test_micro_floor_is_capped_by_the_baseline(base, cur, status):
+    assert _status("micro.liquidity.trend", base, cur) == status
+
+
+def test_absolute_floor():
+    assert _status("micro.liquidity.trend", 60.0, 84.0) == "OK"
+    assert _status("micro.liquidity.trend", 60.0, 84.0, min_delta_us=10) == "REGRESSED"
+
+
+def test_macro_throughput_is_higher_is_better():
+    assert _status("macro.TOTAL.throughput_rps", 100.0, 40.0) == "REGRESSED"
+    assert _status("macro.TOTAL.p95_ms", 100.0, 40.0) == "IMPROVED"
+
+
+def test_new_and_missing():
+    rows = compare({"micro.a.run": 1.0}, {"micro.b.run": 1.0}, TOLERANCES, 0.25)
+    assert [row[4] for row in rows] == ["NEW", "MISSING"]
@@ -0,0 +1,48 @@
+import json
+
+from src.app.benchmarking.llm_stub_server import StubLLMClient
+from src.app.benchmarking.replay import CachingLLMClient
+
+MESSAGES = [{"role": "user", "content": "borrowings analysis for ACME"}]
+
+
+def _content(response):
+    return response.choices[0].message.content
+
+
+def test_miss_is_recorded_then_replayed(tmp_path):
+    path = str(tmp_path / "cache.jsonl")
+    client = CachingLLMClient(StubLLMClient(), path)
+    first = client.chat.completions.create(model="gpt-4o-mini", messages=MESSAGES, temperature=0.2)
+    second = client.chat.completions.create(model="gpt-4o-mini", messages=MESSAGES, temperature=0.2)
+    assert (client.misses, client.hits) == (1, 1)
+    assert _content(first) == _content(second)
+    assert (first.model, second.model) == ("stub", "replay")
+
+    reloaded = CachingLLMClient(None, path)
+    assert _content(reloaded.chat.completions.create(model="gpt-4o-mini", messages=MESSAGES, temperature=0.2)) == _content(first)
+    assert reloaded.hits == 1
+
+
+def test_key_includes_request_options(tmp_path):
+    client = CachingLLMClient(StubLLMClient(), str(tmp_path / "cache.jsonl"))
+    client.chat.completions.create(model="m", messages=MESSAGES, temperature=0.2)
+    client.chat.completions.create(model="m", messages=MESSAGES, temperature=0.7)
+    client.chat.completions.create(model="m", messages=MESSAGES, temperature=0.2, response_format={"type": "json_object"})
+    assert client.misses == 3
+
+
+def test_streamed_callers_get_one_chunk(tmp_path):
+    client = CachingLLMClient(StubLLMClient(), str(tmp_path / "cache.jsonl"))
+    expected = _content(client.chat.completions.create(model="m", messages=MESSAGES))
+    chunks = list(client.chat.completions.create(model="m", messages=MESSAGES, stream=True, stream_options={}))
+    assert "".join(c.choices[0].delta.content for c in chunks if c.choices) == expected
+
+
+def test_miss_without_a_client_answers_empty(tmp_path):
+    path = tmp_path / "cache.jsonl"
+    client = CachingLLMClient(None, str(path))
+    response = client.chat.completions.create(model="m", messages=MESSAGES)
+    assert json.loads(_content(response)) == {}
+    assert (client.misses, client.unrecorded) == (1, 1)
+    assert not path.exists()
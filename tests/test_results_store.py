@@ -0,0 +1,62 @@
+import pytest
+
+from src.app import pipeline, results_store
+from src.app.benchmarking.llm_stub_server import StubLLMClient
+from src.app.benchmarking.synthetic_data import iter_universe
+from tests.conftest import write
+
+
+@pytest.fixture
+def payload():
+    return next(iter_universe(1, seed=5))
+
+
+@pytest.fixture
+def shared_store(store, monkeypatch):
+    monkeypatch.setattr(results_store, "_store", store)
+    return store
+
+
+def test_disabled_store_is_a_no_op():
+    store = results_store.ResultsStore(path=None)
+    store.submit("borrowings", {"company": "ACME"}, {"rules": []})
+    store.flush()
+    assert not store.enabled
+    assert store.latest("ACME") == {}
+
+
+def test_latest_and_history(store):
+    write(store, "acme", "borrowings", {"interest_coverage": 1.2}, rules=[{"rule_id": "F2", "flag": "RED"}], score=40)
+    write(store, "acme", "borrowings", {"interest_coverage": 2.0}, score=60)
+
+    latest = store.latest("ACME")["borrowings"]
+    assert latest["score"] == 60
+    assert latest["output"]["key_metrics"] == {"interest_coverage": 2.0}
+    history = store.history("ACME", "borrowings")
+    assert [entry["score"] for entry in history] == [60, 40]
+    assert history[1]["red"] == 1
+    assert store.query("SELECT COUNT(*) FROM results_latest")[0][0] == 1
+
+
+def test_listener_sees_committed_outputs(store):
+    seen = []
+    store.add_listener(seen.extend)
+    write(store, "ACME", "liquidity", rules=[{"rule_id": "D1", "flag": "YELLOW"}])
+    assert seen == [("ACME", "liquidity", [{"rule_id": "D1", "flag": "YELLOW"}])]
+
+
+def test_pipeline_does_not_persist_by_default(shared_store, payload):
+    with pipeline.deterministic_llm():
+        pipeline.run_modules(payload, ["borrowings", "liquidity"])
+    shared_store.flush()
+    assert shared_store.query("SELECT COUNT(*) FROM results")[0][0] == 0
+
+
+def test_persisted_outputs_record_the_responding_model(shared_store, payload):
+    with pipeline.llm_client_override(StubLLMClient()):
+        pipeline.run_modules(payload, ["borrowings", "liquidity"], combined_llm=False, persist=True)
+    shared_store.flush()
+    assert shared_store.query("SELECT module, model FROM results ORDER BY module") == [
+        ("borrowings", "stub"),
+        ("liquidity", "stub"),
+    ]
@@ -0,0 +1,106 @@
+import pytest
+
+from src.app.screening import Screener
+from tests.conftest import backdate, write
+
+
+@pytest.fixture
+def screener(store):
+    write(store, "ACME", "borrowings", {"interest_coverage": 1.2, "debt_cagr": 0.30, "ebitda_cagr": 0.10}, score=40)
+    write(store, "GLOBEX", "borrowings", {"interest_coverage": 3.5, "debt_cagr": 0.05, "ebitda_cagr": 0.12}, score=80)
+    write(store, "INITECH", "borrowings", {"interest_coverage": 0.8, "debt_cagr": 0.02, "ebitda_cagr": 0.20}, score=30)
+    write(store, "ACME", "liquidity", {"cash_ratio": 0.15})
+    write(store, "GLOBEX", "liquidity", {"cash_ratio": 0.25})
+    write(store, "INITECH", "liquidity", {"cash_ratio": 0.12})
+    return Screener(store)
+
+
+def test_parse_range_term(screener):
+    assert screener.parse("borrowings.interest_coverage < 1.5") == [
+        ("range", ("borrowings", "interest_coverage"), "<", 1.5)
+    ]
+
+
+def test_parse_mirrors_constant_on_the_left(screener):
+    assert screener.parse("1.5 > interest_coverage") == [("range", ("borrowings", "interest_coverage"), "<", 1.5)]
+
+
+def test_parse_chained_condition_yields_two_ranges(screener):
+    assert screener.parse("0.1 <= liquidity.cash_ratio < 0.2") == [
+        ("range", ("liquidity", "cash_ratio"), ">=", 0.1),
+        ("range", ("liquidity", "cash_ratio"), "<", 0.2),
+    ]
+
+
+def test_parse_compare_term(screener):
+    assert screener.parse("borrowings.debt_cagr > borrowings.ebitda_cagr") == [
+        ("compare", ("borrowings", "debt_cagr"), ">", ("borrowings", "ebitda_cagr"))
+    ]
+
+
+@pytest.mark.parametrize(
+    "condition, message",
+    [
+        ("borrowings.interest_coverage", "Cannot parse"),
+        ("1 < 2", "two constants"),
+        ("borrowings.nope > 1", "Unknown field"),
+        ("score > 50", "Ambiguous field"),
+    ],
+)
+def test_parse_rejects(screener, condition, message):
+    with pytest.raises(ValueError, match=message):
+        screener.parse(condition)
+
+
+def test_screen_range_and_compare(screener):
+    result = screener.screen(["interest_coverage < 1.5", "borrowings.debt_cagr > borrowings.ebitda_cagr"])
+    assert result["matches"] == 1
+    assert result["results"] == [
+        {
+            "company": "ACME",
+            "borrowings.interest_coverage": 1.2,
+            "borrowings.debt_cagr": 0.30,
+            "borrowings.ebitda_cagr": 0.10,
+        }
+    ]
+
+
+def test_screen_intersects_modules_and_sorts(screener):
+    result = screener.screen(["0.1 <= liquidity.cash_ratio < 0.2", "borrowings.score <= 40"], sort="-borrowings.score")
+    assert [row["company"] for row in result["results"]] == ["ACME", "INITECH"]
+
+
+def test_screen_uses_the_latest_output(screener, store):
+    write(store, "GLOBEX", "borrowings", {"interest_coverage": 1.0, "debt_cagr": 0.05, "ebitda_cagr": 0.12})
+    result = screener.screen(["borrowings.interest_coverage < 1.5"])
+    assert result["matches"] == 3
+
+
+def test_screen_max_age_drops_stale_outputs(screener, store):
+    backdate(store, "ACME", 3600)
+    assert screener.screen(["borrowings.interest_coverage < 1.5"])["matches"] == 2
+    result = screener.screen(["borrowings.interest_coverage < 1.5"], max_age_seconds=600)
+    assert [row["company"] for row in result["results"]] == ["INITECH"]
+
+
+def test_screen_config_version_filter(store, monkeypatch):
+    monkeypatch.setattr("src.app.thresholds.thresholds_version", lambda: "v1")
+    write(store, "ACME", "borrowings", {"interest_coverage": 1.2})
+    monkeypatch.setattr("src.app.thresholds.thresholds_version", lambda: "v2")
+    write(store, "GLOBEX", "borrowings", {"interest_coverage": 1.1})
+    screener = Screener(store)
+    result = screener.screen(["borrowings.interest_coverage < 1.5"], config_version="v2")
+    assert [row["company"] for row in result["results"]] == ["GLOBEX"]
+
+
+def test_latest_staleness_filters(store, monkeypatch):
+    monkeypatch.setattr("src.app.thresholds.thresholds_version", lambda: "v1")
+    write(store, "ACME", "borrowings", {"interest_coverage": 1.2})
+    backdate(store, "ACME", 3600)
+    monkeypatch.setattr("src.app.thresholds.thresholds_version", lambda: "v2")
+    write(store, "ACME", "liquidity", {"cash_ratio": 0.15})
+
+    assert set(store.latest("acme")) == {"borrowings", "liquidity"}
+    assert set(store.latest("acme", max_age_seconds=600)) == {"liquidity"}
+    assert set(store.latest("acme", config_version="v1")) == {"borrowings"}
+    assert store.latest("acme", max_age_seconds=600, config_version="v1") == {}
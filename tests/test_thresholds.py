@@ -0,0 +1,73 @@
+import json
+import os
+import sqlite3
+
+import pytest
+
+from src.app.thresholds import DEFAULTS, ThresholdStore, load_snapshot
+
+
+def _write(path, data, mtime=None):
+    path.write_text(json.dumps(data))
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def test_industry_overlays_general_and_unknown_codes_get_general(tmp_path):
+    path = _write(tmp_path / "t.json", {
+        "GENERAL": {"covenants": {"de_ratio_limit": 1.5}},
+        "utilities": {"benchmarks": {"max_safe_de_ratio": 2.5}},
+    })
+    snapshot = load_snapshot(path)
+    utilities = snapshot.get("UTILITIES")
+    assert utilities.benchmarks.max_safe_de_ratio == 2.5
+    assert utilities.covenants.de_ratio_limit == 1.5
+    assert snapshot.get("MINING").industry_code == snapshot.get(None).industry_code == "GENERAL"
+    assert snapshot.get("GENERAL").benchmarks.max_safe_de_ratio == DEFAULTS["benchmarks"]["max_safe_de_ratio"]
+
+
+def test_unknown_names_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        load_snapshot(_write(tmp_path / "t.json", {"GENERAL": {"covenants": {"typo_limit": 1}}}))
+    with pytest.raises(ValueError):
+        load_snapshot(_write(tmp_path / "t.json", {"GENERAL": {"nope": {}}}))
+
+
+def test_version_follows_resolved_values(tmp_path):
+    assert load_snapshot().version == load_snapshot(_write(tmp_path / "same.json", {})).version
+    changed = load_snapshot(_write(tmp_path / "t.json", {"GENERAL": {"covenants": {"icr_limit": 3.0}}}))
+    assert changed.version != load_snapshot().version
+
+
+def test_failed_reload_keeps_the_running_snapshot(tmp_path):
+    path = tmp_path / "t.json"
+    store = ThresholdStore(_write(path, {"GENERAL": {"covenants": {"icr_limit": 3.0}}}))
+    version = store.version
+    path.write_text("{not json")
+    with pytest.raises(ValueError):
+        store.reload()
+    assert store.version == version
+    assert store.get().covenants.icr_limit == 3.0
+
+
+def test_polling_reloads_a_changed_file(tmp_path):
+    path = tmp_path / "t.json"
+    store = ThresholdStore(_write(path, {}, mtime=1_000), reload_seconds=1e-9)
+    _write(path, {"GENERAL": {"covenants": {"icr_limit": 3.0}}}, mtime=2_000)
+    assert store.get().covenants.icr_limit == 3.0
+    assert store.info()["reloads"] == 1
+
+    path.write_text("{not json")
+    os.utime(path, (3_000, 3_000))
+    assert store.get().covenants.icr_limit == 3.0
+    assert store.info()["reload_errors"] == 1
+
+
+def test_sqlite_rows(tmp_path):
+    path = str(tmp_path / "t.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE thresholds (industry_code TEXT, section TEXT, name TEXT, value REAL)")
+        conn.execute("INSERT INTO thresholds VALUES ('UTILITIES', 'benchmarks', 'max_safe_de_ratio', 2.5)")
+    conn.close()
+    assert load_snapshot(path).get("utilities").benchmarks.max_safe_de_ratio == 2.5
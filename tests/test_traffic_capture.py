@@ -0,0 +1,65 @@
+import gzip
+import json
+import os
+import time
+
+from src.app.traffic_capture import RotatingCaptureWriter
+
+
+def _item(n: int) -> dict:
+    return {
+        "id": f"req-{n}",
+        "ts": 0,
+        "path": "/analyze",
+        "status": 200,
+        "elapsed_ms": 1.0,
+        "request_body": json.dumps({"company": f"C{n}", "api_key": "secret"}).encode(),
+        "response_body": b"{}",
+    }
+
+
+def _lines(path: str) -> list:
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        return [json.loads(line) for line in fh]
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert predicate()
+
+
+def test_part_file_is_readable_before_rotation(tmp_path):
+    writer = RotatingCaptureWriter(str(tmp_path), redact_paths=["api_key"], rotate_seconds=0)
+    try:
+        for n in range(3):
+            writer.submit(_item(n))
+        _wait_for(lambda: writer.written == 3)
+        [part] = os.listdir(tmp_path)
+        assert part.endswith(".jsonl.gz.part")
+        records = _lines(str(tmp_path / part))
+        assert [r["request"]["company"] for r in records] == ["C0", "C1", "C2"]
+        assert records[0]["request"]["api_key"].startswith("REDACTED-")
+    finally:
+        writer.close()
+    assert [name.endswith(".jsonl.gz") for name in os.listdir(tmp_path)] == [True]
+
+
+def test_idle_file_is_rotated_on_age(tmp_path):
+    writer = RotatingCaptureWriter(str(tmp_path), rotate_seconds=0.1)
+    try:
+        writer.submit(_item(0))
+        _wait_for(lambda: any(name.endswith(".jsonl.gz") for name in os.listdir(tmp_path)))
+        assert not any(name.endswith(".part") for name in os.listdir(tmp_path))
+    finally:
+        writer.close()
+
+
+def test_orphaned_part_files_are_published(tmp_path):
+    orphan = tmp_path / f"capture-20250101-000000-{os.getpid()}-0001.jsonl.gz.part"
+    orphan.write_bytes(gzip.compress(b'{"id": "old"}\n'))
+    writer = RotatingCaptureWriter(str(tmp_path), rotate_seconds=0)
+    writer.close()
+    assert os.listdir(tmp_path) == [orphan.name[: -len(".part")]]
+    assert _lines(str(tmp_path / os.listdir(tmp_path)[0])) == [{"id": "old"}]